@@ -1,5 +1,25 @@
-from .connection import Connection
-from .database_cli import DatabaseCLI
-from .schema_builder import SchemaBuilder
-from .backup_cli import BackupCLI
-from .dev_cli import DevelopmentCLI
\ No newline at end of file
+import importlib
+
+# Cada clase se importa la primera vez que se usa: así un comando que solo
+# necesita un subsistema no carga paramiko, dotenv ni el resto de módulos.
+_EXPORTS = {
+    'Connection': 'core.connection',
+    'DatabaseCLI': 'core.database_cli',
+    'SchemaBuilder': 'core.schema_builder',
+    'BackupCLI': 'core.backup_cli',
+    'DevelopmentCLI': 'core.dev_cli',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module 'core' has no attribute '{name}'")
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
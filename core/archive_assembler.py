@@ -0,0 +1,91 @@
+import os
+import queue
+import shutil
+import threading
+import zipfile
+
+from core.encryption import is_encrypted_file
+
+
+COMPRESSED_EXTENSIONS = ('.gz', '.tgz', '.zip', '.zst', '.bz2', '.xz', '.7z', '.lz4', '.enc', '.bma')
+
+
+class StreamingZipAssembler:
+    """Ensambla el ZIP final en segundo plano a medida que terminan los componentes.
+
+    Los componentes ya comprimidos se guardan sin recomprimir (ZIP_STORED) y el
+    resto con ZIP_DEFLATED; las entradas usan ZIP64 cuando hace falta."""
+
+    def __init__(self, zip_path, base_dir, remove_sources=True, buffer_size=1024 * 1024):
+        self.zip_path = zip_path
+        self.base_dir = base_dir
+        self.remove_sources = remove_sources
+        self.buffer_size = buffer_size
+        self.pending = queue.Queue()
+        self.entries = []
+        self.errors = []
+        self.thread = None
+        self.finished = False
+        self.result = None
+
+    def add(self, path):
+        if self.finished:
+            raise ValueError(f"El ZIP {self.zip_path} ya está cerrado")
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._assemble, daemon=True)
+            self.thread.start()
+        self.pending.put(path)
+
+    def add_all(self, paths):
+        for path in paths:
+            self.add(path)
+
+    def compress_type_for(self, path):
+        if path.lower().endswith(COMPRESSED_EXTENSIONS) or is_encrypted_file(path):
+            return zipfile.ZIP_STORED
+        return zipfile.ZIP_DEFLATED
+
+    def _write_entry(self, zipf, path):
+        arcname = os.path.relpath(path, self.base_dir)
+        info = zipfile.ZipInfo.from_file(path, arcname)
+        info.compress_type = self.compress_type_for(path)
+
+        with open(path, 'rb') as source, zipf.open(info, 'w') as target:
+            shutil.copyfileobj(source, target, self.buffer_size)
+
+        self.entries.append({'path': path, 'arcname': arcname, 'size': info.file_size,
+                             'stored': info.compress_type == zipfile.ZIP_STORED})
+        print(f"[INFO] Añadido al ZIP: {arcname}")
+
+        if self.remove_sources:
+            os.remove(path)
+
+    def _assemble(self):
+        with zipfile.ZipFile(self.zip_path, 'w', allowZip64=True) as zipf:
+            while True:
+                path = self.pending.get()
+                if path is None:
+                    break
+                try:
+                    if os.path.exists(path):
+                        self._write_entry(zipf, path)
+                except Exception as e:
+                    self.errors.append((path, e))
+                    print(f"[WARNING] No se pudo añadir {path} al ZIP: {e}")
+
+    def finish(self):
+        """Cierra el ZIP y devuelve su ruta, o None si quedó vacío. Las llamadas
+        siguientes devuelven el mismo resultado (p. ej. desde un `finally`)."""
+        self.finished = True
+        if self.thread is None:
+            return self.result
+
+        self.pending.put(None)
+        self.thread.join()
+        self.thread = None
+
+        if self.entries:
+            self.result = self.zip_path
+        elif os.path.exists(self.zip_path):
+            os.remove(self.zip_path)
+        return self.result
@@ -0,0 +1,347 @@
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+from core.progress import REPORT_SUFFIX
+
+
+CATALOG_NAME = "catalog.db"
+LEGACY_ARCHIVE_PATTERN = re.compile(r'^backup_completo_(\d{8}_\d{6})\.zip$')
+# Backups parciales (solo MySQL / solo directorios): su retención es aparte, no ocupan el hueco de un completo
+PARTIAL_RUN_PREFIXES = ('mysql_solo_', 'directorios_solo_')
+# Una ejecución 'running' sin proceso registrado (catálogos anteriores) se da por abandonada pasado este plazo
+ABANDONED_RUN_HOURS = 24
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    started TEXT NOT NULL,
+    finished TEXT,
+    status TEXT NOT NULL DEFAULT 'running',
+    archive TEXT,
+    manifest TEXT,
+    dedup_name TEXT,
+    size INTEGER NOT NULL DEFAULT 0,
+    seconds REAL,
+    pid INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_started ON runs(started);
+
+CREATE TABLE IF NOT EXISTS components (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    source TEXT,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0,
+    sha256 TEXT,
+    remote_sha256 TEXT,
+    seconds REAL
+);
+CREATE INDEX IF NOT EXISTS components_run ON components(run_id);
+CREATE INDEX IF NOT EXISTS components_source ON components(source);
+
+CREATE TABLE IF NOT EXISTS paths (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS component_paths (
+    component_id INTEGER NOT NULL REFERENCES components(id) ON DELETE CASCADE,
+    path_id INTEGER NOT NULL REFERENCES paths(id),
+    PRIMARY KEY (component_id, path_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS component_paths_path ON component_paths(path_id);
+
+CREATE TABLE IF NOT EXISTS positions (
+    component_id INTEGER PRIMARY KEY REFERENCES components(id) ON DELETE CASCADE,
+    database_name TEXT,
+    binlog_file TEXT NOT NULL,
+    binlog_position INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS binlogs (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    stored_size INTEGER NOT NULL,
+    sha256 TEXT,
+    first_event INTEGER,
+    last_event INTEGER,
+    archived TEXT NOT NULL
+);
+"""
+
+
+def run_series(name):
+    return next((prefix for prefix in PARTIAL_RUN_PREFIXES if name.startswith(prefix)), 'completo')
+
+
+class BackupCatalog:
+    """Catálogo SQLite de ejecuciones de backup, sus componentes y las rutas que contienen.
+
+    Permite localizar qué archivo guarda una ruta en una fecha y aplicar una
+    retención abuelo-padre-hijo (diaria/semanal/mensual) borrando solo los
+    archivos registrados, sin recorrer el directorio de backups."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.connection = sqlite3.connect(db_path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.executescript(SCHEMA)
+        if 'pid' not in {row['name'] for row in self.connection.execute("PRAGMA table_info(runs)")}:
+            self.connection.execute("ALTER TABLE runs ADD COLUMN pid INTEGER")
+
+    def close(self):
+        self.connection.close()
+
+    def start_run(self, name, started=None):
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (name, started, pid) VALUES (?, ?, ?)",
+                (name, (started or datetime.now()).isoformat(timespec='seconds'), os.getpid()))
+        return cursor.lastrowid
+
+    def finish_run(self, run_id, status, archive=None, manifest=None, dedup_name=None, seconds=None):
+        with self.connection:
+            self.connection.execute(
+                "UPDATE runs SET finished = ?, status = ?, archive = ?, manifest = ?, dedup_name = ?, seconds = ?, "
+                "size = (SELECT COALESCE(SUM(size), 0) FROM components WHERE run_id = ?) WHERE id = ?",
+                (datetime.now().isoformat(timespec='seconds'), status, archive, manifest, dedup_name, seconds,
+                 run_id, run_id))
+
+    def add_component(self, run_id, kind, source, name, size, sha256=None, remote_sha256=None,
+                      seconds=None, contents=None, position=None):
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO components (run_id, kind, source, name, size, sha256, remote_sha256, seconds) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, kind, source, name, size, sha256, remote_sha256, seconds))
+            component_id = cursor.lastrowid
+
+            if contents:
+                self.connection.executemany("INSERT OR IGNORE INTO paths (path) VALUES (?)",
+                                            ((path,) for path in contents))
+                self.connection.executemany(
+                    "INSERT OR IGNORE INTO component_paths (component_id, path_id) "
+                    "SELECT ?, id FROM paths WHERE path = ?",
+                    ((component_id, path) for path in contents))
+
+            if position:
+                self.connection.execute(
+                    "INSERT INTO positions (component_id, database_name, binlog_file, binlog_position) "
+                    "VALUES (?, ?, ?, ?)",
+                    (component_id, position.get('database'), position['file'], int(position['position'])))
+        return component_id
+
+    def has_binlog(self, name):
+        return self.connection.execute("SELECT 1 FROM binlogs WHERE name = ?", (name,)).fetchone() is not None
+
+    def add_binlog(self, name, path, size, stored_size, sha256, first_event, last_event):
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO binlogs (name, path, size, stored_size, sha256, first_event, last_event, archived) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (name, path, size, stored_size, sha256, first_event, last_event,
+                 datetime.now().isoformat(timespec='seconds')))
+
+    def list_binlogs(self):
+        return self.connection.execute("SELECT * FROM binlogs ORDER BY name").fetchall()
+
+    def find_pitr_base(self, target):
+        """Posiciones binlog del backup MySQL más reciente anterior a `target` (ISO)."""
+        run = self.connection.execute(
+            """
+            SELECT runs.* FROM runs
+            JOIN components ON components.run_id = runs.id
+            JOIN positions ON positions.component_id = components.id
+            WHERE runs.status = 'ok' AND runs.started <= ?
+            ORDER BY runs.started DESC LIMIT 1
+            """, (target,)).fetchone()
+        if run is None:
+            return None, []
+        positions = self.connection.execute(
+            """
+            SELECT components.*, positions.database_name AS database, positions.binlog_file, positions.binlog_position
+            FROM components JOIN positions ON positions.component_id = components.id
+            WHERE components.run_id = ? ORDER BY components.id
+            """, (run['id'],)).fetchall()
+        return run, positions
+
+    def binlogs_for_replay(self, start_file, stop_epoch):
+        return self.connection.execute(
+            "SELECT * FROM binlogs WHERE name >= ? AND (first_event IS NULL OR first_event <= ?) ORDER BY name",
+            (start_file, stop_epoch)).fetchall()
+
+    def prunable_binlogs(self):
+        """Binlogs anteriores a la posición del backup MySQL más antiguo que se conserva."""
+        oldest = self.connection.execute("SELECT MIN(binlog_file) FROM positions").fetchone()[0]
+        if oldest is None:
+            return []
+        return self.connection.execute("SELECT * FROM binlogs WHERE name < ? ORDER BY name", (oldest,)).fetchall()
+
+    def delete_binlog(self, binlog_id):
+        with self.connection:
+            self.connection.execute("DELETE FROM binlogs WHERE id = ?", (binlog_id,))
+
+    def import_legacy_archives(self, directory):
+        # Los backup_completo_<fecha>.zip anteriores al catálogo se registran una sola vez
+        known = {row['archive'] for row in self.connection.execute("SELECT archive FROM runs WHERE archive IS NOT NULL")}
+        imported = []
+        for filename in sorted(os.listdir(directory)):
+            match = LEGACY_ARCHIVE_PATTERN.match(filename)
+            if not match or filename in known:
+                continue
+            started = datetime.strptime(match.group(1), "%Y%m%d_%H%M%S")
+            run_id = self.start_run(filename[:-len('.zip')], started)
+            with self.connection:
+                self.connection.execute(
+                    "UPDATE runs SET finished = started, status = 'imported', archive = ?, size = ? WHERE id = ?",
+                    (filename, os.path.getsize(os.path.join(directory, filename)), run_id))
+            imported.append(filename)
+        return imported
+
+    def import_dedup_backups(self, backups):
+        known = {row['dedup_name'] for row in
+                 self.connection.execute("SELECT dedup_name FROM runs WHERE dedup_name IS NOT NULL")}
+        imported = []
+        for backup in backups:
+            if backup['name'] in known:
+                continue
+            run_id = self.start_run(backup['name'], datetime.fromisoformat(backup['created']))
+            with self.connection:
+                self.connection.execute(
+                    "UPDATE runs SET finished = started, status = 'imported', dedup_name = ?, size = ? WHERE id = ?",
+                    (backup['name'], sum(entry['size'] for entry in backup['files']), run_id))
+            imported.append(backup['name'])
+        return imported
+
+    def list_runs(self):
+        return self.connection.execute("SELECT * FROM runs ORDER BY started DESC, id DESC").fetchall()
+
+    def get_components(self, run_id):
+        return self.connection.execute("SELECT * FROM components WHERE run_id = ? ORDER BY id", (run_id,)).fetchall()
+
+    def find_path(self, path, before=None):
+        """Componentes que contienen `path`: por su listado de archivos o, si no tienen listado,
+        porque `path` está bajo su directorio de origen."""
+        path = path.rstrip('/') or '/'
+        before = before or datetime.max.isoformat(timespec='seconds')
+        return self.connection.execute(
+            """
+            SELECT runs.name AS run, runs.started, runs.archive, runs.dedup_name, components.name AS component,
+                   components.source, matched.path
+            FROM (
+                SELECT component_paths.component_id, paths.path
+                FROM paths JOIN component_paths ON component_paths.path_id = paths.id
+                WHERE paths.path = ?1 OR (paths.path >= ?1 || '/' AND paths.path < ?1 || '0')
+                UNION
+                SELECT id, ?1 FROM components
+                WHERE source IS NOT NULL AND kind != 'index' AND (?1 = source OR ?1 LIKE source || '/%')
+                  AND NOT EXISTS (SELECT 1 FROM component_paths WHERE component_paths.component_id = components.id)
+            ) AS matched
+            JOIN components ON components.id = matched.component_id
+            JOIN runs ON runs.id = components.run_id
+            WHERE runs.status IN ('ok', 'imported') AND runs.started <= ?2
+            GROUP BY components.id
+            ORDER BY runs.started DESC
+            """, (path, before)).fetchall()
+
+    def source_history(self, source, until):
+        """Componentes de un directorio origen hasta la fecha `until`, del más antiguo al más reciente."""
+        return self.connection.execute(
+            """
+            SELECT components.*, runs.name AS run, runs.started, runs.archive, runs.dedup_name
+            FROM components JOIN runs ON runs.id = components.run_id
+            WHERE components.source = ? AND runs.started <= ? AND runs.status IN ('ok', 'imported')
+            ORDER BY runs.started, components.id
+            """, (source, until)).fetchall()
+
+    def restore_chain(self, source, until):
+        """Componentes necesarios para reconstruir `source` a fecha `until`: el último archivo
+        completo y los incrementales (con sus índices) posteriores."""
+        history = self.source_history(source, until)
+        bases = [i for i, component in enumerate(history)
+                 if component['kind'] == 'directory' and '_incr_' not in component['name']]
+        return history[bases[-1]:] if bases else history
+
+    def dependency_run_ids(self, run):
+        run_ids = set()
+        for component in self.get_components(run['id']):
+            if component['source'] and '_incr_' in component['name']:
+                run_ids.update(row['run_id'] for row in self.restore_chain(component['source'], run['started']))
+        return run_ids
+
+    def is_abandoned(self, run):
+        """Una ejecución 'running' está abandonada si su proceso ya no existe o,
+        sin proceso registrado, si empezó hace más de ABANDONED_RUN_HOURS."""
+        if run['pid'] is None:
+            age = datetime.now() - datetime.fromisoformat(run['started'])
+            return age.total_seconds() > ABANDONED_RUN_HOURS * 3600
+        try:
+            os.kill(run['pid'], 0)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            pass  # p. ej. PermissionError: el proceso existe aunque sea de otro usuario
+        return False
+
+    def plan_retention(self, daily=7, weekly=4, monthly=6):
+        """Devuelve (conservar, eliminar) según la política abuelo-padre-hijo.
+
+        Se conserva el backup más reciente de cada uno de los últimos `daily` días,
+        `weekly` semanas ISO y `monthly` meses, junto con las ejecuciones de las que
+        dependen sus incrementales; las ejecuciones fallidas y las abandonadas se
+        eliminan. Los backups completos y cada tipo de backup parcial se cuentan por separado."""
+        runs = self.list_runs()
+        keep_ids = set()
+        buckets = (
+            (daily, lambda started: started.date()),
+            (weekly, lambda started: started.isocalendar()[:2]),
+            (monthly, lambda started: (started.year, started.month)),
+        )
+
+        completed = [run for run in runs if run['status'] in ('ok', 'imported')]
+        for series in {run_series(run['name']) for run in completed}:
+            series_runs = [run for run in completed if run_series(run['name']) == series]
+            for limit, bucket_of in buckets:
+                seen = set()
+                for run in series_runs:
+                    bucket = bucket_of(datetime.fromisoformat(run['started']))
+                    if bucket not in seen and len(seen) < limit:
+                        seen.add(bucket)
+                        keep_ids.add(run['id'])
+            keep_ids.add(series_runs[0]['id'])
+
+        # Un incremental conservado necesita su completo y los incrementales intermedios
+        for run in completed:
+            if run['id'] in keep_ids:
+                keep_ids.update(self.dependency_run_ids(run))
+        # Otra ejecución puede estar en curso a la vez (p. ej. un backup programado): solo se borran las abandonadas
+        keep_ids.update(run['id'] for run in runs if run['status'] == 'running' and not self.is_abandoned(run))
+
+        keep = [run for run in runs if run['id'] in keep_ids]
+        delete = [run for run in runs if run['id'] not in keep_ids]
+        return keep, delete
+
+    def run_files(self, run, directory):
+        files = [run['archive'], run['manifest'], run['name'] + REPORT_SUFFIX]
+        # Los componentes solo quedan sueltos si no se pudieron añadir al ZIP
+        files.extend(component['name'] for component in self.get_components(run['id']))
+        return [os.path.join(directory, name) for name in files if name]
+
+    def delete_run(self, run_id):
+        with self.connection:
+            self.connection.execute("DELETE FROM runs WHERE id = ?", (run_id,))
+
+    def prune_paths(self):
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM paths WHERE NOT EXISTS "
+                "(SELECT 1 FROM component_paths WHERE component_paths.path_id = paths.id)")
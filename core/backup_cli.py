@@ -1,17 +1,61 @@
+import io
+import json
 import os
+import re
+import shlex
+import time
 import zipfile
 from datetime import datetime, timedelta
-import paramiko
 import yaml
 
+from core.archive_assembler import StreamingZipAssembler
+from core.backup_catalog import BackupCatalog, CATALOG_NAME
+from core.binlog_backup import BinlogArchiver, read_dump_binlog_position
+from core.dedup_store import DedupBackup, DedupStore
+from core.encryption import (DecryptingReader, EncryptingWriter, FrameCipher, StreamEncryptor, is_encrypted_file,
+                             load_key)
+from core.folder_rules import FolderRules
+from core.incremental_backup import IncrementalBackupManager
+from core.integrity import (ChunkedHasher, DEFAULT_CHUNK_SIZE, MANIFEST_SUFFIX,
+                            split_remote_checksum, verify_manifest, wrap_with_remote_checksum, write_manifest)
+from core.progress import ProgressBus, REPORT_SUFFIX
+from core.transfer_engine import SFTPTransferEngine
+from core.remote_agent import RemoteAgent, RemoteAgentUnavailable
+from core.resource_governor import ResourceGovernor
+from core.restore_engine import StreamingRestoreEngine
+from core.seekable_archive import CODECS as SEEKABLE_CODECS, SEEKABLE_EXTENSION, SeekableArchive
+from core.ssh_profile import PROFILE_KEY, TransferBenchmark, connect_with_profile, save_ssh_profile
+from core.object_storage import ObjectStorageUploader, UPLOAD_STATE_SUFFIX
+from core.mysql_parallel_dump import ParallelMySQLDumper, ParallelMySQLLoader, MANIFEST_NAME
+from core.mysql_session import quote_literal
+
 
 class BackupCLI:
     def __init__(self, config_path='config.yaml'):
         self.config_path = config_path
         self.config = None
         self.ssh_client = None
+        self.transfer_engine = None
+        self.resource_governor = None
+        self.progress = None
+        self.cipher = None
+        self.encryption_key = None
+        self.remote_checksums = {}
+        self.integrity_records = {}
+        self.component_contents = {}
+        self.binlog_positions = {}
+        self.incremental_states = {}
+        self.remote_agent = None
+        self.remote_agent_unavailable = False
+        self.remote_sizes = {}
+        self.mysql_defaults = None
         self.mysql_data_path = "/var/lib/mysql"
         self.mysql_service_name = "mysql"
+        self.mysql_backup_modes = ('cold', 'hot', 'parallel')
+        self.mysql_system_databases = ('information_schema', 'performance_schema', 'mysql', 'sys')
+        self.stream_chunk_size = 256 * 1024
+        # Quien encadena varias operaciones (trabajos YAML) mantiene la conexión SSH entre ellas
+        self.keep_connection = False
         self.running = True
 
     def display_menu(self):
@@ -25,6 +69,17 @@ class BackupCLI:
         print("5. Solo backup de directorios")
         print("6. Limpiar backups antiguos")
         print("7. Ver información de configuración")
+        print("8. Restaurar volcado MySQL paralelo")
+        print("9. Restaurar backup del almacén deduplicado")
+        print("10. Verificar integridad de backups")
+        print("11. Buscar en el catálogo de backups")
+        print("12. Restaurar backup en el servidor")
+        print("13. Archivar binlogs de MySQL (continuo)")
+        print("14. Restaurar MySQL a un punto en el tiempo")
+        print("15. Medir y ajustar transferencias SSH (benchmark-transfer)")
+        print("16. Estimar tamaño de los directorios (pre-flight)")
+        print("17. Extraer archivos de un backup (acceso directo)")
+        print("18. Subir un backup al almacenamiento externo (S3)")
         print("0. Volver al menú principal")
         print("-"*50)
 
@@ -94,6 +149,11 @@ class BackupCLI:
             mysql_config = self.config.get('mysql', {})
             if mysql_config.get('enabled', False):
                 print("[OK] MySQL backup está habilitado")
+                mode = mysql_config.get('mode', 'cold')
+                if mode not in self.mysql_backup_modes:
+                    print(f"[ERROR] Modo de backup MySQL no válido: {mode} (usa {' o '.join(self.mysql_backup_modes)})")
+                    return
+                print(f"[OK] Modo de backup MySQL: {mode}")
             else:
                 print("[INFO] MySQL backup está deshabilitado")
 
@@ -125,14 +185,45 @@ class BackupCLI:
             for folder in remote_folders:
                 print(f"     • {folder}")
 
+            dedup_config = backup_config.get('dedup', {})
+            if dedup_config.get('enabled', False):
+                print(f"   Almacén deduplicado: ✅ {self.get_dedup_store_path(backup_config)}")
+
+            retention = self.get_retention_policy(backup_config)
+            print(f"   Retención: {retention['daily']} diarios, {retention['weekly']} semanales, "
+                  f"{retention['monthly']} mensuales")
+
+            incremental_config = backup_config.get('incremental', {})
+            if incremental_config.get('enabled', False):
+                full_every = incremental_config.get('full_every', 7)
+                print(f"   Incremental: ✅ (completo cada {full_every} ejecuciones"
+                      f"{', con SHA-256' if incremental_config.get('hash') else ''})")
+
             mysql_config = self.config.get('mysql', {})
             print(f"\n🗄️ MySQL Backup:")
             enabled = mysql_config.get('enabled', False)
             print(f"   Estado: {'✅ Habilitado' if enabled else '❌ Deshabilitado'}")
             if enabled:
+                mode = mysql_config.get('mode', 'cold')
+                mode_labels = {
+                    'cold': '🧊 En frío (parada del servicio)',
+                    'hot': '🔥 En caliente (mysqldump)',
+                    'parallel': '⚡ En caliente paralelo (fragmentos por tabla)',
+                }
+                print(f"   Modo: {mode_labels.get(mode, mode)}")
                 print(f"   Nombre backup: {mysql_config.get('backup_name', 'Auto-generado')}")
-                restart = mysql_config.get('restart_after_backup', True)
-                print(f"   Reiniciar después: {'✅ Sí' if restart else '❌ No'}")
+                if mode in ('hot', 'parallel'):
+                    databases = mysql_config.get('databases') or []
+                    print(f"   Bases de datos: {', '.join(databases) if databases else 'Todas (excepto sistema)'}")
+                if mode == 'parallel':
+                    parallel_config = mysql_config.get('parallel', {})
+                    print(f"   Workers: {parallel_config.get('workers', 4)}")
+                    print(f"   Filas por fragmento: {parallel_config.get('chunk_rows', 100000)}")
+                elif mode == 'cold':
+                    restart = mysql_config.get('restart_after_backup', True)
+                    print(f"   Reiniciar después: {'✅ Sí' if restart else '❌ No'}")
+                if self.is_binlog_enabled(mysql_config):
+                    print(f"   Binlogs: ✅ archivado cada {mysql_config['binlog'].get('interval', 300)}s en modo continuo")
 
             settings = self.config.get('settings', {})
             if settings:
@@ -140,6 +231,10 @@ class BackupCLI:
                 keep_remote = settings.get('keep_remote_copies', False)
                 print(f"   Mantener copias remotas: {'✅ Sí' if keep_remote else '❌ No'}")
 
+            governor_description = ResourceGovernor(self.config.get('governor', {}), self.execute_command).describe()
+            if governor_description:
+                print(f"\n🐢 Límites de recursos: {governor_description}")
+
         except Exception as e:
             print(f"[ERROR] Error mostrando configuración: {e}")
 
@@ -152,18 +247,30 @@ class BackupCLI:
             print("✓ Utilizando conexión SSH existente")
             return True
 
+    def create_ssh_client(self, profile=None):
+        vps_config = self.config['vps']
+        # paramiko solo se importa al conectar: las operaciones locales arrancan sin él
+        import paramiko
+
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        return connect_with_profile(
+            client, profile,
+            hostname=vps_config['ip'],
+            port=int(vps_config.get('port', 22)),
+            username=vps_config['user'],
+            key_filename=vps_config['key_path'],
+            passphrase=vps_config.get('passphrase')
+        )
+
+    def is_connected(self):
+        transport = self.ssh_client.get_transport() if self.ssh_client else None
+        return bool(transport and transport.is_active())
+
     def connect_ssh(self):
         try:
             vps_config = self.config['vps']
-            self.ssh_client = paramiko.SSHClient()
-            self.ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-
-            self.ssh_client.connect(
-                hostname=vps_config['ip'],
-                username=vps_config['user'],
-                key_filename=vps_config['key_path'],
-                passphrase=vps_config.get('passphrase')
-            )
+            self.ssh_client = self.create_ssh_client(self.config.get(PROFILE_KEY))
             print(f"[OK] Conectado a {vps_config['ip']}")
             return True
         except Exception as e:
@@ -225,12 +332,28 @@ class BackupCLI:
         if not local_save_path:
             return
 
-        mysql_backup_path = self.process_mysql_backup(local_save_path, mysql_config)
-        if mysql_backup_path:
-            backup_info = self.get_backup_info(mysql_backup_path)
-            print(f"\n[✓] Backup MySQL completado: {backup_info['size_formatted']}")
-        else:
-            print("[ERROR] Error en backup de MySQL")
+        start_time = datetime.now()
+        catalog, run_id, run_name, dedup_backup = self.start_partial_backup(backup_config, local_save_path, 'mysql_solo',
+                                                                           start_time)
+        run_recorded = False
+        try:
+            mysql_backup_paths = self.process_mysql_backup(local_save_path, mysql_config) or []
+            self.catalog_components(catalog, run_id, 'mysql', None, mysql_backup_paths, local_save_path,
+                                    (datetime.now() - start_time).total_seconds())
+            total_size = sum(os.path.getsize(path) for path in mysql_backup_paths if os.path.exists(path))
+            self.ensure_integrity_records(mysql_backup_paths)
+            if dedup_backup:
+                dedup_backup.add_all(mysql_backup_paths)
+            run_recorded = True
+            if self.finish_partial_backup(catalog, run_id, run_name, local_save_path, mysql_backup_paths, start_time,
+                                          dedup_backup):
+                print(f"\n[✓] Backup MySQL completado: {self.format_file_size(total_size)}")
+            else:
+                print("[ERROR] Error en backup de MySQL")
+        finally:
+            if not run_recorded:
+                catalog.finish_run(run_id, 'error', seconds=(datetime.now() - start_time).total_seconds())
+            catalog.close()
 
     def directories_backup_only_option(self):
         print("\nBACKUP SOLO DE DIRECTORIOS")
@@ -249,43 +372,76 @@ class BackupCLI:
             return
 
         backup_files = []
+        backed_up_folders = 0
 
-        for folder in backup_config['remote_folders']:
-            print(f"\n--- Procesando: {folder} ---")
-
-            try:
-                remote_backup_path = self.compress_directory(folder)
-                if not remote_backup_path:
-                    print(f"[ERROR] No se pudo comprimir {folder}")
-                    continue
-
-                file_size = self.get_file_size(remote_backup_path)
-                print(f"[INFO] Tamaño del backup: {self.format_file_size(file_size)}")
-
-                backup_filename = os.path.basename(remote_backup_path)
-                local_backup_path = os.path.join(local_save_path, backup_filename)
-
-                print(f"[INFO] Descargando a: {local_backup_path}")
-                if self.download_file(remote_backup_path, local_backup_path):
-                    backup_info = self.get_backup_info(local_backup_path)
-                    if backup_info:
-                        print(f"[OK] Backup completado: {backup_info['size_formatted']}")
-
-                    backup_files.append(local_backup_path)
+        start_time = datetime.now()
+        catalog, run_id, run_name, dedup_backup = self.start_partial_backup(
+            backup_config, local_save_path, 'directorios_solo', start_time)
+        run_recorded = False
+        try:
+            for folder in backup_config['remote_folders']:
+                component_start = datetime.now()
+                folder_files = self.process_directory_backup(folder, local_save_path, backup_config, settings)
+                if folder_files:
+                    backed_up_folders += 1
+                    backup_files.extend(folder_files)
+                    self.catalog_components(catalog, run_id, 'directory', folder.rstrip('/') or '/', folder_files,
+                                            local_save_path, (datetime.now() - component_start).total_seconds())
+                    self.ensure_integrity_records(folder_files)
+                    if dedup_backup:
+                        dedup_backup.add_all(folder_files)
+
+            run_recorded = True
+            if self.finish_partial_backup(catalog, run_id, run_name, local_save_path, backup_files, start_time,
+                                          dedup_backup):
+                print(f"\n[✓] {backed_up_folders} directorios respaldados exitosamente")
+            elif not backup_files:
+                print("\n[WARNING] No se completaron backups de directorios")
+        finally:
+            if not run_recorded:
+                catalog.finish_run(run_id, 'error', seconds=(datetime.now() - start_time).total_seconds())
+                self.settle_incremental_states('error')
+            catalog.close()
+
+    def start_partial_backup(self, backup_config, local_save_path, prefix, start_time):
+        catalog = self.get_catalog(backup_config)
+        run_name = f"{prefix}_{start_time.strftime('%Y%m%d_%H%M%S')}"
+        return catalog, catalog.start_run(run_name, start_time), run_name, \
+            self.start_dedup_backup(backup_config, local_save_path, run_name)
+
+    def finish_partial_backup(self, catalog, run_id, run_name, local_save_path, backup_files, start_time,
+                              dedup_backup=None):
+        """Cierra en el catálogo un backup solo de MySQL o solo de directorios y aplica la retención.
+
+        Con el almacén deduplicado activo, los componentes ya pasaron al almacén como en run_backup.
+        Como en run_backup, se escribe el manifiesto de integridad de los componentes."""
+        backup_config = self.config['backup']
+        dedup_store = dedup_backup.store if dedup_backup else None
+        dedup_name = manifest_name = None
+        if dedup_backup and backup_files:
+            dedup_name = self.finish_dedup_backup(dedup_backup, local_save_path)
+        if backup_files:
+            manifest_name = run_name + MANIFEST_SUFFIX
+            self.write_backup_manifest(os.path.join(local_save_path, manifest_name), run_name, None,
+                                       local_save_path, backup_files, dedup_name)
+        status = 'empty' if not backup_files else ('error' if dedup_backup and not dedup_name else 'ok')
+        catalog.finish_run(run_id, status, manifest=manifest_name, dedup_name=dedup_name,
+                           seconds=(datetime.now() - start_time).total_seconds())
+        self.settle_incremental_states(status)
+        if status != 'ok':
+            return False
 
-                    if not settings.get('keep_remote_copies', False):
-                        self.execute_command(f"rm -f {remote_backup_path}")
-                        print(f"[INFO] Archivo remoto limpiado: {remote_backup_path}")
-                else:
-                    print(f"[ERROR] Error descargando {folder}")
+        deleted_runs, freed_bytes = self.apply_retention(catalog, local_save_path, backup_config, dedup_store)
+        if deleted_runs:
+            print(f"[INFO] Eliminados {len(deleted_runs)} backups antiguos, "
+                  f"{self.format_file_size(freed_bytes)} liberados")
+        return True
 
-            except Exception as e:
-                print(f"[ERROR] Error procesando {folder}: {e}")
-
-        if backup_files:
-            print(f"\n[✓] {len(backup_files)} directorios respaldados exitosamente")
-        else:
-            print("\n[WARNING] No se completaron backups de directorios")
+    def settle_incremental_states(self, status):
+        """Guarda el estado de los directorios incrementales si la ejecución terminó bien; si no, lo descarta."""
+        if status in ('ok', 'empty'):
+            IncrementalBackupManager.commit_states(self.incremental_states)
+        self.incremental_states.clear()
 
     def clean_old_backups_option(self):
         print("\nLIMPIAR BACKUPS ANTIGUOS")
@@ -303,22 +459,32 @@ class BackupCLI:
 
         print(f"Directorio de backups: {local_save_path}")
 
+        retention = self.get_retention_policy(backup_config)
+        print(f"Política de retención: {retention['daily']} diarios, {retention['weekly']} semanales, "
+              f"{retention['monthly']} mensuales")
+
+        catalog = self.get_catalog(backup_config)
         try:
-            days_input = input("¿Eliminar backups de más de cuántos días? (por defecto 7): ").strip()
-            max_age_days = int(days_input) if days_input else 7
-        except ValueError:
-            max_age_days = 7
+            _, delete = catalog.plan_retention(**retention)
+            if not delete:
+                print("\n[INFO] No hay backups antiguos para eliminar")
+                return
 
-        print(f"Eliminando backups de más de {max_age_days} días...")
+            print(f"\nSe eliminarán {len(delete)} backups:")
+            for run in delete:
+                print(f"   • {run['name']} ({run['started']}, {run['status']})")
 
-        deleted_files = self.clean_old_backups(local_save_path, max_age_days)
+            confirm = input("\n¿Continuar? (s/N): ").strip().lower()
+            if confirm not in ('s', 'si', 'sí', 'y', 'yes'):
+                print("[INFO] Limpieza cancelada")
+                return
 
-        if deleted_files:
-            print(f"\n[✓] Eliminados {len(deleted_files)} backups antiguos:")
-            for filename in deleted_files:
-                print(f"   • {filename}")
-        else:
-            print("\n[INFO] No hay backups antiguos para eliminar")
+            deleted_runs, freed_bytes = self.apply_retention(catalog, local_save_path, backup_config,
+                                                             self.get_dedup_store(backup_config))
+            print(f"\n[✓] Eliminados {len(deleted_runs)} backups antiguos "
+                  f"({self.format_file_size(freed_bytes)} liberados)")
+        finally:
+            catalog.close()
 
     def run_complete_backup_option(self):
         print("\nEJECUTAR BACKUP COMPLETO")
@@ -343,38 +509,368 @@ class BackupCLI:
             print(f"[ERROR] Error ejecutando comando: {e}")
             return ""
 
+    def get_transfer_engine(self):
+        if self.transfer_engine is None:
+            transfer_config = (self.config or {}).get('transfer', {})
+            self.transfer_engine = SFTPTransferEngine(
+                self.ssh_client,
+                streams=transfer_config.get('streams', 4),
+                range_size=int(transfer_config.get('range_size_mb', 32)) * 1024 * 1024,
+                read_ahead=transfer_config.get('read_ahead', 64),
+                rate_limiter=self.get_resource_governor().download_bucket
+            )
+        return self.transfer_engine
+
+    def get_resource_governor(self):
+        if self.resource_governor is None:
+            self.resource_governor = ResourceGovernor((self.config or {}).get('governor', {}), self.execute_command)
+        return self.resource_governor
+
+    def get_progress(self):
+        if self.progress is None:
+            progress_config = (self.config or {}).get('progress', {})
+            self.progress = ProgressBus(self.format_file_size, refresh=progress_config.get('refresh_seconds', 0.5))
+        return self.progress
+
     def download_file(self, remote_path, local_path):
-        try:
-            sftp = self.ssh_client.open_sftp()
+        with self.get_progress().stage('transfer', os.path.basename(local_path)) as stage:
+            stage['ok'] = self._download_file(remote_path, local_path)
+            if stage['ok']:
+                stage['bytes'] = os.path.getsize(local_path)
+            return stage['ok']
+
+    def _download_file(self, remote_path, local_path):
+        retries = int((self.config or {}).get('transfer', {}).get('retries', 3))
+
+        for attempt in range(retries + 1):
+            try:
+                hasher = ChunkedHasher(self.get_integrity_chunk_size())
+                cipher = self.get_cipher()
+                with self.get_progress().stream(os.path.basename(local_path)) as stream:
+                    self.get_transfer_engine().download(remote_path, local_path, stream.set, hasher=hasher,
+                                                        cipher=cipher.for_new_file() if cipher else None)
+                record = self.record_integrity(local_path, dict(hasher.result(), encrypted=bool(cipher)),
+                                               self.remote_checksums.get(remote_path))
+                if record['match'] is False:
+                    os.remove(local_path)
+                    return False
+                return True
+            except Exception as e:
+                print(f"[ERROR] Error descargando {remote_path}: {e}")
+                if attempt >= retries:
+                    return False
 
-            file_attrs = sftp.stat(remote_path)
-            total_size = file_attrs.st_size
+                print(f"[INFO] Reintentando ({attempt + 1}/{retries}), se reanudará desde el último rango completado...")
+                self.close_connection()
+                if not self.connect_ssh():
+                    return False
+
+        return False
+
+    def cleanup_remote_file(self, remote_path, sudo=False):
+        with self.get_progress().stage('cleanup', os.path.basename(remote_path)):
+            self.execute_command(f"{'sudo ' if sudo else ''}rm -f {remote_path}")
+        print(f"[INFO] Archivo remoto limpiado: {remote_path}")
+
+    def estimate_folders(self, folders, backup_config):
+        """Archivos y bytes que se respaldarían de cada directorio, con un solo comando remoto."""
+        commands = []
+        for folder in folders:
+            estimate_cmd = FolderRules.for_folder(backup_config, folder).estimate_command(folder)
+            commands.append(f"printf '%s\\t' {shlex.quote(folder)}; {{ {estimate_cmd}; }} || printf -- '-1\\t-1\\n'")
+
+        estimates = {}
+        for line in self.execute_command("; ".join(commands)).splitlines():
+            parts = line.rsplit('\t', 2)
+            if len(parts) == 3 and parts[0] in folders:
+                files, size = int(parts[1]), int(parts[2])
+                estimates[parts[0]] = (files, size) if files >= 0 else None
+        return estimates
+
+    def print_folder_estimate(self, folders, backup_config):
+        estimates = self.estimate_folders(folders, backup_config)
+        total_files = total_bytes = 0
+        for folder in folders:
+            estimate = estimates.get(folder)
+            suffix = " (con reglas)" if FolderRules.for_folder(backup_config, folder).is_active() else ""
+            if estimate is None:
+                print(f"  {folder}: no accesible")
+                continue
+            print(f"  {folder}: {estimate[0]} archivos, {self.format_file_size(estimate[1])}{suffix}")
+            total_files += estimate[0]
+            total_bytes += estimate[1]
+
+        print(f"  Total: {total_files} archivos, {self.format_file_size(total_bytes)} sin comprimir")
+        download_limit = float((self.config or {}).get('governor', {}).get('download_limit_mb', 0) or 0)
+        if download_limit > 0 and total_bytes:
+            seconds = total_bytes / (download_limit * 1024 * 1024)
+            print(f"  Descarga máxima estimada a {download_limit:g} MB/s: {timedelta(seconds=int(seconds))} "
+                  f"(antes de comprimir)")
+        return estimates
+
+    def estimate_folders_option(self):
+        print("\nESTIMACIÓN PREVIA DE DIRECTORIOS")
+        print("-" * 40)
 
-            def progress_callback(transferred, total):
-                percent = (transferred / total) * 100
-                print(
-                    f"\r[INFO] Progreso: {percent:.1f}% ({self.format_file_size(transferred)}/{self.format_file_size(total)})",
-                    end="")
+        if not self.load_config():
+            return False
+        if not self.establish_connection():
+            return False
 
-            sftp.get(remote_path, local_path, callback=progress_callback)
-            print()
-            sftp.close()
+        backup_config = self.config['backup']
+        try:
+            self.print_folder_estimate(backup_config['remote_folders'], backup_config)
             return True
         except Exception as e:
-            print(f"[ERROR] Error descargando {remote_path}: {e}")
+            print(f"[ERROR] Error estimando directorios: {e}")
+            return False
+
+    def process_directory_backup(self, folder, local_save_path, backup_config, settings):
+        print(f"\n--- Procesando: {folder} ---")
+
+        try:
+            incremental_config = backup_config.get('incremental', {})
+            if incremental_config.get('enabled', False):
+                manager = IncrementalBackupManager(self, local_save_path, incremental_config)
+                backup_paths = manager.backup_directory(folder, FolderRules.for_folder(backup_config, folder))
+                if backup_paths:
+                    total_size = sum(os.path.getsize(path) for path in backup_paths)
+                    print(f"[OK] Backup completado: {self.format_file_size(total_size)}")
+                return backup_paths
+
+            with self.get_progress().stage('compress', folder) as stage:
+                remote_backup_path = self.compress_directory(folder)
+                stage['ok'] = bool(remote_backup_path)
+            if not remote_backup_path:
+                print(f"[ERROR] No se pudo comprimir {folder}")
+                return []
+
+            file_size = self.get_file_size(remote_backup_path)
+            print(f"[INFO] Tamaño del backup: {self.format_file_size(file_size)}")
+
+            backup_filename = os.path.basename(remote_backup_path)
+            local_backup_path = os.path.join(local_save_path, backup_filename)
+
+            print(f"[INFO] Descargando a: {local_backup_path}")
+            if not self.download_file(remote_backup_path, local_backup_path):
+                print(f"[ERROR] Error descargando {folder}")
+                return []
+
+            if remote_backup_path in self.component_contents:
+                self.component_contents[local_backup_path] = self.component_contents.pop(remote_backup_path)
+
+            backup_info = self.get_backup_info(local_backup_path)
+            if backup_info:
+                print(f"[OK] Backup completado: {backup_info['size_formatted']}")
+
+            if not settings.get('keep_remote_copies', False):
+                self.cleanup_remote_file(remote_backup_path)
+
+            return [local_backup_path]
+
+        except Exception as e:
+            print(f"[ERROR] Error procesando {folder}: {e}")
+            return []
+
+    def create_remote_archive(self, archive_command, remote_path):
+        # El SHA-256 se calcula con tee mientras se escribe el archivo, sin releerlo
+        pipeline = f"{archive_command}{self.get_resource_governor().rate_limit_pipe()} | tee {remote_path} | sha256sum"
+        output = self.execute_command(f"bash -o pipefail -c {shlex.quote(pipeline)}")
+        checksum = output.split()[0] if output.strip() else ""
+        if re.fullmatch(r'[0-9a-f]{64}', checksum):
+            self.remote_checksums[remote_path] = checksum
+        return checksum or None
+
+    def get_integrity_chunk_size(self):
+        integrity_config = (self.config or {}).get('integrity', {})
+        return int(integrity_config.get('chunk_size_mb', DEFAULT_CHUNK_SIZE // (1024 * 1024))) * 1024 * 1024
+
+    def record_integrity(self, local_path, hash_result, remote_sha256=None):
+        record = dict(hash_result, remote_sha256=remote_sha256,
+                      match=None if remote_sha256 is None else remote_sha256 == hash_result['sha256'])
+        self.integrity_records[os.path.abspath(local_path)] = record
+
+        if record['match'] is False:
+            print(f"[ERROR] Integridad: SHA-256 local {hash_result['sha256'][:16]}… "
+                  f"distinto del remoto {remote_sha256[:16]}… en {os.path.basename(local_path)}")
+        elif record['match']:
+            print(f"[OK] Integridad verificada (SHA-256 {hash_result['sha256'][:16]}…)")
+        return record
+
+    def ensure_integrity_records(self, paths):
+        chunk_size = self.get_integrity_chunk_size()
+        for path in paths:
+            if os.path.abspath(path) not in self.integrity_records and os.path.exists(path):
+                hasher = ChunkedHasher(chunk_size)
+                with self.open_local_reader(path) as file:
+                    for data in iter(lambda: file.read(1024 * 1024), b""):
+                        hasher.update(data)
+                self.integrity_records[os.path.abspath(path)] = dict(
+                    hasher.result(), encrypted=is_encrypted_file(path), remote_sha256=None, match=None)
+
+    def write_backup_manifest(self, manifest_path, backup_name, archive_name, local_save_path, backup_files,
+                              dedup_name=None):
+        components = []
+        for path in backup_files:
+            record = self.integrity_records.get(os.path.abspath(path))
+            if record:
+                components.append(dict(record, name=os.path.relpath(path, local_save_path)))
+
+        write_manifest(manifest_path, {
+            'backup': backup_name,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'archive': archive_name,
+            'dedup': dedup_name,
+            'components': components,
+        })
+
+        verified = sum(1 for component in components if component['match'])
+        mismatched = sum(1 for component in components if component['match'] is False)
+        print(f"[INFO] Manifiesto de integridad: {os.path.basename(manifest_path)} "
+              f"({verified} verificados contra el servidor, {mismatched} con discrepancias)")
+        return manifest_path
+
+    def verify_backups_option(self):
+        print("\nVERIFICAR INTEGRIDAD DE BACKUPS")
+        print("-" * 40)
+
+        if not self.load_config():
             return False
 
+        local_save_path = self.config['backup']['local_save_path']
+        if not os.path.exists(local_save_path):
+            print(f"[ERROR] Directorio no existe: {local_save_path}")
+            return False
+
+        manifests = sorted(name for name in os.listdir(local_save_path) if name.endswith(MANIFEST_SUFFIX))
+        if not manifests:
+            print("[INFO] No hay manifiestos de integridad")
+            return True
+
+        workers = int(self.config.get('integrity', {}).get('workers', os.cpu_count() or 4))
+        dedup_store = self.get_dedup_store(self.config['backup'])
+        failures = 0
+        for manifest_name in manifests:
+            start_time = datetime.now()
+            manifest, results = verify_manifest(os.path.join(local_save_path, manifest_name), workers,
+                                                key_loader=self.get_encryption_key, dedup_store=dedup_store)
+            location = manifest.get('archive') or (f"almacén: {manifest['dedup']}" if manifest.get('dedup')
+                                                   else 'archivos sueltos')
+            print(f"\n📦 {manifest['backup']} ({location})")
+            for name, ok, detail in results:
+                status = '✅' if ok else ('❔' if ok is None else '❌')
+                print(f"   {status} {name}: {detail}")
+                if ok is False:
+                    failures += 1
+            print(f"   Tiempo: {datetime.now() - start_time}")
+
+        if failures:
+            print(f"\n[ERROR] {failures} componentes con errores de integridad")
+            return False
+        print(f"\n[✓] Todos los componentes verificados correctamente")
+        return True
+
+    def get_remote_agent(self):
+        if self.remote_agent_unavailable or not (self.config or {}).get('settings', {}).get('remote_agent', True):
+            return None
+        if self.remote_agent is None:
+            self.remote_agent = RemoteAgent(self.ssh_client)
+        return self.remote_agent
+
+    def run_agent_job(self, steps):
+        """Ejecuta los pasos con el agente remoto; devuelve None si hay que usar comandos sueltos."""
+        agent = self.get_remote_agent()
+        if agent is None:
+            return None
+        try:
+            return agent.run(steps)
+        except RemoteAgentUnavailable as e:
+            print(f"[WARNING] Agente remoto no disponible ({e}): se usan comandos individuales")
+            self.remote_agent_unavailable = True
+            return None
+
+    def get_seekable_options(self):
+        """Opciones del formato de acceso directo (backup.archive_format: seekable), o None si no se usa."""
+        backup_config = (self.config or {}).get('backup', {})
+        if backup_config.get('archive_format', 'tar.gz') != 'seekable':
+            return None
+        if self.is_dedup_enabled():
+            return None
+        if self.get_remote_agent() is None:
+            print("[WARNING] El formato de acceso directo requiere el agente remoto: se usa tar.gz")
+            return None
+
+        seekable_config = backup_config.get('seekable') or {}
+        codec = seekable_config.get('codec', 'zlib')
+        if codec not in SEEKABLE_CODECS:
+            raise Exception(f"Compresión no válida en backup.seekable.codec: {codec} ({', '.join(SEEKABLE_CODECS)})")
+        return {
+            'codec': codec,
+            'level': int(seekable_config.get('level', 6)),
+            'frame_size': int(float(seekable_config.get('frame_size_mb', 4)) * 1024 * 1024),
+        }
+
+    def record_agent_archive(self, result, remote_backup_path, base_directory=None):
+        if not result['ok']:
+            print(f"[ERROR SSH] {result.get('stderr') or result.get('error') or 'error creando el archivo'}")
+            return False
+        self.remote_checksums[remote_backup_path] = result['sha256']
+        self.remote_sizes[remote_backup_path] = result['size']
+        if base_directory is not None and 'listing' in result:
+            self.component_contents[remote_backup_path] = [
+                os.path.join(base_directory, line.rstrip('/')) for line in result['listing']
+            ]
+        return True
+
+    def fetch_archive_listing(self, listing_path, remote_backup_path, base_directory):
+        output = self.execute_command(f"cat {listing_path}; rm -f {listing_path}")
+        self.component_contents[remote_backup_path] = [
+            os.path.join(base_directory, line.rstrip('/')) for line in output.splitlines() if line.strip()
+        ]
+
     def compress_directory(self, directory_path):
         try:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             folder_name = os.path.basename(directory_path.rstrip('/'))
-            backup_filename = f"{folder_name}_{timestamp}.tar.gz"
+            seekable = self.get_seekable_options()
+            # Con el almacén deduplicado el tar va sin comprimir: gzip impediría reutilizar fragmentos.
+            # En el formato de acceso directo el agente comprime cada archivo por separado.
+            compress = not self.is_dedup_enabled() and not seekable
+            extension = SEEKABLE_EXTENSION if seekable else f".tar{'.gz' if compress else ''}"
+            backup_filename = f"{folder_name}_{timestamp}{extension}"
             remote_backup_path = f"/tmp/{backup_filename}"
 
             print(f"[INFO] Comprimiendo: {directory_path}")
 
-            compress_cmd = f"tar -czf {remote_backup_path} -C {os.path.dirname(directory_path)} {os.path.basename(directory_path)}"
-            result = self.execute_command(compress_cmd)
+            listing_path = f"{remote_backup_path}.files"
+            listing = f"-v --index-file={listing_path} " if self.is_catalog_path_index_enabled() else ""
+            rules = FolderRules.for_folder((self.config or {}).get('backup', {}), directory_path)
+            if rules.is_active():
+                compress_cmd = rules.archive_command(
+                    os.path.dirname(directory_path), os.path.basename(directory_path),
+                    f"-c{'z' if compress else ''}f - {listing}", wrap=self.get_resource_governor().wrap)
+            else:
+                compress_cmd = self.get_resource_governor().wrap(
+                    f"tar -c{'z' if compress else ''}f - {listing}-C {os.path.dirname(directory_path)} {os.path.basename(directory_path)}")
+
+            results = self.run_agent_job([{
+                'op': 'archive', 'path': remote_backup_path, 'listing': listing_path if listing else None,
+                'command': compress_cmd + self.get_resource_governor().rate_limit_pipe(), 'seekable': seekable,
+            }])
+            if results is not None:
+                if not self.record_agent_archive(results[0], remote_backup_path, os.path.dirname(directory_path)):
+                    self.execute_command(f"rm -f {remote_backup_path} {listing_path}")
+                    print(f"[ERROR] No se pudo comprimir {directory_path}")
+                    return None
+                print(f"[OK] Directorio comprimido: {remote_backup_path}")
+                return remote_backup_path
+            if seekable:
+                # Sin agente no hay quien construya el índice en el servidor: tar.gz de siempre
+                return self.compress_directory(directory_path)
+
+            self.create_remote_archive(compress_cmd, remote_backup_path)
+            if listing:
+                self.fetch_archive_listing(listing_path, remote_backup_path, os.path.dirname(directory_path))
 
             check_cmd = f"ls -la {remote_backup_path}"
             check_result = self.execute_command(check_cmd)
@@ -391,6 +887,8 @@ class BackupCLI:
             return None
 
     def get_file_size(self, file_path):
+        if file_path in self.remote_sizes:
+            return self.remote_sizes[file_path]
         try:
             result = self.execute_command(f"stat -c%s {file_path}")
             return int(result.strip()) if result.strip().isdigit() else 0
@@ -421,19 +919,27 @@ class BackupCLI:
             print(f"[ERROR] No se pudo iniciar el servicio {self.mysql_service_name}")
             return False
 
+    def mysql_datadir_archive(self, backup_name):
+        """Ruta remota y comando tar del datadir; sin gzip con el almacén deduplicado, como los directorios."""
+        compress = not self.is_dedup_enabled()
+        backup_path = f"/tmp/{backup_name}.tar{'.gz' if compress else ''}"
+        compress_cmd = "sudo " + self.get_resource_governor().wrap(
+            f"tar -c{'z' if compress else ''}f - -C {os.path.dirname(self.mysql_data_path)} "
+            f"{os.path.basename(self.mysql_data_path)}")
+        return backup_path, compress_cmd
+
     def create_mysql_cold_backup(self, backup_name=None):
         if backup_name is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             backup_name = f"mysql_backup_{timestamp}"
 
-        backup_path = f"/tmp/{backup_name}.tar.gz"
+        backup_path, compress_cmd = self.mysql_datadir_archive(backup_name)
 
         print(f"[INFO] Creando backup en frío de MySQL...")
         print(f"[INFO] Ruta de datos MySQL: {self.mysql_data_path}")
         print(f"[INFO] Archivo de backup: {backup_path}")
 
-        compress_cmd = f"sudo tar -czf {backup_path} -C {os.path.dirname(self.mysql_data_path)} {os.path.basename(self.mysql_data_path)}"
-        self.execute_command(compress_cmd)
+        self.create_remote_archive(compress_cmd, backup_path)
 
         check_cmd = f"ls -la {backup_path}"
         check_result = self.execute_command(check_cmd)
@@ -446,17 +952,45 @@ class BackupCLI:
             return None
 
     def process_mysql_backup(self, local_save_path, mysql_config):
+        mode = mysql_config.get('mode', 'cold')
+        if mode == 'hot':
+            return self.process_mysql_hot_backup(local_save_path, mysql_config)
+        if mode == 'parallel':
+            return self.process_mysql_parallel_backup(local_save_path, mysql_config)
+        if mode != 'cold':
+            print(f"[ERROR] Modo de backup MySQL no válido: {mode}")
+            return []
+
+        local_backup_path = self.process_mysql_cold_backup(local_save_path, mysql_config)
+        return [local_backup_path] if local_backup_path else []
+
+    def process_mysql_cold_backup(self, local_save_path, mysql_config):
         print(f"\n--- Procesando backup MySQL ---")
 
         try:
             backup_name = mysql_config.get('backup_name')
             restart_after_backup = mysql_config.get('restart_after_backup', True)
 
+            with self.get_progress().stage('compress', self.mysql_data_path) as stage:
+                agent_result = self.run_cold_backup_job(backup_name, restart_after_backup, mysql_config)
+                stage['ok'] = agent_result is None or bool(agent_result[0])
+            if agent_result is not None:
+                remote_backup_path, position = agent_result
+                if not remote_backup_path:
+                    raise Exception("No se pudo completar el backup en frío de MySQL")
+                local_backup_path = self.download_mysql_cold_backup(remote_backup_path, local_save_path)
+                if local_backup_path and position:
+                    self.binlog_positions[local_backup_path] = position
+                return local_backup_path
+
             if not self.stop_mysql_service():
                 raise Exception("No se pudo detener el servicio MySQL")
 
+            local_backup_path = None
             try:
-                remote_backup_path = self.create_mysql_cold_backup(backup_name)
+                with self.get_progress().stage('compress', self.mysql_data_path) as stage:
+                    remote_backup_path = self.create_mysql_cold_backup(backup_name)
+                    stage['ok'] = bool(remote_backup_path)
                 if not remote_backup_path:
                     raise Exception("No se pudo completar el backup en frío de MySQL")
 
@@ -474,8 +1008,7 @@ class BackupCLI:
                 if backup_info:
                     print(f"[OK] Backup MySQL completado: {backup_info['size_formatted']}")
 
-                self.execute_command(f"sudo rm -f {remote_backup_path}")
-                print(f"[INFO] Archivo remoto limpiado: {remote_backup_path}")
+                self.cleanup_remote_file(remote_backup_path, sudo=True)
 
                 return local_backup_path
 
@@ -484,11 +1017,336 @@ class BackupCLI:
                     if not self.start_mysql_service():
                         print("[WARNING] No se pudo reiniciar MySQL automáticamente")
                         print("[WARNING] Deberás reiniciar MySQL manualmente: sudo systemctl start mysql")
+                    elif local_backup_path and self.is_binlog_enabled(mysql_config):
+                        # Tras el arranque MySQL abre un binlog nuevo: todo lo posterior a la copia empieza en él
+                        position = BinlogArchiver(self, None, local_save_path, mysql_config).current_position()
+                        if position:
+                            self.binlog_positions[local_backup_path] = {'file': position['file'], 'position': 4}
 
         except Exception as e:
             print(f"[ERROR] Error en backup MySQL: {e}")
             return None
 
+    def run_cold_backup_job(self, backup_name, restart_after_backup, mysql_config):
+        """Parada, copia y arranque de MySQL en un único viaje con el agente remoto.
+
+        MySQL se vuelve a arrancar en cuanto termina el tar, sin esperar a la descarga.
+        Devuelve (ruta remota o None, posición binlog) o None si no hay agente."""
+        if self.get_remote_agent() is None:
+            return None
+
+        backup_name = backup_name or f"mysql_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        backup_path, compress_cmd = self.mysql_datadir_archive(backup_name)
+
+        steps = [
+            {'op': 'stop_service', 'service': self.mysql_service_name},
+            {'op': 'archive', 'path': backup_path, 'command': compress_cmd + self.get_resource_governor().rate_limit_pipe()},
+        ]
+        if restart_after_backup:
+            steps.append({'op': 'start_service', 'service': self.mysql_service_name, 'always': True})
+            if self.is_binlog_enabled(mysql_config):
+                mysql_cmd = self.build_mysql_client_command('mysql', mysql_config)
+                steps.append({'op': 'run', 'command': f"{mysql_cmd} -N -B -e 'SHOW MASTER STATUS' 2>/dev/null || "
+                                                      f"{mysql_cmd} -N -B -e 'SHOW BINARY LOG STATUS'"})
+
+        print(f"[INFO] Backup en frío de MySQL ({self.mysql_data_path}) mediante el agente remoto...")
+        results = self.run_agent_job(steps)
+        if results is None:
+            return None
+
+        stop_result, archive_result = results[0], results[1]
+        if not stop_result['ok']:
+            print(f"[ERROR] No se pudo detener el servicio {self.mysql_service_name} ({stop_result.get('state')})")
+        elif self.record_agent_archive(archive_result, backup_path):
+            print(f"[OK] Backup creado exitosamente: {backup_path} ({archive_result['seconds']}s con MySQL detenido)")
+
+        position = None
+        if restart_after_backup:
+            if not results[2]['ok']:
+                print("[WARNING] No se pudo reiniciar MySQL automáticamente")
+                print("[WARNING] Deberás reiniciar MySQL manualmente: sudo systemctl start mysql")
+            else:
+                print(f"[OK] Servicio {self.mysql_service_name} iniciado correctamente")
+                if len(results) > 3 and results[3]['ok'] and results[3]['stdout'].strip():
+                    # Tras el arranque MySQL abre un binlog nuevo: todo lo posterior a la copia empieza en él
+                    position = {'file': results[3]['stdout'].split('\t')[0].strip(), 'position': 4}
+
+        if not (stop_result['ok'] and archive_result['ok']):
+            self.execute_command(f"rm -f {backup_path}")
+            return None, position
+        return backup_path, position
+
+    def download_mysql_cold_backup(self, remote_backup_path, local_save_path):
+        file_size = self.get_file_size(remote_backup_path)
+        print(f"[INFO] Tamaño del backup MySQL: {self.format_file_size(file_size)}")
+
+        local_backup_path = os.path.join(local_save_path, os.path.basename(remote_backup_path))
+        print(f"[INFO] Descargando MySQL backup a: {local_backup_path}")
+        downloaded = self.download_file(remote_backup_path, local_backup_path)
+
+        self.cleanup_remote_file(remote_backup_path)
+        if not downloaded:
+            raise Exception("Error descargando backup MySQL")
+
+        backup_info = self.get_backup_info(local_backup_path)
+        if backup_info:
+            print(f"[OK] Backup MySQL completado: {backup_info['size_formatted']}")
+        return local_backup_path
+
+    def build_mysql_client_command(self, program, mysql_config):
+        user = mysql_config.get('user')
+        if not user:
+            return f"sudo {program}"
+
+        command = program
+        if mysql_config.get('password'):
+            # Con -p la contraseña quedaría visible en la lista de procesos durante todo el volcado
+            command += f" --defaults-extra-file={shlex.quote(self.mysql_defaults_file(str(mysql_config['password'])))}"
+        command += f" -u {shlex.quote(str(user))} -h {shlex.quote(str(mysql_config.get('host', 'localhost')))}"
+        return command
+
+    def mysql_defaults_file(self, password):
+        """Archivo de opciones en el servidor (modo 0600) con la contraseña de MySQL; se borra al desconectar."""
+        if self.mysql_defaults and self.mysql_defaults[0] == password:
+            return self.mysql_defaults[1]
+        if not self.ssh_client:
+            raise Exception("Se necesita la conexión SSH para preparar las credenciales de MySQL")
+
+        stdin, stdout, stderr = self.ssh_client.exec_command(
+            'umask 077 && mkdir -p "$HOME/.cache/backup-maker" && '
+            'file=$(mktemp "$HOME/.cache/backup-maker/mysql-XXXXXXXX") && cat > "$file" && echo "$file"')
+        stdin.write('[client]\npassword="' + password.replace('\\', '\\\\') + '"\n')
+        stdin.channel.shutdown_write()
+        path = stdout.read().decode('utf-8').strip()
+        if stdout.channel.recv_exit_status() != 0 or not path:
+            raise Exception(f"No se pudo crear el archivo de credenciales de MySQL: {stderr.read().decode('utf-8').strip()}")
+        self.mysql_defaults = (password, path)
+        return path
+
+    def get_mysql_databases_for_dump(self, mysql_config):
+        configured = mysql_config.get('databases') or []
+        if configured:
+            return list(configured)
+
+        mysql_cmd = self.build_mysql_client_command('mysql', mysql_config)
+        output = self.execute_command(f"{mysql_cmd} -N -B -e 'SHOW DATABASES' 2>/dev/null")
+        return [db.strip() for db in output.splitlines()
+                if db.strip() and db.strip() not in self.mysql_system_databases]
+
+    def warn_non_transactional_tables(self, mysql_config, databases):
+        mysql_cmd = self.build_mysql_client_command('mysql', mysql_config)
+        schemas = ", ".join(quote_literal(db) for db in databases)
+        query = (f"SELECT table_schema, COUNT(*) FROM information_schema.tables "
+                 f"WHERE table_type = 'BASE TABLE' AND engine <> 'InnoDB' AND table_schema IN ({schemas}) "
+                 f"GROUP BY table_schema")
+        output = self.execute_command(f"{mysql_cmd} -N -B -e {shlex.quote(query)} 2>/dev/null")
+        for line in output.splitlines():
+            parts = line.split('\t')
+            if len(parts) == 2:
+                print(f"[WARNING] {parts[0]}: {parts[1]} tablas no InnoDB, su volcado no será consistente")
+
+    def stream_command_to_file(self, command, local_path):
+        with self.get_progress().stage('transfer', os.path.basename(local_path)) as stage:
+            stage['ok'] = self._stream_command_to_file(command, local_path)
+            if stage['ok']:
+                stage['bytes'] = os.path.getsize(local_path)
+            return stage['ok']
+
+    def _stream_command_to_file(self, command, local_path):
+        try:
+            channel = self.ssh_client.get_transport().open_session()
+            channel.exec_command(wrap_with_remote_checksum(command))
+
+            hasher = ChunkedHasher(self.get_integrity_chunk_size())
+            download_bucket = self.get_resource_governor().download_bucket
+            cipher = self.get_cipher()
+            encryptor = StreamEncryptor(cipher.for_new_file()) if cipher else None
+            error_chunks = []
+            with open(local_path, 'wb') as local_file, \
+                    self.get_progress().stream(os.path.basename(local_path)) as stream:
+                while True:
+                    data = channel.recv(self.stream_chunk_size)
+                    if not data:
+                        break
+                    local_file.write(encryptor.update(data) if encryptor else data)
+                    hasher.update(data)
+                    stream.add(len(data))
+                    if download_bucket:
+                        download_bucket.consume(len(data))
+
+                    while channel.recv_stderr_ready():
+                        error_chunks.append(channel.recv_stderr(self.stream_chunk_size))
+
+                if encryptor:
+                    local_file.write(encryptor.finalize())
+
+            exit_status = channel.recv_exit_status()
+            while channel.recv_stderr_ready():
+                error_chunks.append(channel.recv_stderr(self.stream_chunk_size))
+            channel.close()
+
+            remote_sha256, error = split_remote_checksum(b"".join(error_chunks).decode('utf-8', errors='replace'))
+            error_lines = [line for line in error.splitlines() if line.strip() and '[Warning]' not in line]
+            if exit_status != 0:
+                print(f"[ERROR SSH] {' '.join(error_lines) or f'código de salida {exit_status}'}")
+                return False
+            if error_lines:
+                print(f"[WARNING] {' '.join(error_lines)}")
+
+            return self.record_integrity(local_path, dict(hasher.result(), encrypted=bool(encryptor)),
+                                         remote_sha256)['match'] is not False
+        except Exception as e:
+            print(f"[ERROR] Error recibiendo flujo remoto: {e}")
+            return False
+
+    def create_mysql_hot_backup(self, database, local_path, mysql_config):
+        dump_cmd = self.build_mysql_client_command('mysqldump', mysql_config)
+        dump_cmd += (" --single-transaction --quick --routines --triggers --events --hex-blob"
+                     f" --databases {shlex.quote(database)}")
+        if self.is_binlog_enabled(mysql_config):
+            dump_cmd += f" {mysql_config['binlog'].get('source_data_option', '--master-data=2')}"
+        if local_path.endswith('.gz'):
+            command = f"bash -o pipefail -c {shlex.quote(f'{dump_cmd} | gzip -c')}"
+        else:
+            command = dump_cmd
+
+        print(f"[INFO] Volcando en caliente: {database}")
+        if not self.stream_command_to_file(command, local_path):
+            if os.path.exists(local_path):
+                os.remove(local_path)
+            return False
+        return True
+
+    def process_mysql_hot_backup(self, local_save_path, mysql_config):
+        print(f"\n--- Procesando backup MySQL en caliente ---")
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        backup_name = mysql_config.get('backup_name') or "mysql_backup"
+
+        databases = self.get_mysql_databases_for_dump(mysql_config)
+        if not databases:
+            print("[ERROR] No se encontraron bases de datos para volcar")
+            return []
+
+        print(f"[INFO] Bases de datos a volcar ({len(databases)}): {', '.join(databases)}")
+        self.warn_non_transactional_tables(mysql_config, databases)
+
+        backup_paths = []
+        for database in databases:
+            extension = "sql" if self.is_dedup_enabled() else "sql.gz"
+            local_backup_path = os.path.join(local_save_path, f"{backup_name}_{database}_{timestamp}.{extension}")
+            if self.create_mysql_hot_backup(database, local_backup_path, mysql_config):
+                if self.is_binlog_enabled(mysql_config):
+                    position = read_dump_binlog_position(local_backup_path, self.open_local_reader)
+                    if position:
+                        self.binlog_positions[local_backup_path] = dict(position, database=database)
+                    else:
+                        print(f"[WARNING] El volcado de {database} no incluye la posición del binlog")
+                backup_info = self.get_backup_info(local_backup_path)
+                if backup_info:
+                    print(f"[OK] Volcado {database} completado: {backup_info['size_formatted']}")
+                backup_paths.append(local_backup_path)
+            else:
+                print(f"[ERROR] Error volcando la base de datos {database}")
+
+        return backup_paths
+
+    def process_mysql_parallel_backup(self, local_save_path, mysql_config):
+        print(f"\n--- Procesando backup MySQL paralelo ---")
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        backup_name = mysql_config.get('backup_name') or "mysql_backup"
+        parallel_config = mysql_config.get('parallel', {})
+
+        databases = self.get_mysql_databases_for_dump(mysql_config)
+        if not databases:
+            print("[ERROR] No se encontraron bases de datos para volcar")
+            return []
+
+        self.warn_non_transactional_tables(mysql_config, databases)
+
+        dumper = ParallelMySQLDumper(
+            self, mysql_config,
+            workers=parallel_config.get('workers', 4),
+            chunk_rows=parallel_config.get('chunk_rows', 100000),
+            insert_rows=parallel_config.get('insert_rows', 1000)
+        )
+
+        backup_paths = []
+        for database in databases:
+            output_dir = os.path.join(local_save_path, f"{backup_name}_{database}_{timestamp}")
+            try:
+                manifest_path = dumper.dump_database(database, output_dir)
+            except Exception as e:
+                print(f"[ERROR] Error en volcado paralelo de {database}: {e}")
+                continue
+
+            with open(manifest_path, 'r', encoding='utf-8') as file:
+                manifest = json.load(file)
+            binlog = manifest.get('binlog')
+            if binlog:
+                self.binlog_positions[manifest_path] = dict(binlog, database=database)
+
+            dump_files = [os.path.join(output_dir, name) for name in sorted(os.listdir(output_dir))]
+            total_size = sum(os.path.getsize(path) for path in dump_files)
+            chunk_count = sum(len(table['chunks']) for table in manifest['tables'])
+            print(f"[OK] Volcado paralelo {database} completado: {chunk_count} fragmentos, "
+                  f"{len(manifest['views'])} vistas, {self.format_file_size(total_size)}")
+            print(f"[INFO] Manifiesto: {manifest_path}")
+            backup_paths.extend(dump_files)
+
+        return backup_paths
+
+    def find_parallel_dump_manifests(self, local_save_path):
+        manifests = []
+        for root, _, files in os.walk(local_save_path):
+            if MANIFEST_NAME in files:
+                manifests.append(os.path.join(root, MANIFEST_NAME))
+        return sorted(manifests)
+
+    def restore_parallel_dump_option(self):
+        print("\nRESTAURAR VOLCADO MySQL PARALELO")
+        print("-" * 40)
+
+        if not self.load_config():
+            return
+
+        local_save_path = self.config['backup']['local_save_path']
+        manifests = self.find_parallel_dump_manifests(local_save_path)
+        if not manifests:
+            print(f"[ERROR] No hay volcados paralelos en {local_save_path}")
+            print("[INFO] Si el volcado está dentro de un ZIP final, extráelo primero en esa carpeta")
+            return
+
+        for i, manifest_path in enumerate(manifests, 1):
+            print(f"{i}. {os.path.relpath(os.path.dirname(manifest_path), local_save_path)}")
+        print("0. Cancelar")
+
+        try:
+            choice = int(input("Selecciona un volcado (número): ").strip())
+        except ValueError:
+            print("[ERROR] Opción inválida")
+            return
+        if choice == 0 or not 1 <= choice <= len(manifests):
+            print("Operación cancelada")
+            return
+
+        manifest_path = manifests[choice - 1]
+        target_database = input("Base de datos destino (Enter para la original): ").strip() or None
+
+        mysql_config = self.config.get('mysql', {})
+        workers = mysql_config.get('parallel', {}).get('workers', 4)
+
+        if not self.establish_connection():
+            return
+
+        start_time = datetime.now()
+        try:
+            ParallelMySQLLoader(self, mysql_config, workers=workers).load(manifest_path, target_database)
+            print(f"[✓] Volcado restaurado en {datetime.now() - start_time}")
+        except Exception as e:
+            print(f"[ERROR] Error restaurando volcado paralelo: {e}")
+
     def ensure_local_directory(self, path):
         try:
             os.makedirs(path, exist_ok=True)
@@ -522,33 +1380,33 @@ class BackupCLI:
             pass
         return None
 
-    def create_final_backup_zip(self, local_save_path, backup_files):
+    def start_final_backup_zip(self, local_save_path):
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         final_zip_name = f"backup_completo_{timestamp}.zip"
         final_zip_path = os.path.join(local_save_path, final_zip_name)
 
-        print(f"\n--- Creando archivo ZIP final ---")
-        print(f"[INFO] Creando: {final_zip_name}")
+        print(f"[INFO] ZIP final (se ensambla a medida que terminan los componentes): {final_zip_name}")
+        return StreamingZipAssembler(final_zip_path, local_save_path)
+
+    def finish_final_backup_zip(self, assembler, local_save_path, backup_files):
+        print(f"\n--- Finalizando archivo ZIP final ---")
 
         try:
-            with zipfile.ZipFile(final_zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for backup_file in backup_files:
-                    if os.path.exists(backup_file):
-                        arcname = os.path.basename(backup_file)
-                        zipf.write(backup_file, arcname)
-                        print(f"[INFO] Añadido al ZIP: {arcname}")
+            final_zip_path = assembler.finish()
+            if assembler.errors:
+                print(f"[WARNING] {len(assembler.errors)} componentes no se añadieron al ZIP y se conservan sueltos")
+            if not final_zip_path:
+                print("[ERROR] No se añadió ningún componente al ZIP final")
+                return None
 
             backup_info = self.get_backup_info(final_zip_path)
             if backup_info:
-                print(f"[OK] ZIP final creado: {backup_info['size_formatted']}")
+                stored = sum(1 for entry in assembler.entries if entry['stored'])
+                print(f"[OK] ZIP final creado: {backup_info['size_formatted']} "
+                      f"({len(assembler.entries)} componentes, {stored} sin recomprimir)")
 
-            for backup_file in backup_files:
-                try:
-                    if os.path.exists(backup_file):
-                        os.remove(backup_file)
-                        print(f"[INFO] Eliminado archivo individual: {os.path.basename(backup_file)}")
-                except OSError as e:
-                    print(f"[WARNING] No se pudo eliminar {backup_file}: {e}")
+            # Solo los componentes que entraron en el ZIP: los que fallaron se conservan sueltos
+            self.remove_individual_backups(local_save_path, [entry['path'] for entry in assembler.entries])
 
             return final_zip_path
 
@@ -556,25 +1414,704 @@ class BackupCLI:
             print(f"[ERROR] Error creando ZIP final: {e}")
             return None
 
-    def clean_old_backups(self, directory, max_age_days=7):
-        deleted_files = []
-        try:
-            cutoff_date = datetime.now() - timedelta(days=max_age_days)
+    def create_final_backup_zip(self, local_save_path, backup_files):
+        assembler = self.start_final_backup_zip(local_save_path)
+        assembler.add_all(backup_files)
+        return self.finish_final_backup_zip(assembler, local_save_path, backup_files)
+
+    def remove_individual_backups(self, local_save_path, backup_files):
+        for backup_file in backup_files:
+            try:
+                if os.path.exists(backup_file):
+                    os.remove(backup_file)
+                    print(f"[INFO] Eliminado archivo individual: {os.path.basename(backup_file)}")
+            except OSError as e:
+                print(f"[WARNING] No se pudo eliminar {backup_file}: {e}")
+
+        for backup_dir in sorted({os.path.dirname(f) for f in backup_files}, reverse=True):
+            if os.path.abspath(backup_dir) != os.path.abspath(local_save_path):
+                try:
+                    os.rmdir(backup_dir)
+                except OSError:
+                    pass
+
+    def is_catalog_path_index_enabled(self):
+        catalog_config = (self.config or {}).get('backup', {}).get('catalog', {})
+        return bool(catalog_config.get('index_paths', True))
+
+    def get_catalog(self, backup_config):
+        catalog_path = backup_config.get('catalog', {}).get('path') or \
+            os.path.join(backup_config['local_save_path'], CATALOG_NAME)
+        catalog = BackupCatalog(catalog_path)
+
+        imported = catalog.import_legacy_archives(backup_config['local_save_path'])
+        dedup_store = self.get_dedup_store(backup_config)
+        if dedup_store:
+            imported += catalog.import_dedup_backups(dedup_store.list_backups())
+        if imported:
+            print(f"[INFO] Catálogo: registrados {len(imported)} backups existentes")
+        return catalog
+
+    def get_retention_policy(self, backup_config):
+        retention = backup_config.get('retention', {})
+        return {
+            'daily': int(retention.get('daily', 7)),
+            'weekly': int(retention.get('weekly', 4)),
+            'monthly': int(retention.get('monthly', 6)),
+        }
+
+    def catalog_components(self, catalog, run_id, kind, source, paths, local_save_path, seconds):
+        for path in paths:
+            record = self.integrity_records.get(os.path.abspath(path), {})
+            # Los índices JSON acompañan al archivo pero no contienen rutas del origen
+            catalog.add_component(
+                run_id, 'index' if path.endswith('.json') else kind, source, os.path.relpath(path, local_save_path), os.path.getsize(path),
+                sha256=record.get('sha256'), remote_sha256=record.get('remote_sha256'),
+                seconds=seconds, contents=self.component_contents.pop(path, None),
+                position=self.binlog_positions.pop(path, None)
+            )
+
+    def apply_retention(self, catalog, local_save_path, backup_config, dedup_store=None):
+        _, delete = catalog.plan_retention(**self.get_retention_policy(backup_config))
+        deleted_runs = []
+        freed_bytes = 0
 
-            for filename in os.listdir(directory):
-                file_path = os.path.join(directory, filename)
+        for run in delete:
+            for file_path in catalog.run_files(run, local_save_path):
                 if os.path.isfile(file_path):
-                    file_time = datetime.fromtimestamp(os.path.getmtime(file_path))
-                    if file_time < cutoff_date:
-                        os.remove(file_path)
-                        deleted_files.append(filename)
-                        print(f"[INFO] Eliminado backup antiguo: {filename}")
+                    freed_bytes += os.path.getsize(file_path)
+                    os.remove(file_path)
+                if os.path.isfile(file_path + UPLOAD_STATE_SUFFIX):
+                    os.remove(file_path + UPLOAD_STATE_SUFFIX)
+            if dedup_store and run['dedup_name'] and os.path.exists(dedup_store.index_path(run['dedup_name'])):
+                dedup_store.delete_backup(run['dedup_name'])
+            catalog.delete_run(run['id'])
+            deleted_runs.append(run['name'])
+            print(f"[INFO] Eliminado backup antiguo: {run['name']}")
+
+        for binlog in catalog.prunable_binlogs():
+            binlog_path = os.path.join(local_save_path, binlog['path'])
+            if os.path.isfile(binlog_path):
+                freed_bytes += os.path.getsize(binlog_path)
+                os.remove(binlog_path)
+            catalog.delete_binlog(binlog['id'])
+
+        if dedup_store:
+            _, freed_chunks = dedup_store.garbage_collect()
+            freed_bytes += freed_chunks
+        catalog.prune_paths()
+        return deleted_runs, freed_bytes
+
+    def search_catalog_option(self):
+        print("\nBUSCAR EN EL CATÁLOGO DE BACKUPS")
+        print("-" * 40)
+
+        if not self.load_config():
+            return
+
+        backup_config = self.config['backup']
+        catalog = self.get_catalog(backup_config)
+        try:
+            path = input("Ruta remota a buscar (vacío para listar backups): ").strip()
+            if not path:
+                for run in catalog.list_runs()[:20]:
+                    print(f"   • {run['name']}  {run['started']}  {run['status']:<8} "
+                          f"{self.format_file_size(run['size'])}  {run['archive'] or run['dedup_name'] or ''}")
+                return
+
+            date_input = input("¿Estado a fecha (AAAA-MM-DD, vacío para la más reciente)?: ").strip()
+            before = f"{date_input}T23:59:59" if date_input else None
+
+            matches = catalog.find_path(path, before)
+            if not matches:
+                print(f"[INFO] Ningún backup contiene {path}")
+                return
+
+            for match in matches:
+                container = match['archive'] or f"almacén: {match['dedup_name']}"
+                print(f"   • {match['started']}  {container} → {match['component']}")
+        finally:
+            catalog.close()
+
+    def is_binlog_enabled(self, mysql_config):
+        return bool(mysql_config.get('binlog', {}).get('enabled', False))
+
+    def follow_binlogs_option(self):
+        print("\nARCHIVAR BINLOGS DE MySQL")
+        print("-" * 40)
+
+        if not self.load_config():
+            return
+
+        backup_config = self.config['backup']
+        mysql_config = self.config.get('mysql', {})
+        if not self.is_binlog_enabled(mysql_config):
+            print("[ERROR] El archivado de binlogs no está habilitado (mysql.binlog.enabled)")
+            return
+
+        if not self.establish_connection():
+            return
+
+        catalog = self.get_catalog(backup_config)
+        try:
+            archiver = BinlogArchiver(self, catalog, backup_config['local_save_path'], mysql_config)
+            archiver.follow(int(mysql_config['binlog'].get('interval', 300)))
+        except Exception as e:
+            print(f"[ERROR] Error archivando binlogs: {e}")
+        finally:
+            catalog.close()
+
+    def benchmark_transfer_option(self):
+        print("\nMEDIR Y AJUSTAR TRANSFERENCIAS SSH")
+        print("-" * 40)
+
+        if not self.load_config():
+            return
+
+        benchmark_config = self.config.get('benchmark', {})
+        default_size = int(benchmark_config.get('size_mb', 256))
+        answer = input(f"Tamaño del flujo de prueba en MB [{default_size}]: ").strip()
+        try:
+            size_mb = int(answer) if answer else default_size
+        except ValueError:
+            print("[ERROR] Tamaño no válido")
+            return
+
+        benchmark = TransferBenchmark(self.create_ssh_client, size=size_mb * 1024 * 1024,
+                                      source=benchmark_config.get('source'),
+                                      sample_paths=self.config.get('backup', {}).get('remote_folders'),
+                                      format_size=self.format_file_size)
+        options = {key: benchmark_config[key] for key in ('ciphers', 'window_sizes_mb', 'packet_sizes_kb')
+                   if benchmark_config.get(key)}
+
+        print(f"[INFO] Probando combinaciones con hasta {size_mb} MB de "
+              f"{benchmark.source or 'los directorios del backup'}...")
+        try:
+            best = benchmark.run(**options)
+        except Exception as e:
+            print(f"[ERROR] Error en la medición: {e}")
+            return
+
+        if not best:
+            print("[ERROR] Ninguna combinación completó la prueba")
+            return
+
+        current = next((result for result in benchmark.results
+                        if result['profile'] == self.config.get(PROFILE_KEY)), None)
+        print(f"\n[OK] Mejor perfil: {benchmark.describe(best['profile'])}")
+        print(f"     {best['mb_per_second']:.1f} MB/s, CPU {best['cpu_percent']:.0f}%")
+        if current and current is not best:
+            print(f"     Perfil actual: {current['mb_per_second']:.1f} MB/s")
+
+        confirm = input(f"¿Guardar el perfil en {self.config_path}? (s/N): ").strip().lower()
+        if confirm not in ('s', 'si', 'sí', 'y', 'yes'):
+            print("[INFO] Perfil no guardado")
+            return
+
+        try:
+            save_ssh_profile(self.config_path, best['profile'])
+            self.config[PROFILE_KEY] = best['profile']
+            print(f"[OK] Perfil guardado (copia anterior en {self.config_path}.bak)")
+            print("[INFO] Se aplicará en las próximas conexiones")
+        except OSError as e:
+            print(f"[ERROR] No se pudo guardar el perfil: {e}")
+
+    def point_in_time_restore_option(self):
+        print("\nRESTAURAR MySQL A UN PUNTO EN EL TIEMPO")
+        print("-" * 40)
+
+        if not self.load_config():
+            return
+
+        backup_config = self.config['backup']
+        mysql_config = self.config.get('mysql', {})
+        local_save_path = backup_config['local_save_path']
+
+        target_input = input("Fecha y hora objetivo (AAAA-MM-DD HH:MM:SS): ").strip()
+        try:
+            target = datetime.strptime(target_input, "%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            print("[ERROR] Formato de fecha inválido")
+            return
+
+        if not self.establish_connection():
+            return
+
+        catalog = self.get_catalog(backup_config)
+        try:
+            archiver = BinlogArchiver(self, catalog, local_save_path, mysql_config)
+            try:
+                # Se cierra y descarga el binlog activo para llegar hasta el instante pedido
+                archiver.archive()
+            except Exception as e:
+                print(f"[WARNING] No se pudieron archivar los binlogs pendientes: {e}")
+
+            run, base = catalog.find_pitr_base(target.isoformat())
+            if not run:
+                print("[ERROR] No hay ningún backup MySQL con posición de binlog anterior a esa fecha")
+                return
+
+            print(f"[INFO] Backup base: {run['name']} ({run['started']})")
+            for position in base:
+                print(f"   • {position['name']}: {position['binlog_file']}:{position['binlog_position']}")
+
+            engine = StreamingRestoreEngine(self, local_save_path, self.get_dedup_store(backup_config))
+            if input("¿Restaurar primero el backup base? (S/n): ").strip().lower() not in ('n', 'no'):
+                base_groups = []
+                for component in base:
+                    unit = dict(component, archive=run['archive'], dedup_name=run['dedup_name'])
+                    if unit['name'].endswith(('.sql', '.sql.gz')):
+                        base_groups.append([(unit['name'], lambda unit=unit: engine.restore_sql(unit, mysql_config))])
+                    elif unit['name'].endswith(MANIFEST_NAME):
+                        print("[ERROR] Restaura antes el volcado paralelo con la opción 8 y responde 'n' aquí")
+                        return
+                    else:
+                        base_groups.append([(unit['name'], lambda unit=unit: engine.restore_mysql_datadir(
+                            unit, self.mysql_data_path, self.mysql_service_name))])
+
+                base_summary = engine.restore(base_groups)
+                if base_summary['errors']:
+                    print("[ERROR] La restauración del backup base falló; no se aplican binlogs")
+                    return
+
+            steps = archiver.replay(engine, base, target.strftime("%Y-%m-%d %H:%M:%S"), int(target.timestamp()))
+            print(f"[INFO] Subiendo y aplicando binlogs hasta {target_input} ({len(steps)} pasos)")
+            summary = engine.restore([steps])
+
+            print(f"\n=== RESUMEN ===")
+            print(f"Pasos completados: {len(summary['steps'])}/{len(steps)}")
+            print(f"Tiempo: {summary['seconds']:.1f}s")
+            print(f"Estado: {'COMPLETADO' if not summary['errors'] else 'ERROR'}")
+        except Exception as e:
+            print(f"[ERROR] Error en la restauración a un punto en el tiempo: {e}")
+        finally:
+            catalog.close()
+
+    def get_restore_units(self, catalog, run):
+        units = [dict(component, archive=run['archive'], dedup_name=run['dedup_name'])
+                 for component in catalog.get_components(run['id'])]
+        if units or not run['archive']:
+            return units
+
+        # Backups anteriores al catálogo: los componentes se deducen del contenido del ZIP
+        archive_path = os.path.join(self.config['backup']['local_save_path'], run['archive'])
+        with zipfile.ZipFile(archive_path) as archive:
+            names = archive.namelist()
+        mysql_prefix = self.config.get('mysql', {}).get('backup_name') or 'mysql_backup'
+        for name in names:
+            is_mysql = name.endswith(('.sql', '.sql.gz')) or os.path.basename(name).startswith(mysql_prefix)
+            units.append({'name': name, 'kind': 'index' if name.endswith('.json') else ('mysql' if is_mysql else 'directory'),
+                          'source': None, 'sha256': None, 'archive': run['archive'], 'dedup_name': None})
+        return units
+
+    def get_offsite_uploader(self):
+        offsite_config = (self.config or {}).get('offsite', {})
+        if not offsite_config.get('enabled', False):
+            return None
+        return ObjectStorageUploader(offsite_config, self.get_progress())
+
+    def upload_offsite(self, uploader, paths):
+        """Sube los archivos al almacenamiento externo; devuelve un resultado por archivo."""
+        results = []
+        for path in paths:
+            print(f"[INFO] Subiendo: {os.path.basename(path)} → s3://{uploader.bucket}/{uploader.object_key(path)}")
+            with self.get_progress().stage('upload', os.path.basename(path)) as stage:
+                try:
+                    result = uploader.upload_file(path)
+                    stage['bytes'] = result['size']
+                except Exception as e:
+                    stage['ok'] = False
+                    print(f"[ERROR] No se pudo subir {os.path.basename(path)}: {e}")
+                    results.append({'key': uploader.object_key(path), 'ok': False, 'error': str(e)})
+                    continue
+            print(f"[OK] Subido {self.format_file_size(result['size'])} en {result['parts']} partes "
+                  f"({stage['seconds']:.1f}s, {self.format_file_size(result['size'] / max(stage['seconds'], 0.001))}/s)")
+            results.append(dict(result, ok=True, seconds=stage['seconds']))
+        return results
+
+    def upload_offsite_option(self, run_name=None):
+        print("\nSUBIR BACKUP A ALMACENAMIENTO EXTERNO")
+        print("-" * 40)
+
+        if not self.load_config():
+            return False
+
+        backup_config = self.config['backup']
+        catalog = self.get_catalog(backup_config)
+        try:
+            uploader = self.get_offsite_uploader()
+            if uploader is None:
+                print("[ERROR] El almacenamiento externo no está activado (offsite.enabled)")
+                return False
+
+            run = self.choose_catalog_run(catalog, run_name)
+            if run is None:
+                return False
+            paths = [path for path in catalog.run_files(run, backup_config['local_save_path']) if os.path.isfile(path)]
+            if not paths:
+                print("[INFO] No quedan archivos locales de este backup")
+                return False
+
+            results = self.upload_offsite(uploader, paths)
+            failed = sum(1 for result in results if not result['ok'])
+            if failed:
+                print(f"[WARNING] {failed} archivos no se subieron; vuelve a ejecutar la opción para reanudarlos")
+                return False
+            print(f"[✓] Backup {run['name']} subido correctamente")
+            return True
+        except Exception as e:
+            print(f"[ERROR] Error subiendo backup: {e}")
+            return False
+        finally:
+            catalog.close()
+
+    def choose_catalog_run(self, catalog, run_name=None):
+        """Ejecución elegida por el usuario, o la indicada por nombre ('latest' para la más reciente)."""
+        runs = [run for run in catalog.list_runs() if run['status'] in ('ok', 'imported')]
+        if not runs:
+            print("[INFO] No hay backups en el catálogo")
+            return None
+        if run_name:
+            run = runs[0] if run_name == 'latest' else next((run for run in runs if run['name'] == run_name), None)
+            if run is None:
+                print(f"[ERROR] No hay ningún backup '{run_name}' en el catálogo")
+            return run
+
+        runs = runs[:20]
+
+        for i, run in enumerate(runs, 1):
+            print(f"{i}. {run['name']} ({run['started']}, {self.format_file_size(run['size'])})")
+        print("0. Cancelar")
+
+        try:
+            choice = int(input("Selecciona un backup (número): ").strip())
+        except ValueError:
+            print("[ERROR] Opción inválida")
+            return None
+        if choice == 0 or not 1 <= choice <= len(runs):
+            print("Operación cancelada")
+            return None
+        return runs[choice - 1]
+
+    def extract_files_option(self, run_name=None, prefix=None, destination=None, component=None):
+        """Sin argumentos pregunta cada dato; con ellos (línea de comandos) no pregunta nada."""
+        print("\nEXTRAER ARCHIVOS DE UN BACKUP")
+        print("-" * 40)
+
+        if not self.load_config():
+            return False
+
+        backup_config = self.config['backup']
+        local_save_path = backup_config['local_save_path']
+        catalog = self.get_catalog(backup_config)
+        archive = None
+        try:
+            run = self.choose_catalog_run(catalog, run_name)
+            if run is None:
+                return False
+
+            units = [unit for unit in self.get_restore_units(catalog, run) if SeekableArchive.is_seekable(unit['name'])]
+            if not units:
+                print("[INFO] Este backup no tiene directorios en formato de acceso directo "
+                      "(backup.archive_format: seekable)")
+                return False
+
+            unit = units[0]
+            if component:
+                unit = next((candidate for candidate in units
+                             if component in (candidate['source'], candidate['name'])), None)
+                if unit is None:
+                    print(f"[ERROR] El backup no tiene el directorio '{component}'")
+                    return False
+            elif len(units) > 1:
+                for i, candidate in enumerate(units, 1):
+                    print(f"{i}. {candidate['source'] or candidate['name']}")
+                if run_name is not None:
+                    print("[ERROR] El backup tiene varios directorios: indica cuál con --component")
+                    return False
+                try:
+                    unit = units[int(input("Selecciona un directorio (número): ").strip()) - 1]
+                except (ValueError, IndexError):
+                    print("[ERROR] Opción inválida")
+                    return False
+
+            engine = StreamingRestoreEngine(self, local_save_path)
+            archive = engine.open_seekable(unit)
+
+            if prefix is None:
+                prefix = input("Ruta a extraer (archivo o directorio, Enter para todo): ").strip()
+            # Las entradas son relativas al padre del directorio respaldado: se aceptan también rutas absolutas
+            base = os.path.dirname(unit['source'].rstrip('/')) if unit.get('source') else None
+            if base and prefix.startswith(base.rstrip('/') + '/'):
+                prefix = prefix[len(base.rstrip('/')) + 1:]
+            entries = archive.find(prefix)
+            if not entries:
+                print(f"[INFO] No hay entradas que coincidan con '{prefix}'")
+                return False
+
+            files = [entry for entry in entries if entry['type'] == 'f']
+            print(f"[INFO] {len(entries)} entradas, {len(files)} archivos, "
+                  f"{self.format_file_size(sum(entry['size'] for entry in files))}")
+            for entry in entries[:20]:
+                print(f"  {entry['name']}{'/' if entry['type'] == 'd' else ''}")
+            if len(entries) > 20:
+                print(f"  ... y {len(entries) - 20} más")
+
+            default_destination = os.path.join(local_save_path, f"extract_{run['name']}")
+            if destination is None:
+                destination = input(f"Directorio local de destino (Enter para {default_destination}): ").strip()
+            destination = destination or default_destination
+
+            start = time.monotonic()
+            written = archive.extract(entries, destination)
+            elapsed = time.monotonic() - start
+            print(f"[OK] Extraídos {self.format_file_size(written)} en {destination} ({elapsed:.2f}s)")
+            return True
+        except Exception as e:
+            print(f"[ERROR] Error extrayendo archivos: {e}")
+            return False
+        finally:
+            if archive is not None:
+                archive.source.close()
+            catalog.close()
+
+    def restore_backup_option(self):
+        print("\nRESTAURAR BACKUP EN EL SERVIDOR")
+        print("-" * 40)
+
+        if not self.load_config():
+            return
+
+        backup_config = self.config['backup']
+        mysql_config = self.config.get('mysql', {})
+        local_save_path = backup_config['local_save_path']
+        catalog = self.get_catalog(backup_config)
+
+        try:
+            run = self.choose_catalog_run(catalog)
+            if run is None:
+                return
+
+            units = self.get_restore_units(catalog, run)
+            targets = []
+            directories = {}
+            for unit in units:
+                if unit['kind'] in ('directory', 'index'):
+                    directories.setdefault(unit['source'] or unit['name'], []).append(unit)
+                elif unit['name'].endswith(('.sql', '.sql.gz')):
+                    targets.append(('sql', unit['name'], [unit]))
+                elif unit['name'].endswith(('.tar', '.tar.gz')) and os.sep not in unit['name']:
+                    targets.append(('datadir', f"{unit['name']} → {self.mysql_data_path}", [unit]))
+            targets = [('directory', source, source_units) for source, source_units in directories.items()] + targets
+
+            if any(unit['kind'] == 'mysql' and os.sep in unit['name'] for unit in units):
+                print("[INFO] Los volcados paralelos se restauran con la opción 8")
+            if not targets:
+                print("[INFO] Este backup no tiene componentes restaurables")
+                return
+
+            print("\nComponentes:")
+            for i, (target_kind, label, _) in enumerate(targets, 1):
+                print(f"{i}. [{target_kind}] {label}")
+            selection = input("Componentes a restaurar (p. ej. 1,3; Enter para todos): ").strip()
+            try:
+                selected = [targets[int(item) - 1] for item in selection.split(',')] if selection else targets
+            except (ValueError, IndexError):
+                print("[ERROR] Selección inválida")
+                return
+
+            target_root = None
+            if any(target_kind == 'directory' for target_kind, _, _ in selected):
+                default_root = f"/tmp/restore_{run['name']}"
+                answer = input(f"Destino remoto de los directorios (Enter para {default_root}, "
+                               f"'original' para su ubicación original): ").strip()
+                target_root = None if answer == 'original' else (answer or default_root)
+
+            if any(target_kind == 'datadir' for target_kind, _, _ in selected):
+                confirm = input(f"Se detendrá {self.mysql_service_name} y se sustituirá {self.mysql_data_path}. "
+                                f"¿Continuar? (s/N): ").strip().lower()
+                if confirm not in ('s', 'si', 'sí', 'y', 'yes'):
+                    selected = [target for target in selected if target[0] != 'datadir']
+
+            if not self.establish_connection():
+                return
+
+            engine = StreamingRestoreEngine(self, local_save_path, self.get_dedup_store(backup_config),
+                                            workers=self.config.get('restore', {}).get('workers', 3))
+            datadir_groups = []
+            groups = []
+            for target_kind, label, target_units in selected:
+                if target_kind == 'directory':
+                    source = target_units[0]['source']
+                    chain = [dict(row) for row in catalog.restore_chain(source, run['started'])] if source else target_units
+                    groups.append([
+                        (unit['name'], lambda unit=unit: engine.apply_deletions(unit, target_root))
+                        if unit['kind'] == 'index' else
+                        (unit['name'], lambda unit=unit: engine.restore_archive(unit, target_root))
+                        for unit in chain
+                    ])
+                elif target_kind == 'sql':
+                    groups.append([(label, lambda unit=target_units[0]: engine.restore_sql(unit, mysql_config))])
+                else:
+                    datadir_groups.append([(label, lambda unit=target_units[0]: engine.restore_mysql_datadir(
+                        unit, self.mysql_data_path, self.mysql_service_name))])
+
+            # El directorio de datos se restaura antes que cualquier volcado SQL, con MySQL detenido
+            summaries = [engine.restore(batch) for batch in (datadir_groups, groups) if batch]
+            total_bytes = sum(summary['bytes'] for summary in summaries)
+            total_seconds = sum(summary['seconds'] for summary in summaries)
+            errors = sum(len(summary['errors']) for summary in summaries)
+
+            print(f"\n=== RESUMEN DE RESTAURACIÓN ===")
+            print(f"Datos enviados: {self.format_file_size(total_bytes)}")
+            print(f"Tiempo total (RTO): {total_seconds:.1f}s")
+            if total_seconds:
+                print(f"Caudal medio: {self.format_file_size(total_bytes / total_seconds)}/s")
+            print(f"Estado: {'COMPLETADO' if not errors else f'{errors} ERRORES'}")
+        except Exception as e:
+            print(f"[ERROR] Error restaurando backup: {e}")
+        finally:
+            catalog.close()
+
+    def get_encryption_config(self):
+        return (self.config or {}).get('encryption', {})
+
+    def get_cipher(self):
+        """Cifrador de los backups nuevos, o None si el cifrado no está activado."""
+        encryption_config = self.get_encryption_config()
+        if not encryption_config.get('enabled', False):
+            return None
+        if self.is_dedup_enabled():
+            if self.cipher is None:
+                print("[WARNING] El cifrado no se aplica con el almacén deduplicado (impediría reutilizar fragmentos)")
+                self.cipher = False
+            return None
+        if not self.cipher:
+            key = load_key(encryption_config.get('key_file', 'backup.key'), create=True)
+            self.encryption_key = key
+            self.cipher = FrameCipher(key, encryption_config.get('algorithm', 'aes-256-gcm'),
+                                      int(encryption_config.get('frame_size_kb', 1024)) * 1024)
+        return self.cipher
+
+    def encryption_summary(self):
+        if not self.cipher:
+            return None
+        stats = self.cipher.stats
+        transfer_seconds = self.get_progress().stage_totals()['transfer']['seconds']
+        return {
+            'algorithm': self.cipher.algorithm,
+            'bytes': stats.bytes,
+            'seconds': round(stats.seconds, 3),
+            'bytes_per_second': stats.bytes / stats.seconds if stats.seconds else 0,
+            'transfer_overhead_percent': round(stats.seconds / transfer_seconds * 100, 1) if transfer_seconds else 0.0,
+        }
+
+    def get_encryption_key(self):
+        if self.encryption_key is None:
+            self.encryption_key = load_key(self.get_encryption_config().get('key_file', 'backup.key'))
+        return self.encryption_key
+
+    def open_local_writer(self, path):
+        """Abre un archivo de backup para escribir, cifrado si el cifrado está activado."""
+        cipher = self.get_cipher()
+        if cipher:
+            return EncryptingWriter(open(path, 'wb'), cipher.for_new_file())
+        return open(path, 'wb')
+
+    def open_local_reader(self, path):
+        """Abre un archivo de backup para leer, descifrándolo si está cifrado."""
+        if is_encrypted_file(path):
+            return io.BufferedReader(DecryptingReader(open(path, 'rb'), self.get_encryption_key()))
+        return open(path, 'rb')
+
+    def is_dedup_enabled(self):
+        return bool(self.config and self.config.get('backup', {}).get('dedup', {}).get('enabled', False))
+
+    def get_dedup_store_path(self, backup_config):
+        dedup_config = backup_config.get('dedup', {})
+        return dedup_config.get('path') or os.path.join(backup_config['local_save_path'], '.store')
+
+    def get_dedup_store(self, backup_config):
+        dedup_config = backup_config.get('dedup', {})
+        if not dedup_config.get('enabled', False):
+            return None
+        return DedupStore(
+            self.get_dedup_store_path(backup_config),
+            avg_chunk_size=dedup_config.get('avg_chunk_size', 1024 * 1024),
+            compression_level=dedup_config.get('compression_level', 6)
+        )
+
+    def start_dedup_backup(self, backup_config, local_save_path, backup_name):
+        """Backup del almacén deduplicado al que se añade cada componente según termina, o None sin almacén."""
+        dedup_store = self.get_dedup_store(backup_config)
+        return DedupBackup(dedup_store, backup_name, local_save_path) if dedup_store else None
+
+    def finish_dedup_backup(self, dedup_backup, local_save_path):
+        print(f"\n--- Guardando en almacén deduplicado ---")
+        try:
+            result = dedup_backup.finish()
         except Exception as e:
-            print(f"[ERROR] Error limpiando backups antiguos: {e}")
+            print(f"[ERROR] Error guardando en almacén deduplicado: {e}")
+            return None
+
+        if dedup_backup.errors:
+            print(f"[WARNING] {len(dedup_backup.errors)} componentes no se guardaron en el almacén y se conservan sueltos")
+        print(f"[OK] Backup {dedup_backup.name}: {self.format_file_size(result['size'])} respaldados, "
+              f"{self.format_file_size(result['written'])} escritos en disco")
+        # Los componentes se borraron al guardarlos; quedan sus directorios (p. ej. los de volcados paralelos)
+        self.remove_individual_backups(local_save_path, dedup_backup.sources)
+        return dedup_backup.name
+
+    def restore_dedup_backup_option(self):
+        print("\nRESTAURAR BACKUP DEL ALMACÉN DEDUPLICADO")
+        print("-" * 40)
+
+        if not self.load_config():
+            return
+
+        dedup_store = self.get_dedup_store(self.config['backup'])
+        if not dedup_store:
+            print("[ERROR] El almacén deduplicado no está habilitado (backup.dedup.enabled)")
+            return
+
+        backups = dedup_store.list_backups()
+        if not backups:
+            print("[INFO] No hay backups en el almacén")
+            return
+
+        for i, backup in enumerate(backups, 1):
+            total_size = sum(entry['size'] for entry in backup['files'])
+            print(f"{i}. {backup['name']} ({backup['created']}, {len(backup['files'])} archivos, "
+                  f"{self.format_file_size(total_size)})")
+        print("0. Cancelar")
+
+        try:
+            choice = int(input("Selecciona un backup (número): ").strip())
+        except ValueError:
+            print("[ERROR] Opción inválida")
+            return
+        if choice == 0 or not 1 <= choice <= len(backups):
+            print("Operación cancelada")
+            return
+
+        backup_name = backups[choice - 1]['name']
+        default_destination = os.path.join(self.config['backup']['local_save_path'], f"restore_{backup_name}")
+        destination = input(f"Directorio destino (Enter para {default_destination}): ").strip() or default_destination
 
-        return deleted_files
+        try:
+            restored = dedup_store.restore_backup(backup_name, destination)
+            print(f"[✓] {len(restored)} archivos restaurados en {destination}")
+        except Exception as e:
+            print(f"[ERROR] Error restaurando backup: {e}")
 
     def close_connection(self):
+        if self.transfer_engine:
+            self.transfer_engine.close()
+            self.transfer_engine = None
+        self.remote_agent = None
+        if self.mysql_defaults and self.is_connected():
+            self.execute_command(f"rm -f {shlex.quote(self.mysql_defaults[1])}")
+        self.mysql_defaults = None
         if self.ssh_client:
             self.ssh_client.close()
             self.ssh_client = None
@@ -594,6 +2131,28 @@ class BackupCLI:
             self.clean_old_backups_option()
         elif choice == '7':
             self.show_config_info_option()
+        elif choice == '8':
+            self.restore_parallel_dump_option()
+        elif choice == '9':
+            self.restore_dedup_backup_option()
+        elif choice == '10':
+            self.verify_backups_option()
+        elif choice == '11':
+            self.search_catalog_option()
+        elif choice == '12':
+            self.restore_backup_option()
+        elif choice == '13':
+            self.follow_binlogs_option()
+        elif choice == '14':
+            self.point_in_time_restore_option()
+        elif choice == '15':
+            self.benchmark_transfer_option()
+        elif choice == '16':
+            self.estimate_folders_option()
+        elif choice == '17':
+            self.extract_files_option()
+        elif choice == '18':
+            self.upload_offsite_option()
         elif choice == '0':
             print("\n↩ Regresando al menú principal...")
             self.running = False
@@ -626,11 +2185,16 @@ class BackupCLI:
 
         backup_success = False
         local_save_path = None
+        run_name = None
+        offsite_results = None
 
         try:
             if not self.load_config():
                 return False
 
+            self.get_progress().reset()
+            self.cipher = None
+
             vps_config = self.config['vps']
             backup_config = self.config['backup']
             settings = self.config.get('settings', {})
@@ -640,65 +2204,118 @@ class BackupCLI:
             if not local_save_path:
                 return False
 
-            if not self.connect_ssh():
+            # Una conexión abierta (p. ej. por un paso anterior de un trabajo) se reutiliza
+            if not self.is_connected() and not self.connect_ssh():
                 return False
 
             backup_files = []
+            run_name = f"backup_{start_time.strftime('%Y%m%d_%H%M%S')}"
+            # Con el almacén, cada componente se deduplica según termina, igual que se añadiría al ZIP
+            dedup_backup = self.start_dedup_backup(backup_config, local_save_path, run_name)
+            dedup_store = dedup_backup.store if dedup_backup else None
+            assembler = None if dedup_backup else self.start_final_backup_zip(local_save_path)
+            if assembler:
+                run_name = os.path.basename(assembler.zip_path)[:-len('.zip')]
+            catalog = self.get_catalog(backup_config)
+            run_id = catalog.start_run(run_name, start_time)
+            run_recorded = False
+
+            def add_component(kind, source, paths, component_start):
+                backup_files.extend(paths)
+                # Antes de que el ZIP o el almacén se lleven el archivo: sus hashes van al manifiesto
+                self.ensure_integrity_records(paths)
+                self.catalog_components(catalog, run_id, kind, source, paths, local_save_path,
+                                        (datetime.now() - component_start).total_seconds())
+                if assembler:
+                    assembler.add_all(paths)
+                if dedup_backup:
+                    dedup_backup.add_all(paths)
 
             try:
                 if mysql_config.get('enabled', False):
-                    mysql_backup_path = self.process_mysql_backup(local_save_path, mysql_config)
-                    if mysql_backup_path:
-                        backup_files.append(mysql_backup_path)
+                    component_start = datetime.now()
+                    mysql_backup_paths = self.process_mysql_backup(local_save_path, mysql_config)
+                    if mysql_backup_paths:
+                        add_component('mysql', None, mysql_backup_paths, component_start)
+
+                    if self.is_binlog_enabled(mysql_config):
+                        print(f"\n--- Archivando binlogs de MySQL ---")
+                        try:
+                            archived = BinlogArchiver(self, catalog, local_save_path, mysql_config).archive()
+                            print(f"[OK] {len(archived)} binlogs nuevos archivados")
+                        except Exception as e:
+                            print(f"[WARNING] No se pudieron archivar los binlogs: {e}")
+
+                if backup_config.get('preflight', False) and backup_config['remote_folders']:
+                    print(f"\n--- Estimación previa de directorios ---")
+                    self.print_folder_estimate(backup_config['remote_folders'], backup_config)
 
                 for folder in backup_config['remote_folders']:
-                    print(f"\n--- Procesando: {folder} ---")
-
-                    try:
-                        remote_backup_path = self.compress_directory(folder)
-                        if not remote_backup_path:
-                            print(f"[ERROR] No se pudo comprimir {folder}")
-                            continue
+                    component_start = datetime.now()
+                    folder_files = self.process_directory_backup(folder, local_save_path, backup_config, settings)
+                    add_component('directory', folder.rstrip('/') or '/', folder_files, component_start)
 
-                        file_size = self.get_file_size(remote_backup_path)
-                        print(f"[INFO] Tamaño del backup: {self.format_file_size(file_size)}")
+                archive_name = manifest_name = dedup_name = None
 
-                        backup_filename = os.path.basename(remote_backup_path)
-                        local_backup_path = os.path.join(local_save_path, backup_filename)
-
-                        print(f"[INFO] Descargando a: {local_backup_path}")
-                        if self.download_file(remote_backup_path, local_backup_path):
-                            backup_info = self.get_backup_info(local_backup_path)
-                            if backup_info:
-                                print(f"[OK] Backup completado: {backup_info['size_formatted']}")
-
-                            backup_files.append(local_backup_path)
+                if not backup_files:
+                    print(f"\n[WARNING] No se descargaron backups para comprimir")
+                elif dedup_store:
+                    if (self.config.get('offsite') or {}).get('enabled', False):
+                        print("[WARNING] El almacén deduplicado no se sube al almacenamiento externo")
+                    with self.get_progress().stage('package', 'dedup') as stage:
+                        dedup_name = self.finish_dedup_backup(dedup_backup, local_save_path)
+                        stage['ok'] = bool(dedup_name)
+                    if dedup_name:
+                        print(f"\n[OK] Todos los backups guardados en el almacén como: {dedup_name}")
+
+                    manifest_name = run_name + MANIFEST_SUFFIX
+                    self.write_backup_manifest(os.path.join(local_save_path, manifest_name), run_name,
+                                               None, local_save_path, backup_files, dedup_name)
+                else:
+                    with self.get_progress().stage('package', 'zip') as stage:
+                        final_zip_path = self.finish_final_backup_zip(assembler, local_save_path, backup_files)
+                        stage['ok'] = bool(final_zip_path)
+                        if final_zip_path:
+                            stage['bytes'] = os.path.getsize(final_zip_path)
+                    if final_zip_path:
+                        print(f"\n[OK] Todos los backups guardados en: {os.path.basename(final_zip_path)}")
 
-                            if not settings.get('keep_remote_copies', False):
-                                self.execute_command(f"rm -f {remote_backup_path}")
-                                print(f"[INFO] Archivo remoto limpiado: {remote_backup_path}")
-                        else:
-                            print(f"[ERROR] Error descargando {folder}")
+                    archive_name = os.path.basename(final_zip_path) if final_zip_path else None
+                    manifest_name = run_name + MANIFEST_SUFFIX
+                    self.write_backup_manifest(os.path.join(local_save_path, manifest_name), run_name,
+                                               archive_name, local_save_path, backup_files)
 
-                    except Exception as e:
-                        print(f"[ERROR] Error procesando {folder}: {e}")
+                    uploader = self.get_offsite_uploader()
+                    if uploader and final_zip_path:
+                        print(f"\n--- Subiendo a almacenamiento externo ---")
+                        offsite_results = self.upload_offsite(
+                            uploader, [final_zip_path, os.path.join(local_save_path, manifest_name)])
 
-                if backup_files:
-                    final_zip_path = self.create_final_backup_zip(local_save_path, backup_files)
-                    if final_zip_path:
-                        print(f"\n[OK] Todos los backups guardados en: {os.path.basename(final_zip_path)}")
-                else:
-                    print(f"\n[WARNING] No se descargaron backups para comprimir")
+                catalog.finish_run(run_id, 'ok' if backup_files else 'empty', archive_name, manifest_name, dedup_name,
+                                   (datetime.now() - start_time).total_seconds())
+                self.settle_incremental_states('ok' if backup_files else 'empty')
+                run_recorded = True
 
                 print(f"\n--- Limpiando backups antiguos ---")
-                deleted_files = self.clean_old_backups(local_save_path, max_age_days=7)
-                if deleted_files:
-                    print(f"[INFO] Eliminados {len(deleted_files)} backups antiguos")
+                with self.get_progress().stage('cleanup', 'retención') as stage:
+                    deleted_runs, freed_bytes = self.apply_retention(catalog, local_save_path, backup_config, dedup_store)
+                    stage['bytes'] = freed_bytes
+                if deleted_runs:
+                    print(f"[INFO] Eliminados {len(deleted_runs)} backups antiguos, "
+                          f"{self.format_file_size(freed_bytes)} liberados")
 
                 backup_success = True
 
             finally:
-                self.close_connection()
+                partial_zip_path = assembler.finish() if assembler and not backup_success else None
+                if not run_recorded:
+                    # El ZIP parcial queda registrado para que la retención lo elimine
+                    catalog.finish_run(run_id, 'error', archive=os.path.basename(partial_zip_path) if partial_zip_path else None,
+                                       seconds=(datetime.now() - start_time).total_seconds())
+                    self.settle_incremental_states('error')
+                catalog.close()
+                if not self.keep_connection:
+                    self.close_connection()
 
         except Exception as e:
             print(f"[ERROR] Error general: {e}")
@@ -709,10 +2326,35 @@ class BackupCLI:
             duration = end_time - start_time
             print(f"\n=== RESUMEN ===")
             print(f"Duración total: {duration}")
+            for stage_name, totals in self.get_progress().stage_totals().items():
+                if totals['count']:
+                    print(f"  {stage_name}: {totals['seconds']:.1f}s ({totals['count']} pasos, "
+                          f"{self.format_file_size(totals['bytes'])})")
+            if offsite_results:
+                uploaded = [result for result in offsite_results if result['ok']]
+                print(f"Almacenamiento externo: {len(uploaded)} de {len(offsite_results)} archivos subidos "
+                      f"({self.format_file_size(sum(result['size'] for result in uploaded))})")
+            encryption = self.encryption_summary()
+            if encryption:
+                print(f"Cifrado ({encryption['algorithm']}): {self.format_file_size(encryption['bytes'])} en "
+                      f"{encryption['seconds']:.1f}s ({self.format_file_size(encryption['bytes_per_second'])}/s), "
+                      f"{encryption['transfer_overhead_percent']:.1f}% del tiempo de transferencia")
             if local_save_path:
                 print(f"Backups guardados en: {local_save_path}")
             print(f"Estado: {'COMPLETADO' if backup_success else 'ERROR'}")
 
+            if local_save_path and run_name:
+                try:
+                    report_path = self.get_progress().write_report(
+                        os.path.join(local_save_path, run_name + REPORT_SUFFIX), run=run_name,
+                        started=start_time.isoformat(timespec='seconds'),
+                        finished=end_time.isoformat(timespec='seconds'),
+                        seconds=round(duration.total_seconds(), 3), status='ok' if backup_success else 'error',
+                        encryption=encryption, offsite=offsite_results)
+                    print(f"Informe de la ejecución: {os.path.basename(report_path)}")
+                except OSError as e:
+                    print(f"[WARNING] No se pudo escribir el informe de la ejecución: {e}")
+
         return backup_success
 
 
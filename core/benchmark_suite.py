@@ -0,0 +1,331 @@
+import contextlib
+import io
+import json
+import os
+import platform
+import shlex
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import paramiko
+import yaml
+
+from core import fake_mysql
+from core.ssh_stub import SSHServerStub
+
+
+BASELINE_NAME = "benchmark_baseline.json"
+# (unidad, mayor es mejor, umbral de regresión en % por defecto)
+METRICS = {
+    'ssh_connect_ms': ('ms', False, 25.0),
+    'statements_per_second': ('sentencias/s', True, 10.0),
+    'session_statements_per_second': ('sentencias/s', True, 10.0),
+    'schema_deploy_seconds': ('s', False, 10.0),
+    'schema_extract_seconds': ('s', False, 10.0),
+    'backup_mb_per_second': ('MB/s', True, 15.0),
+}
+
+
+def generate_schema(database_name, tables, columns=8):
+    """Modelo JSON sintético con `tables` tablas, un índice por tabla y columnas de tipos variados."""
+    types = ['VARCHAR(120)', 'INT', 'DECIMAL(10,2)', 'DATETIME', 'TEXT', 'BIGINT', 'TINYINT(1)']
+    schema = {'database_name': database_name, 'tables': [], 'indexes': []}
+    for table in range(tables):
+        name = f"tabla_{table:04d}"
+        schema['tables'].append({
+            'name': name,
+            'columns': [{'name': 'id', 'type': 'INT', 'constraints': ['PRIMARY KEY', 'AUTO_INCREMENT']}] +
+                       [{'name': f"campo_{column}", 'type': types[column % len(types)],
+                         'constraints': ['NOT NULL'] if column % 3 == 0 else []} for column in range(columns - 1)],
+        })
+        schema['indexes'].append({'name': f"idx_{name}_campo_0", 'table': name, 'columns': ['campo_0']})
+    return schema
+
+
+def generate_files(directory, total_bytes, file_size=4 * 1024 * 1024):
+    """Archivos de prueba medio compresibles: bloques aleatorios alternados con texto repetido."""
+    os.makedirs(directory, exist_ok=True)
+    written = 0
+    index = 0
+    while written < total_bytes:
+        size = min(file_size, total_bytes - written)
+        with open(os.path.join(directory, f"datos_{index:04d}.bin"), 'wb') as file:
+            remaining = size
+            while remaining > 0:
+                block = os.urandom(min(32 * 1024, remaining))
+                file.write(block)
+                remaining -= len(block)
+                filler = (b"registro de prueba para el benchmark de backups\n" * 700)[:min(32 * 1024, remaining)]
+                file.write(filler)
+                remaining -= len(filler)
+        written += size
+        index += 1
+    return written
+
+
+def load_results(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def write_results(path, results):
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2, ensure_ascii=False)
+    os.replace(temp_path, path)
+    return path
+
+
+def print_comparison(rows):
+    print("\n" + "=" * 50)
+    print("    COMPARACIÓN CON LA REFERENCIA")
+    print("=" * 50)
+    for row in rows:
+        status = '❌' if row['regression'] else '✅'
+        print(f"   {status} {row['metric']}: {row['baseline']} → {row['value']} "
+              f"({row['change_percent']:+.1f}%, umbral {row['threshold_percent']:g}%)")
+
+
+def compare_results(results, baseline, threshold=None):
+    """Compara con un resultado anterior; devuelve una fila por métrica común a ambos."""
+    rows = []
+    for name, current in results['metrics'].items():
+        previous = baseline.get('metrics', {}).get(name)
+        if not previous or not previous.get('value'):
+            continue
+        higher_is_better = current['higher_is_better']
+        limit = threshold if threshold is not None else METRICS.get(name, (None, None, 10.0))[2]
+        change = (current['value'] - previous['value']) / previous['value'] * 100
+        worse = -change if higher_is_better else change
+        rows.append({'metric': name, 'baseline': previous['value'], 'value': current['value'],
+                     'change_percent': round(change, 1), 'threshold_percent': limit, 'regression': worse > limit})
+    return rows
+
+
+class BenchmarkSuite:
+    """Mide Connection, SchemaBuilder y BackupCLI contra un servidor SSH local.
+
+    El servidor es `SSHServerStub` (paramiko) y ejecuta los comandos en esta
+    máquina. Por defecto `mysql` es el cliente simulado de core/fake_mysql.py,
+    con `latency_ms` de espera por sentencia. Con `real_mysql` se usa el mysql
+    instalado y las credenciales MYSQL_* del entorno. Cada métrica se repite
+    `repeat` veces y se guarda la mejor, que es la menos afectada por ruido."""
+
+    def __init__(self, tables=50, statements=200, backup_mb=64, latency_ms=0.0, repeat=3, real_mysql=False,
+                 work_dir=None):
+        self.tables = int(tables)
+        self.statements = int(statements)
+        self.backup_mb = int(backup_mb)
+        self.latency_ms = float(latency_ms)
+        self.repeat = max(1, int(repeat))
+        self.real_mysql = real_mysql
+        self.keep_work_dir = work_dir is not None
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix='benchmark_')
+        self.stub = None
+        self.saved_environment = {}
+        self.log = io.StringIO()
+
+    def prepare(self):
+        os.makedirs(self.work_dir, exist_ok=True)
+        key_path = os.path.join(self.work_dir, 'id_rsa')
+        key = paramiko.RSAKey.generate(2048)
+        key.write_private_key_file(key_path)
+
+        env = {}
+        if not self.real_mysql:
+            bin_dir = os.path.join(self.work_dir, 'bin')
+            os.makedirs(bin_dir, exist_ok=True)
+            shim_path = os.path.join(bin_dir, 'mysql')
+            with open(shim_path, 'w') as file:
+                # -S -E: sin site ni variables PYTHON*, para que el arranque del intérprete pese poco
+                file.write(f"#!/bin/sh\nexec {shlex.quote(sys.executable)} -S -E {shlex.quote(fake_mysql.__file__)} \"$@\"\n")
+            os.chmod(shim_path, 0o755)
+            # Cada ejecución parte de un servidor vacío: un estado mayor haría más lenta cada sentencia
+            state_path = os.path.join(self.work_dir, 'mysql_state.json')
+            if os.path.exists(state_path):
+                os.remove(state_path)
+            env = {
+                'PATH': bin_dir + os.pathsep + os.environ.get('PATH', ''),
+                'FAKE_MYSQL_STATE': state_path,
+                'FAKE_MYSQL_LATENCY_MS': str(self.latency_ms),
+            }
+        # Los comandos (y el agente remoto, en ~/.cache) trabajan dentro del directorio de trabajo
+        self.stub = SSHServerStub(key, env=env, home=self.work_dir).start()
+
+        # Connection lee la conexión del entorno (.env); load_dotenv no sobrescribe estas variables
+        self.set_environment(VPS_IP='127.0.0.1', VPS_PORT=str(self.stub.port), VPS_USERNAME='benchmark',
+                             PRIVATE_KEY=key_path, PASSPHRASE='')
+        if not self.real_mysql:
+            self.set_environment(MYSQL_USER='benchmark', MYSQL_PASSWORD='benchmark', MYSQL_HOST='localhost')
+
+        local_save_path = os.path.join(self.work_dir, 'backups')
+        self.config_path = os.path.join(self.work_dir, 'config.yaml')
+        with open(self.config_path, 'w') as file:
+            yaml.safe_dump({
+                'vps': {'ip': '127.0.0.1', 'port': self.stub.port, 'user': 'benchmark', 'key_path': key_path},
+                'backup': {'local_save_path': local_save_path,
+                           'remote_folders': [os.path.join(self.work_dir, 'remote', 'datos')]},
+                'mysql': {'enabled': False},
+            }, file)
+
+    def set_environment(self, **values):
+        for name, value in values.items():
+            self.saved_environment.setdefault(name, os.environ.get(name))
+            os.environ[name] = value
+
+    def cleanup(self):
+        if self.stub:
+            self.stub.stop()
+            self.stub = None
+        for name, value in self.saved_environment.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        self.saved_environment = {}
+        if not self.keep_work_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    @contextlib.contextmanager
+    def quiet(self):
+        # Los módulos medidos imprimen cada sentencia: la salida va al registro y no a la consola
+        with contextlib.redirect_stdout(self.log):
+            yield
+
+    def best_of(self, measure):
+        values = [measure() for _ in range(self.repeat)]
+        return min(values), values
+
+    def connect(self):
+        from core.connection import Connection
+        with self.quiet():
+            try:
+                return Connection()
+            except SystemExit:
+                raise Exception("Connection no pudo conectar con el servidor SSH local")
+
+    def bench_connect(self):
+        def measure():
+            start = time.perf_counter()
+            connection = self.connect()
+            elapsed = (time.perf_counter() - start) * 1000
+            connection.close()
+            return elapsed
+        return self.best_of(measure)
+
+    def bench_statements(self, connection):
+        with self.quiet():
+            connection.execute_mysql_command("DROP DATABASE IF EXISTS benchmark_sql")
+            connection.execute_mysql_command("CREATE DATABASE benchmark_sql")
+            connection.execute_sql("CREATE TABLE IF NOT EXISTS `medidas` (`id` INT PRIMARY KEY AUTO_INCREMENT, "
+                                   "`valor` VARCHAR(40))", 'benchmark_sql')
+
+        def measure():
+            with self.quiet():
+                start = time.perf_counter()
+                for number in range(self.statements):
+                    if not connection.execute_sql(f"INSERT INTO `medidas` (`valor`) VALUES ('{number}')", 'benchmark_sql'):
+                        raise Exception("falló una sentencia del benchmark")
+                elapsed = time.perf_counter() - start
+            return elapsed
+        seconds, values = self.best_of(measure)
+        return self.statements / seconds, [self.statements / value for value in values]
+
+    def bench_session_statements(self, connection):
+        from core.mysql_session import MySQLSession
+        session = MySQLSession(connection.ssh, connection.mysql_client_command(), 'benchmark_sql')
+        try:
+            def measure():
+                start = time.perf_counter()
+                for number in range(self.statements):
+                    session.execute(f"INSERT INTO `medidas` (`valor`) VALUES ('{number}')")
+                return time.perf_counter() - start
+            seconds, values = self.best_of(measure)
+        finally:
+            session.close()
+        return self.statements / seconds, [self.statements / value for value in values]
+
+    def bench_schema(self, connection):
+        from core.schema_builder import SchemaBuilder
+        deploy_times = []
+        extract_times = []
+        for attempt in range(self.repeat):
+            database_name = f"benchmark_schema_{attempt}"
+            schema_path = os.path.join(self.work_dir, f"{database_name}.json")
+            with open(schema_path, 'w', encoding='utf-8') as file:
+                json.dump(generate_schema(database_name, self.tables), file)
+
+            with self.quiet():
+                connection.execute_mysql_command(f"DROP DATABASE IF EXISTS {database_name}")
+                start = time.perf_counter()
+                SchemaBuilder(schema_path).create_database_structure(connection)
+                deploy_times.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                output_file = os.path.join(self.work_dir, 'extracted', f"{database_name}.json")
+                if not SchemaBuilder().extract_database_schema(connection, database_name, output_file):
+                    raise Exception(f"no se pudo extraer el esquema de {database_name}")
+                extract_times.append(time.perf_counter() - start)
+
+            with open(output_file, 'r', encoding='utf-8') as file:
+                extracted = len(json.load(file)['tables'])
+            if extracted != self.tables:
+                raise Exception(f"el esquema extraído tiene {extracted} tablas en vez de {self.tables}")
+        return (min(deploy_times), deploy_times), (min(extract_times), extract_times)
+
+    def bench_backup(self):
+        from core.backup_cli import BackupCLI
+        total_bytes = generate_files(os.path.join(self.work_dir, 'remote', 'datos'), self.backup_mb * 1024 * 1024)
+
+        def measure():
+            backup_cli = BackupCLI(self.config_path)
+            with self.quiet():
+                start = time.perf_counter()
+                ok = backup_cli.run_backup()
+                elapsed = time.perf_counter() - start
+            if not ok:
+                raise Exception("el backup del benchmark falló")
+            return elapsed
+        seconds, values = self.best_of(measure)
+        megabytes = total_bytes / (1024 * 1024)
+        return megabytes / seconds, [megabytes / value for value in values]
+
+    def run(self):
+        """Ejecuta todas las mediciones y devuelve el resultado (ver `results`)."""
+        metrics = {}
+
+        def record(name, value, samples):
+            unit, higher_is_better, _ = METRICS[name]
+            metrics[name] = {'value': round(value, 3), 'unit': unit, 'higher_is_better': higher_is_better,
+                             'samples': [round(sample, 3) for sample in samples]}
+            print(f"[OK] {name}: {value:.2f} {unit}")
+
+        self.prepare()
+        try:
+            print(f"[INFO] Servidor SSH local en 127.0.0.1:{self.stub.port} "
+                  f"(mysql {'real' if self.real_mysql else f'simulado, {self.latency_ms:g} ms por sentencia'})")
+            record('ssh_connect_ms', *self.bench_connect())
+            connection = self.connect()
+            try:
+                record('statements_per_second', *self.bench_statements(connection))
+                record('session_statements_per_second', *self.bench_session_statements(connection))
+                deploy, extract = self.bench_schema(connection)
+                record('schema_deploy_seconds', *deploy)
+                record('schema_extract_seconds', *extract)
+            finally:
+                connection.close()
+            record('backup_mb_per_second', *self.bench_backup())
+        finally:
+            self.cleanup()
+
+        return {
+            'generated': datetime.now().isoformat(timespec='seconds'),
+            'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                            'paramiko': paramiko.__version__, 'cpus': os.cpu_count()},
+            'parameters': {'tables': self.tables, 'statements': self.statements, 'backup_mb': self.backup_mb,
+                           'latency_ms': self.latency_ms, 'repeat': self.repeat, 'real_mysql': self.real_mysql},
+            'metrics': metrics,
+        }
@@ -0,0 +1,174 @@
+import gzip
+import os
+import re
+import shlex
+import struct
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+
+BINLOG_MAGIC = b'\xfebin'
+# timestamp, tipo, server_id, tamaño del evento, posición siguiente, flags
+EVENT_HEADER = struct.Struct('<IBIIIH')
+DUMP_POSITION_PATTERN = re.compile(
+    r"CHANGE (?:MASTER|REPLICATION SOURCE) TO (?:MASTER|SOURCE)_LOG_FILE='([^']+)', (?:MASTER|SOURCE)_LOG_POS=(\d+)")
+
+
+@contextmanager
+def open_backup_file(path, open_file=None):
+    with (open_file(path) if open_file else open(path, 'rb')) as source:
+        if path.endswith('.gz'):
+            with gzip.open(source, 'rb') as file:
+                yield file
+        else:
+            yield source
+
+
+def read_binlog_time_range(path, open_file=None):
+    """Primer y último timestamp (epoch) de los eventos de un binlog, leyendo solo las cabeceras."""
+    first_event = last_event = None
+    with open_backup_file(path, open_file) as file:
+        if file.read(len(BINLOG_MAGIC)) != BINLOG_MAGIC:
+            # Binlogs cifrados u otro formato: sin rango de tiempo
+            return None, None
+        while True:
+            header = file.read(EVENT_HEADER.size)
+            if len(header) < EVENT_HEADER.size:
+                break
+            timestamp, _, _, event_size, _, _ = EVENT_HEADER.unpack(header)
+            if event_size < EVENT_HEADER.size:
+                break
+            if timestamp:
+                first_event = first_event or timestamp
+                last_event = timestamp
+            file.seek(event_size - EVENT_HEADER.size, 1)
+    return first_event, last_event
+
+
+def read_dump_binlog_position(path, open_file=None, head_size=64 * 1024):
+    with open_backup_file(path, open_file) as file:
+        head = file.read(head_size).decode('utf-8', errors='replace')
+    match = DUMP_POSITION_PATTERN.search(head)
+    return {'file': match.group(1), 'position': int(match.group(2))} if match else None
+
+
+class BinlogArchiver:
+    """Archiva los binlogs de MySQL rotándolos y descargando solo los ficheros cerrados.
+
+    Cada binlog se comprime en el servidor mientras se descarga y se registra en
+    el catálogo con el rango de tiempo de sus eventos, lo que permite elegir qué
+    ficheros aplicar en una restauración a un punto en el tiempo."""
+
+    def __init__(self, backup_cli, catalog, local_save_path, mysql_config):
+        self.backup_cli = backup_cli
+        self.catalog = catalog
+        self.local_save_path = local_save_path
+        self.local_dir = os.path.join(local_save_path, 'binlogs')
+        self.mysql_config = mysql_config
+        self.mysql_command = backup_cli.build_mysql_client_command('mysql', mysql_config)
+
+    def query(self, sql):
+        output = self.backup_cli.execute_command(f"{self.mysql_command} -N -B -e {shlex.quote(sql)}")
+        return [line.split('\t') for line in output.splitlines() if line.strip()]
+
+    def binlog_directory(self):
+        rows = self.query("SELECT @@log_bin_basename")
+        if not rows or rows[0][0] in ('', 'NULL'):
+            raise Exception("El log binario no está activado en el servidor (log_bin)")
+        return os.path.dirname(rows[0][0])
+
+    def current_position(self):
+        for statement in ("SHOW MASTER STATUS", "SHOW BINARY LOG STATUS"):
+            rows = self.query(statement)
+            if rows and len(rows[0]) >= 2:
+                return {'file': rows[0][0], 'position': int(rows[0][1])}
+        return None
+
+    def archive(self, flush=True):
+        binlog_dir = self.binlog_directory()
+        if flush:
+            # Cierra el binlog activo para que su contenido pueda descargarse completo
+            self.query("FLUSH BINARY LOGS")
+
+        server_logs = self.query("SHOW BINARY LOGS")
+        os.makedirs(self.local_dir, exist_ok=True)
+
+        archived = []
+        for row in server_logs[:-1]:
+            name, size = row[0], int(row[1])
+            if self.catalog.has_binlog(name):
+                continue
+
+            local_path = os.path.join(self.local_dir, f"{name}.gz")
+            remote_path = shlex.quote(os.path.join(binlog_dir, name))
+            print(f"[INFO] Archivando binlog {name} ({self.backup_cli.format_file_size(size)})")
+            if not self.backup_cli.stream_command_to_file(f"sudo gzip -c {remote_path}", local_path):
+                if os.path.exists(local_path):
+                    os.remove(local_path)
+                raise Exception(f"No se pudo descargar el binlog {name}")
+
+            first_event, last_event = read_binlog_time_range(local_path, self.backup_cli.open_local_reader)
+            record = self.backup_cli.integrity_records.get(os.path.abspath(local_path), {})
+            self.catalog.add_binlog(name, os.path.relpath(local_path, self.local_save_path), size,
+                                    os.path.getsize(local_path), record.get('sha256'), first_event, last_event)
+            archived.append(name)
+
+        return archived
+
+    def follow(self, interval=300):
+        print(f"[INFO] Archivado continuo de binlogs cada {interval}s (Ctrl+C para terminar)")
+        try:
+            while True:
+                archived = self.archive()
+                stored = sum(os.path.getsize(os.path.join(self.local_save_path, binlog['path']))
+                             for binlog in self.catalog.list_binlogs() if binlog['name'] in archived)
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] {len(archived)} binlogs nuevos, "
+                      f"{self.backup_cli.format_file_size(stored)} descargados")
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("\n[INFO] Archivado continuo detenido")
+
+    def replay_command(self, stop_datetime, paths, start_position=None, database=None):
+        options = [f"--stop-datetime={shlex.quote(stop_datetime)}"]
+        if start_position:
+            # mysqlbinlog solo aplica --start-position al primer fichero
+            options.append(f"--start-position={int(start_position)}")
+        if database:
+            options.append(f"--database={shlex.quote(database)}")
+        files = ' '.join(shlex.quote(path) for path in paths)
+        return f"mysqlbinlog {' '.join(options)} {files} | {self.mysql_command}"
+
+    def replay(self, engine, base, stop_datetime, stop_epoch):
+        """Aplica los binlogs desde la posición del backup base hasta `stop_datetime`.
+
+        Los binlogs se suben a un directorio temporal del servidor y se aplican en
+        una sola ejecución de mysqlbinlog, que conserva el estado de sesión entre
+        ficheros (tablas temporales, variables de usuario). Con varias posiciones
+        (un volcado por base de datos) cada base se reproduce por separado desde su
+        propia posición con --database."""
+        remote_dir = f"/tmp/binlog_replay_{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+        uploads = {}
+        replays = []
+        for position in base:
+            binlogs = self.catalog.binlogs_for_replay(position['binlog_file'], stop_epoch)
+            if not binlogs or binlogs[0]['name'] != position['binlog_file']:
+                raise Exception(f"Falta el binlog {position['binlog_file']} en el archivo local")
+            for binlog in binlogs:
+                uploads.setdefault(binlog['name'], binlog)
+            replays.append((position, [f"{remote_dir}/{binlog['name']}" for binlog in binlogs]))
+
+        steps = []
+        for name, binlog in uploads.items():
+            command = f"mkdir -p {shlex.quote(remote_dir)} && gzip -dc > {shlex.quote(f'{remote_dir}/{name}')}"
+            steps.append((name, lambda command=command, binlog=binlog, name=name: engine.stream_to_remote(
+                command, engine.iter_component({'name': binlog['path']}), binlog['sha256'], name)))
+
+        for index, (position, paths) in enumerate(replays):
+            command = self.replay_command(stop_datetime, paths, position['binlog_position'], position['database'])
+            if index == len(replays) - 1:
+                command = f"{command}; status=$?; rm -rf {shlex.quote(remote_dir)}; exit $status"
+            label = f"mysqlbinlog{' (' + position['database'] + ')' if position['database'] else ''}"
+            steps.append((label, lambda command=command, label=label: engine.stream_to_remote(
+                command, iter([]), label=label)))
+        return steps
@@ -1,7 +1,9 @@
 import paramiko
 from dotenv import load_dotenv
 import os
-import time
+import uuid
+
+from core.ssh_profile import connect_with_profile, load_ssh_profile
 
 class Connection:
     def __init__(self):
@@ -10,6 +12,7 @@ class Connection:
         self.ssh = paramiko.SSHClient()
         self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
         self.IP = os.getenv('VPS_IP')
+        self.PORT = int(os.getenv('VPS_PORT', 22))
         self.USERNAME = os.getenv('VPS_USERNAME')
         self.KEY = os.getenv('PRIVATE_KEY')
         self.PASSPHRASE = os.getenv('PASSPHRASE')
@@ -26,7 +29,8 @@ class Connection:
 
     def connect(self):
         try:
-            self.ssh.connect(hostname=self.IP, username=self.USERNAME, key_filename=self.KEY, passphrase=self.PASSPHRASE)
+            connect_with_profile(self.ssh, load_ssh_profile(), hostname=self.IP, port=self.PORT,
+                                 username=self.USERNAME, key_filename=self.KEY, passphrase=self.PASSPHRASE)
             return True
         except Exception as e:
             print(e)
@@ -34,8 +38,8 @@ class Connection:
 
     def execute_mysql_command(self, sql_command, database=None, ignore_errors=False):
         try:
-            timestamp = int(time.time())
-            temp_sql_file = f"/tmp/temp_sql_{timestamp}.sql"
+            # Nombre único: dos sentencias en el mismo segundo (o en paralelo) no comparten archivo
+            temp_sql_file = f"/tmp/temp_sql_{uuid.uuid4().hex}.sql"
 
             create_file_cmd = f"cat > {temp_sql_file} << 'EOF'\n{sql_command}\nEOF"
 
@@ -83,6 +87,10 @@ class Connection:
                 print(f"Error ejecutando comando MySQL: {e}")
                 return False
 
+    def mysql_client_command(self):
+        """Comando del cliente mysql con las credenciales del .env (para sesiones persistentes)."""
+        return f"mysql -u {self.MYSQL_USER} -p'{self.MYSQL_PASSWORD}' -h {self.MYSQL_HOST}"
+
     def execute_mysql_simple(self, sql_command, ignore_errors=False):
         try:
             mysql_cmd = f"mysql -u {self.MYSQL_USER} -p'{self.MYSQL_PASSWORD}' -h {self.MYSQL_HOST} -e '{sql_command}'"
@@ -157,8 +165,7 @@ class Connection:
 
     def execute_query_with_results(self, sql_query, database=None, format_output='dict'):
         try:
-            timestamp = int(time.time())
-            temp_sql_file = f"/tmp/temp_query_{timestamp}.sql"
+            temp_sql_file = f"/tmp/temp_query_{uuid.uuid4().hex}.sql"
 
             create_file_cmd = f"cat > {temp_sql_file} << 'EOF'\n{sql_query}\nEOF"
 
@@ -18,6 +18,7 @@ class DatabaseCLI:
         print("3. Mostrar tablas de una base de datos")
         print("4. Probar conexión SSH/MySQL")
         print("5. Extraer esquema de base de datos existente")  # NUEVA OPCIÓN
+        print("6. Exportar datos (CSV/JSONL/Parquet)")
         print("0. Volver al menú principal")
         print("-"*50)
 
@@ -97,16 +98,17 @@ class DatabaseCLI:
             print("✓ Utilizando conexión existente")
             return True
 
-    def create_database_option(self):
+    def create_database_option(self, schema_file=None):
         print("\nCREAR BASE DE DATOS")
 
         if not self.establish_connection():
-            return
+            return False
 
-        schema_file = self.select_json_file()
+        if schema_file is None:
+            schema_file = self.select_json_file()
         if schema_file is None:
             print("Operación cancelada")
-            return
+            return False
 
         try:
             print("\nMostrando bases de datos existentes...")
@@ -124,12 +126,14 @@ class DatabaseCLI:
                 db_name = schema_builder.schema_data['database_name']
                 print(f"\nMostrando tablas en la base de datos '{db_name}'...")
                 self.connection.show_tables(db_name)
+                return True
 
             else:
                 print("Error creando la estructura de la base de datos")
 
         except Exception as e:
             print(f"Error: {e}")
+        return False
 
     def show_databases_option(self):
         print("\nMOSTRAR BASES DE DATOS EXISTENTES")
@@ -171,45 +175,19 @@ class DatabaseCLI:
 
         self.establish_connection()
 
-    def extract_schema_option(self):
+    def extract_schema_option(self, selected_db=None, output_file=None):
         print("\nEXTRAER ESQUEMA DE BASE DE DATOS")
 
         if not self.establish_connection():
-            return
+            return False
 
         try:
-            print("\nBases de datos disponibles:")
-            databases = self.connection.get_databases_list()
-
-            if not databases:
-                print("No se encontraron bases de datos disponibles")
-                return
+            if selected_db is not None:
+                return self.extract_schema(selected_db, output_file)
 
-            print("\n" + "-"*40)
-            print("   SELECCIONA UNA BASE DE DATOS")
-            print("-"*40)
-
-            for i, db in enumerate(databases, 1):
-                print(f"{i}. {db['database_name']}")
-
-            print("0. Cancelar")
-            print("-"*40)
-
-            while True:
-                try:
-                    choice = int(input("Selecciona una base de datos (número): "))
-                    if choice == 0:
-                        print("Operación cancelada")
-                        return
-                    elif 1 <= choice <= len(databases):
-                        selected_db = databases[choice - 1]['database_name']
-                        break
-                    else:
-                        print("Opción inválida. Intenta de nuevo.")
-                except ValueError:
-                    print("Por favor, introduce un número válido.")
-
-            print(f"\nBase de datos seleccionada: {selected_db}")
+            selected_db = self.select_database()
+            if selected_db is None:
+                return False
 
             # Preguntar por nombre de archivo personalizado (opcional)
             custom_name = input("\nNombre personalizado para el archivo (Enter para auto): ").strip()
@@ -219,16 +197,121 @@ class DatabaseCLI:
                     custom_name += '.json'
                 output_file = f"dataModels/{custom_name}"
 
-            schema_builder = SchemaBuilder()
-
-            print(f"\nExtrayendo esquema de '{selected_db}'...")
-            if schema_builder.extract_database_schema(self.connection, selected_db, output_file):
-                print("\n✓ Extracción de esquema completada exitosamente")
-            else:
-                print("\n✗ Error en la extracción del esquema")
+            return self.extract_schema(selected_db, output_file)
 
         except Exception as e:
             print(f"Error: {e}")
+            return False
+
+    def select_database(self):
+        print("\nBases de datos disponibles:")
+        databases = self.connection.get_databases_list()
+
+        if not databases:
+            print("No se encontraron bases de datos disponibles")
+            return None
+
+        print("\n" + "-"*40)
+        print("   SELECCIONA UNA BASE DE DATOS")
+        print("-"*40)
+
+        for i, db in enumerate(databases, 1):
+            print(f"{i}. {db['database_name']}")
+
+        print("0. Cancelar")
+        print("-"*40)
+
+        while True:
+            try:
+                choice = int(input("Selecciona una base de datos (número): "))
+                if choice == 0:
+                    print("Operación cancelada")
+                    return None
+                elif 1 <= choice <= len(databases):
+                    selected_db = databases[choice - 1]['database_name']
+                    break
+                else:
+                    print("Opción inválida. Intenta de nuevo.")
+            except ValueError:
+                print("Por favor, introduce un número válido.")
+
+        print(f"\nBase de datos seleccionada: {selected_db}")
+        return selected_db
+
+    def extract_schema(self, selected_db, output_file=None):
+        schema_builder = SchemaBuilder()
+
+        print(f"\nExtrayendo esquema de '{selected_db}'...")
+        if schema_builder.extract_database_schema(self.connection, selected_db, output_file):
+            print("\n✓ Extracción de esquema completada exitosamente")
+            return True
+        print("\n✗ Error en la extracción del esquema")
+        return False
+
+    def export_data_option(self, database=None, tables=None, query=None, output=None, file_format=None,
+                           compression=None, workers=4, chunk_rows=50000):
+        """Exporta tablas (en paralelo) o el resultado de una consulta; sin `database` pregunta todo."""
+        from core.table_export import FORMATS, PARQUET_COMPRESSIONS, TEXT_COMPRESSIONS, TableExporter, output_extension
+
+        print("\nEXPORTAR DATOS")
+
+        if not self.establish_connection():
+            return False
+
+        try:
+            if database is None:
+                database = self.select_database()
+                if database is None:
+                    return False
+
+                answer = input("\nTablas separadas por comas (Enter = todas, 'sql' = una consulta): ").strip()
+                if answer.lower() == 'sql':
+                    query = input("Consulta SELECT: ").strip()
+                    if not query:
+                        print("Operación cancelada")
+                        return False
+                elif answer:
+                    tables = [table.strip() for table in answer.split(',') if table.strip()]
+
+                file_format = input(f"Formato ({'/'.join(FORMATS)}) [csv]: ").strip().lower() or 'csv'
+                valid = PARQUET_COMPRESSIONS if file_format == 'parquet' else tuple(TEXT_COMPRESSIONS)
+                compression = input(f"Compresión ({'/'.join(valid)}, Enter = ninguna): ").strip().lower() or None
+                default_output = (f"exports/{database}_consulta{output_extension(file_format, compression)}" if query
+                                  else f"exports/{database}")
+                output = input(f"Destino [{default_output}]: ").strip() or default_output
+
+            file_format = file_format or 'csv'
+            exporter = TableExporter(self.connection.ssh, self.connection.mysql_client_command(),
+                                     workers=workers, chunk_rows=chunk_rows)
+
+            if query:
+                output = output or f"{database}_consulta{output_extension(file_format, compression)}"
+                if os.path.dirname(output):
+                    os.makedirs(os.path.dirname(output), exist_ok=True)
+                print(f"\nExportando consulta de '{database}' a {output}...")
+                result = exporter.export_query(database, query, output, file_format, compression)
+                print(f"[OK] {result['rows']} filas → {result['file']} ({result['seconds']:.1f} s)")
+                return True
+
+            if not tables:
+                tables = exporter.list_tables(database)
+                if not tables:
+                    print(f"[ERROR] '{database}' no tiene tablas")
+                    return False
+
+            output = output or f"exports/{database}"
+            print(f"\nExportando {len(tables)} tablas de '{database}' a {output}/ ({file_format})...")
+            results, errors = exporter.export_tables(database, tables, output, file_format, compression)
+            total_rows = sum(result['rows'] for result in results)
+            print(f"\n[OK] {len(results)} tablas exportadas, {total_rows} filas")
+            if errors:
+                print(f"[ERROR] Fallaron {len(errors)} tablas: {', '.join(sorted(errors))}")
+                return False
+            return True
+
+        except Exception as e:
+            print(f"[ERROR] Error exportando datos: {e}")
+            return False
 
     def close_connection(self):
         if self.connection:
@@ -253,6 +336,8 @@ class DatabaseCLI:
             self.test_connection_option()
         elif choice == '5':  # NUEVA OPCIÓN
             self.extract_schema_option()
+        elif choice == '6':
+            self.export_data_option()
         elif choice == '0':
             print("\n↩Regresando al menú principal...")
             self.running = False
@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta
+
+
+WINDOW_LAGS = 8
+# El bit "lag" de cada entrada clasifica el valor del byte en 0/1 de forma determinista
+WINDOW_TABLE = bytes(
+    sum((hashlib.sha256(bytes([lag, value])).digest()[0] & 1) << lag for lag in range(WINDOW_LAGS))
+    for value in range(256)
+)
+RAW_CHUNK = b'R'
+ZLIB_CHUNK = b'Z'
+# Los fragmentos aún sin índice pueden ser de un backup en curso: la limpieza no los toca hasta pasado este plazo
+ORPHAN_CHUNK_HOURS = 24
+
+
+class ContentDefinedChunker:
+    """Troceado por contenido con un hash de ventana de WINDOW_LAGS bytes.
+
+    Cada posición recibe un bit que depende de los últimos bytes (XOR de un bit
+    distinto de cada byte de la ventana) y se corta tras una racha de ceros cuya
+    longitud fija el tamaño medio. Todo se calcula con operaciones de bytes y enteros grandes,
+    sin bucles por byte en Python."""
+
+    def __init__(self, avg_size=1024 * 1024, min_size=None, max_size=None):
+        bits = max(WINDOW_LAGS, int(avg_size).bit_length() - 1)
+        self.avg_size = 1 << bits
+        self.min_size = min_size or self.avg_size // 4
+        self.max_size = max_size or self.avg_size * 4
+        self.zero_run = b"\0" * (bits - 1)
+        self.low_bits_cache = (0, 0)
+
+    def low_bits_mask(self, length):
+        if self.low_bits_cache[0] != length:
+            self.low_bits_cache = (length, int.from_bytes(b"\1" * length, 'big'))
+        return self.low_bits_cache[1]
+
+    def window_bits(self, data):
+        classified = int.from_bytes(data.translate(WINDOW_TABLE), 'big')
+        low_bits = self.low_bits_mask(len(data))
+        accumulator = 0
+        for lag in range(WINDOW_LAGS):
+            # Bit "lag" del byte situado "lag" posiciones antes, llevado al bit 0
+            accumulator ^= (classified >> (9 * lag)) & low_bits
+        return accumulator.to_bytes(len(data), 'big')
+
+    def find_boundary(self, bits, start):
+        end = min(len(bits), start + self.max_size)
+        search_from = start + self.min_size - len(self.zero_run)
+        if search_from + len(self.zero_run) >= end:
+            return end
+
+        match = bits.find(self.zero_run, search_from, end)
+        return end if match < 0 else match + len(self.zero_run)
+
+    def iter_chunks(self, stream, read_size=16 * 1024 * 1024):
+        buffer = b""
+        while True:
+            data = stream.read(read_size)
+            eof = not data
+            buffer += data
+
+            start = 0
+            bits = self.window_bits(buffer) if buffer else b""
+            while len(buffer) - start >= self.max_size or (eof and start < len(buffer)):
+                boundary = self.find_boundary(bits, start)
+                yield buffer[start:boundary]
+                start = boundary
+            buffer = buffer[start:]
+
+            if eof:
+                break
+
+
+class DedupStore:
+    def __init__(self, root, avg_chunk_size=1024 * 1024, compression_level=6):
+        self.root = root
+        self.chunks_dir = os.path.join(root, 'chunks')
+        self.backups_dir = os.path.join(root, 'backups')
+        self.chunker = ContentDefinedChunker(avg_chunk_size)
+        self.compression_level = compression_level
+        os.makedirs(self.chunks_dir, exist_ok=True)
+        os.makedirs(self.backups_dir, exist_ok=True)
+
+    def chunk_path(self, digest):
+        return os.path.join(self.chunks_dir, digest[:2], digest)
+
+    def index_path(self, name):
+        return os.path.join(self.backups_dir, f"{name}.json")
+
+    def write_atomic(self, path, data):
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'wb') as file:
+            file.write(data)
+        os.replace(temp_path, path)
+
+    def put_chunk(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.chunk_path(digest)
+        if os.path.exists(path):
+            # Un fragmento huérfano reutilizado vuelve a contar como reciente para garbage_collect
+            os.utime(path)
+            return digest, 0
+
+        compressed = zlib.compress(data, self.compression_level)
+        payload = ZLIB_CHUNK + compressed if len(compressed) < len(data) else RAW_CHUNK + data
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.write_atomic(path, payload)
+        return digest, len(payload)
+
+    def get_chunk(self, digest):
+        with open(self.chunk_path(digest), 'rb') as file:
+            payload = file.read()
+        data = zlib.decompress(payload[1:]) if payload[:1] == ZLIB_CHUNK else payload[1:]
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise Exception(f"Fragmento corrupto: {digest}")
+        return data
+
+    def ingest_file(self, path, arcname):
+        file_hash = hashlib.sha256()
+        chunks = []
+        size = 0
+        written = 0
+
+        with open(path, 'rb') as file:
+            for data in self.chunker.iter_chunks(file):
+                digest, stored = self.put_chunk(data)
+                file_hash.update(data)
+                chunks.append([digest, len(data)])
+                size += len(data)
+                written += stored
+
+        return {'name': arcname, 'size': size, 'sha256': file_hash.hexdigest(), 'chunks': chunks}, written
+
+    def create_backup(self, name, paths, base_dir):
+        backup = DedupBackup(self, name, base_dir, remove_sources=False)
+        backup.add_all(paths)
+        if backup.errors:
+            raise backup.errors[0][1]
+        return backup.finish()
+
+    def load_backup(self, name):
+        with open(self.index_path(name), 'r', encoding='utf-8') as file:
+            return json.load(file)
+
+    def list_backups(self):
+        backups = []
+        for filename in sorted(os.listdir(self.backups_dir)):
+            if filename.endswith('.json'):
+                backups.append(self.load_backup(filename[:-len('.json')]))
+        return backups
+
+    def restore_file(self, entry, output):
+        file_hash = hashlib.sha256()
+        for digest, _ in entry['chunks']:
+            data = self.get_chunk(digest)
+            file_hash.update(data)
+            output.write(data)
+        if file_hash.hexdigest() != entry['sha256']:
+            raise Exception(f"Hash incorrecto al restaurar {entry['name']}")
+
+    def restore_backup(self, name, destination):
+        restored = []
+        for entry in self.load_backup(name)['files']:
+            target = os.path.join(destination, entry['name'])
+            os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+            with open(target, 'wb') as output:
+                self.restore_file(entry, output)
+            restored.append(target)
+        return restored
+
+    def delete_backup(self, name):
+        os.remove(self.index_path(name))
+
+    def garbage_collect(self, max_age_days=None):
+        # Sin max_age_days solo se eliminan los fragmentos que ya no referencia ningún backup
+        cutoff = datetime.now() - timedelta(days=max_age_days) if max_age_days is not None else None
+        orphan_cutoff = time.time() - ORPHAN_CHUNK_HOURS * 3600
+        deleted_backups = []
+        referenced = set()
+
+        for backup in self.list_backups():
+            if cutoff and datetime.fromisoformat(backup['created']) < cutoff:
+                self.delete_backup(backup['name'])
+                deleted_backups.append(backup['name'])
+            else:
+                referenced.update(digest for entry in backup['files'] for digest, _ in entry['chunks'])
+
+        freed_bytes = 0
+        for prefix in os.listdir(self.chunks_dir):
+            prefix_dir = os.path.join(self.chunks_dir, prefix)
+            for digest in os.listdir(prefix_dir):
+                path = os.path.join(prefix_dir, digest)
+                if digest not in referenced and os.path.getmtime(path) < orphan_cutoff:
+                    freed_bytes += os.path.getsize(path)
+                    os.remove(path)
+
+        return deleted_backups, freed_bytes
+
+
+class DedupBackup:
+    """Backup del almacén que se construye a medida que terminan los componentes.
+
+    Cada componente se trocea en cuanto se añade y su archivo se borra, así que
+    en disco no llegan a coincidir todos los componentes del backup. El índice
+    se escribe en finish(); los componentes que no se pudieron guardar se conservan sueltos."""
+
+    def __init__(self, store, name, base_dir, remove_sources=True):
+        self.store = store
+        self.name = name
+        self.base_dir = base_dir
+        self.remove_sources = remove_sources
+        self.files = []
+        self.sources = []
+        self.errors = []
+        self.size = 0
+        self.written = 0
+        self.result = None
+
+    def add(self, path):
+        arcname = os.path.relpath(path, self.base_dir)
+        try:
+            entry, written = self.store.ingest_file(path, arcname)
+        except Exception as e:
+            self.errors.append((path, e))
+            print(f"[WARNING] No se pudo guardar {arcname} en el almacén: {e}")
+            return
+
+        self.files.append(entry)
+        self.sources.append(path)
+        self.size += entry['size']
+        self.written += written
+        print(f"[INFO] Deduplicado {arcname}: {len(entry['chunks'])} fragmentos, "
+              f"{written} bytes nuevos de {entry['size']}")
+        if self.remove_sources:
+            os.remove(path)
+
+    def add_all(self, paths):
+        for path in paths:
+            self.add(path)
+
+    def finish(self):
+        if self.result is None:
+            index = {'name': self.name, 'created': datetime.now().isoformat(timespec='seconds'), 'files': self.files}
+            self.store.write_atomic(self.store.index_path(self.name), json.dumps(index).encode('utf-8'))
+            self.result = {'index': self.store.index_path(self.name), 'size': self.size, 'written': self.written}
+        return self.result
@@ -1,10 +1,11 @@
 import yaml
-import subprocess
 import sys
 import signal
 import time
 import os
-from threading import Thread
+
+from core.mysql_proxy import DEFAULT_PATTERNS, QueryCache
+from core.tunnel_manager import TunnelManager, TunnelMonitor
 
 class DevelopmentCLI:
     def __init__(self, config_path='config.yaml'):
@@ -12,7 +13,8 @@ class DevelopmentCLI:
         self.running = True
         self.config_path = config_path
         self.config = None
-        self.tunnel_process = None
+        self.tunnel_manager = None
+        self.tunnel_monitor = None
 
         if not self.load_config():
             print("[ERROR] No se pudo cargar la configuración. El programa no funcionará correctamente.")
@@ -33,7 +35,8 @@ class DevelopmentCLI:
         print("1. Crear Túnel SSH")
         print("2. Cerrar Túnel SSH")
         print("3. Ver Estado del Túnel")
-        print("4. Salir")
+        print("4. Exportar Estadísticas de los Túneles (JSON)")
+        print("5. Salir")
         print("="*50)
 
     def load_config(self):
@@ -84,102 +87,159 @@ class DevelopmentCLI:
             print("[ERROR] El puerto debe ser un número válido")
             return None
 
-    def assemble_ssh_tunnel_command(self, port=None):
-        local_port = port or 3307
+    def _parse_remote_service(self, remote_input):
         ssh_config = self.config['ssh_tunnel']
+        if not remote_input:
+            return ssh_config['remote_host'], int(ssh_config['remote_port'])
 
-        command = [
-            'ssh',
-            '-L', f"{local_port}:{ssh_config['remote_host']}:{ssh_config['remote_port']}",
-            f"{ssh_config['username']}@{ssh_config['host']}"
-        ]
-
-        if 'key_path' in ssh_config:
-            command.extend(['-i', ssh_config['key_path']])
-
-        if 'port' in ssh_config:
-            command.extend(['-p', str(ssh_config['port'])])
-
-        print(f"[INFO] Comando: {' '.join(command)}")
+        host, _, port = remote_input.rpartition(':')
+        try:
+            return host or ssh_config['remote_host'], int(port)
+        except ValueError:
+            print("[ERROR] El servicio remoto debe tener el formato host:puerto")
+            return None
 
-        return command
+    def _create_query_cache(self, remote_port, ask=True):
+        """Caché del proxy MySQL si `ssh_tunnel.proxy.enabled` y el servicio es MySQL (y el usuario la quiere)."""
+        proxy_config = self.config['ssh_tunnel'].get('proxy') or {}
+        if not proxy_config.get('enabled', False) or remote_port not in proxy_config.get('ports', [3306]):
+            return None
+        if ask:
+            answer = input("¿Activar la caché de consultas MySQL en este túnel? (S/n): ").strip().lower()
+            if answer in ('n', 'no'):
+                return None
+        return QueryCache(
+            max_bytes=float(proxy_config.get('max_mb', 64)) * 1024 * 1024,
+            ttl=proxy_config.get('ttl_seconds', 300),
+            max_entry_bytes=float(proxy_config.get('max_entry_kb', 1024)) * 1024,
+            patterns=proxy_config.get('patterns') or DEFAULT_PATTERNS,
+        )
 
     def create_ssh_tunnel_option(self):
-        if self.tunnel_process and self.tunnel_process.poll() is None:
-            print("[INFO] Ya existe un túnel SSH activo")
-            return
-
+        ssh_config = self.config['ssh_tunnel']
         print("-" * 40)
         port_input = input("Ingresa el puerto local (vacío para usar 3307): ").strip()
+        remote_input = input(f"Servicio remoto host:puerto (vacío para "
+                             f"{ssh_config['remote_host']}:{ssh_config['remote_port']}): ").strip()
         print("-" * 40)
 
         port = self._validate_port(port_input)
         if port is None:
             return
+        remote = self._parse_remote_service(remote_input)
+        if remote is None:
+            return
+        self.open_tunnel(port, remote, self._create_query_cache(remote[1]))
 
+    def open_tunnel(self, port, remote, cache=None):
+        """Abre un reenvío (conectando la sesión SSH compartida si hace falta); devuelve si se creó."""
+        ssh_config = self.config['ssh_tunnel']
         try:
-            command = self.assemble_ssh_tunnel_command(port)
-            print(f"[INFO] Creando túnel SSH en puerto {port}...")
-            print(f"[INFO] Manteniendo túnel activo... (Ctrl+C para salir del programa cerrará el túnel)")
-
-            if os.name == 'nt':
-                self.tunnel_process = subprocess.Popen(
-                    ' '.join(command),
-                    shell=True,
-                    creationflags=subprocess.CREATE_NEW_PROCESS_GROUP
+            start = time.monotonic()
+            if self.tunnel_manager is None:
+                self.tunnel_manager = TunnelManager(ssh_config, self.config_path)
+                monitor_config = ssh_config.get('monitor') or {}
+                self.tunnel_monitor = TunnelMonitor(
+                    self.tunnel_manager,
+                    interval=monitor_config.get('interval_seconds', 10),
+                    timeout=monitor_config.get('timeout_seconds', 5),
+                    max_backoff=monitor_config.get('max_backoff_seconds', 60),
+                    probe=monitor_config.get('probe', 'auto'),
+                    probe_user=monitor_config.get('probe_user', 'tunnel_probe'),
                 )
-            else:
-                self.tunnel_process = subprocess.Popen(command)
-
-            time.sleep(3)
-
-            if self.tunnel_process.poll() is None:
-                print(f"[✓] Túnel SSH creado exitosamente en puerto {port}")
-                print(f"[INFO] Puedes conectarte a localhost:{port}")
-                print(f"[INFO] El túnel permanecerá activo mientras el programa esté ejecutándose")
-            else:
-                print(f"[ERROR] Error al crear el túnel SSH")
-                print(f"[ERROR] El proceso SSH terminó inmediatamente")
-                return_code = self.tunnel_process.returncode
-                print(f"[ERROR] Código de salida: {return_code}")
-                self.tunnel_process = None
+            if not self.tunnel_manager.is_connected():
+                print(f"[INFO] Conectando a {ssh_config['username']}@{ssh_config['host']}...")
+
+            forward = self.tunnel_manager.add_forward(port, *remote, cache=cache)
+            elapsed_ms = (time.monotonic() - start) * 1000
+            print(f"[✓] Túnel SSH creado en {elapsed_ms:.0f} ms: {forward.label}")
+            if cache is not None:
+                print(f"[INFO] Caché de consultas activa (TTL {cache.ttl:.0f}s, "
+                      f"máximo {cache.max_bytes // (1024 * 1024)} MB)")
+            print(f"[INFO] Puedes conectarte a localhost:{port}")
+            print(f"[INFO] Todos los túneles comparten la conexión SSH y permanecen activos mientras el programa se ejecute")
+            if (ssh_config.get('monitor') or {}).get('enabled', True):
+                self.tunnel_monitor.start()
+            return True
 
-        except FileNotFoundError:
-            print("[ERROR] SSH no está disponible en el sistema")
-            print("[ERROR] Asegúrate de tener OpenSSH instalado o usar Git Bash")
+        except OSError as e:
+            print(f"[ERROR] No se pudo abrir el puerto local {port}: {e}")
         except Exception as e:
             print(f"[ERROR] Error inesperado al crear túnel: {e}")
+        return False
 
     def close_ssh_tunnel_option(self):
-        if not self.tunnel_process or self.tunnel_process.poll() is not None:
+        if not self.tunnel_manager or not self.tunnel_manager.forwards:
             print("[INFO] No hay túnel SSH activo")
             return
 
+        ports = sorted(self.tunnel_manager.forwards)
+        if len(ports) > 1:
+            port_input = input(f"Puerto del túnel a cerrar ({', '.join(map(str, ports))}; vacío para todos): ").strip()
+            if port_input:
+                if not port_input.isdigit() or int(port_input) not in self.tunnel_manager.forwards:
+                    print("[ERROR] No hay ningún túnel en ese puerto")
+                    return
+                self.tunnel_manager.remove_forward(int(port_input))
+                print(f"[✓] Túnel del puerto {port_input} cerrado")
+                return
+
         self._cleanup_tunnel()
         print("[✓] Túnel SSH cerrado exitosamente")
 
     def show_tunnel_status(self):
-        if not self.tunnel_process:
+        if not self.tunnel_manager or not self.tunnel_manager.forwards:
             print("[INFO] No hay túnel SSH configurado")
-        elif self.tunnel_process.poll() is None:
-            print("[✓] Túnel SSH activo")
-            print(f"[INFO] PID: {self.tunnel_process.pid}")
-        else:
-            print("[INFO] Túnel SSH no está activo")
+            return
+
+        snapshot = self.tunnel_monitor.snapshot()
+        ssh_state = snapshot['ssh']
+        print(f"[{'✓' if ssh_state['connected'] else 'WARNING'}] Conexión SSH "
+              f"{'activa' if ssh_state['connected'] else 'caída'} ({ssh_state['reconnects']} reconexiones)")
+        if ssh_state['last_error']:
+            print(f"[WARNING] Último error de conexión: {ssh_state['last_error']} "
+                  f"(reintento en {ssh_state['backoff_seconds']:.0f}s)")
+
+        for stats in snapshot['tunnels']:
+            rtt = f"{stats['rtt_ms']:.1f} ms (media {stats['rtt_avg_ms']:.1f} ms)" if stats['rtt_ms'] is not None else "sin medir"
+            print(f"[INFO] localhost:{stats['local_port']} → {stats['remote']}: {stats['status']}, RTT {rtt}")
+            print(f"       {stats['active_connections']} conexiones activas, {stats['total_connections']} en total, "
+                  f"{stats['bytes_sent']} B enviados, {stats['bytes_received']} B recibidos, "
+                  f"{stats['probe_failures']} sondeos fallidos")
+            if stats['server_version']:
+                print(f"       MySQL {stats['server_version']}")
+            if stats['cache']:
+                cache = stats['cache']
+                print(f"       Caché: {cache['hits']} aciertos, {cache['misses']} fallos "
+                      f"({cache['hit_ratio'] * 100:.0f}%), {cache['entries']} consultas, {cache['bytes']} B, "
+                      f"{cache['invalidations']} invalidadas, {cache['evictions']} expulsadas")
+            if stats['status'] != 'activo' and stats['last_error']:
+                print(f"       Último error: {stats['last_error']}")
+
+    def export_tunnel_stats_option(self):
+        if not self.tunnel_monitor or not self.tunnel_manager.forwards:
+            print("[INFO] No hay túnel SSH configurado")
+            return
+
+        default_path = (self.config['ssh_tunnel'].get('monitor') or {}).get('stats_file', 'tunnel_stats.json')
+        path = input(f"Archivo de destino (vacío para {default_path}): ").strip() or default_path
+        try:
+            self.tunnel_monitor.export(path)
+            print(f"[✓] Estadísticas exportadas a {path}")
+        except OSError as e:
+            print(f"[ERROR] No se pudieron exportar las estadísticas: {e}")
 
     def _cleanup_tunnel(self):
-        if self.tunnel_process and self.tunnel_process.poll() is None:
+        if self.tunnel_monitor:
+            self.tunnel_monitor.stop()
+            self.tunnel_monitor = None
+        if self.tunnel_manager:
             try:
-                self.tunnel_process.terminate()
-                try:
-                    self.tunnel_process.wait(timeout=5)
-                except subprocess.TimeoutExpired:
-                    self.tunnel_process.kill()
-                    self.tunnel_process.wait()
+                self.tunnel_manager.close()
             except Exception as e:
                 print(f"[WARNING] Error al cerrar túnel: {e}")
             finally:
-                self.tunnel_process = None
+                self.tunnel_manager = None
 
     def handle_user_choice(self, choice):
         """Maneja la elección del usuario"""
@@ -187,13 +247,14 @@ class DevelopmentCLI:
             '1': self.create_ssh_tunnel_option,
             '2': self.close_ssh_tunnel_option,
             '3': self.show_tunnel_status,
-            '4': self._exit_program
+            '4': self.export_tunnel_stats_option,
+            '5': self._exit_program
         }
 
         action = choice_map.get(choice)
         if action:
             action()
-        elif choice != '4':
+        elif choice != '5':
             print("[WARNING] Opción no válida")
 
     def _exit_program(self):
@@ -213,7 +274,7 @@ class DevelopmentCLI:
                 self.display_menu()
                 choice = input("Selecciona una opción: ").strip()
 
-                if choice == '4':
+                if choice == '5':
                     self._exit_program()
                     break
 
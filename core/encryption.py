@@ -0,0 +1,312 @@
+import hashlib
+import io
+import os
+import struct
+import threading
+import time
+
+
+MAGIC = b"BMENC\x01"
+ALGORITHMS = {'aes-256-gcm': 1, 'chacha20-poly1305': 2}
+# magia, algoritmo, tamaño de bloque, prefijo del nonce, identificador de la clave
+HEADER = struct.Struct('>6sBI7s8s')
+TAG_SIZE = 16
+DEFAULT_FRAME_SIZE = 1024 * 1024
+
+
+def key_id(key):
+    return hashlib.sha256(b"backup-maker-key" + key).digest()[:8]
+
+
+def load_key(key_file, create=False):
+    """Clave de 32 bytes guardada en hexadecimal; con `create` se genera si no existe."""
+    if not os.path.exists(key_file):
+        if not create:
+            raise Exception(f"No existe el archivo de clave {key_file}")
+        os.makedirs(os.path.dirname(os.path.abspath(key_file)), exist_ok=True)
+        descriptor = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(descriptor, 'w') as file:
+            file.write(os.urandom(32).hex() + "\n")
+        print(f"[WARNING] Clave de cifrado generada en {key_file}: guárdala fuera del servidor, "
+              f"sin ella los backups no se pueden restaurar")
+
+    with open(key_file, 'rb') as file:
+        content = file.read()
+    key = bytes.fromhex(content.decode('ascii').strip()) if len(content.strip()) == 64 else content
+    if len(key) != 32:
+        raise Exception(f"La clave de {key_file} debe tener 32 bytes (64 caracteres hexadecimales)")
+    return key
+
+
+def create_aead(algorithm_id, key):
+    try:
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+    except ImportError:
+        raise Exception("El cifrado de backups requiere el paquete 'cryptography' (pip install cryptography)")
+    return AESGCM(key) if algorithm_id == ALGORITHMS['aes-256-gcm'] else ChaCha20Poly1305(key)
+
+
+class CipherStats:
+    """Bytes cifrados y tiempo dedicado a cifrar, para medir el coste del cifrado."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def add(self, amount, seconds):
+        with self.lock:
+            self.bytes += amount
+            self.seconds += seconds
+
+
+class FrameCipher:
+    """Cifrado autenticado por bloques de tamaño fijo (AES-256-GCM o ChaCha20-Poly1305).
+
+    El archivo es una cabecera seguida de un bloque cifrado por cada `frame_size`
+    bytes del original. El nonce de cada bloque es prefijo aleatorio + número de
+    bloque + marca de último bloque, por lo que no se pueden reordenar, repetir
+    ni truncar bloques sin que falle la autenticación. Como todos los bloques
+    (salvo el último) ocupan lo mismo, la posición de cada uno se conoce de
+    antemano y las descargas por rangos en paralelo pueden cifrar cada rango
+    por separado."""
+
+    def __init__(self, key, algorithm='aes-256-gcm', frame_size=DEFAULT_FRAME_SIZE, nonce_prefix=None, stats=None):
+        if algorithm not in ALGORITHMS:
+            raise Exception(f"Algoritmo de cifrado no válido: {algorithm} ({', '.join(ALGORITHMS)})")
+        self.key = key
+        self.algorithm = algorithm
+        self.frame_size = int(frame_size)
+        self.nonce_prefix = nonce_prefix or os.urandom(7)
+        self.header = HEADER.pack(MAGIC, ALGORITHMS[algorithm], self.frame_size, self.nonce_prefix, key_id(key))
+        self.aead = create_aead(ALGORITHMS[algorithm], key)
+        self.stats = stats or CipherStats()
+
+    @classmethod
+    def from_header(cls, key, header, stats=None):
+        if len(header) < HEADER.size or not header.startswith(MAGIC):
+            raise Exception("No es un archivo cifrado por backup-maker")
+        _, algorithm_id, frame_size, nonce_prefix, header_key_id = HEADER.unpack(header[:HEADER.size])
+        if header_key_id != key_id(key):
+            raise Exception("El archivo se cifró con otra clave")
+        algorithm = next((name for name, value in ALGORITHMS.items() if value == algorithm_id), None)
+        if algorithm is None:
+            raise Exception(f"Algoritmo de cifrado desconocido ({algorithm_id})")
+        return cls(key, algorithm, frame_size, nonce_prefix, stats)
+
+    def for_new_file(self, frame_size=None):
+        """Misma clave, algoritmo y estadísticas con un prefijo de nonce nuevo."""
+        return FrameCipher(self.key, self.algorithm, frame_size or self.frame_size, stats=self.stats)
+
+    def nonce(self, index, last):
+        return self.nonce_prefix + struct.pack('>IB', index, 1 if last else 0)
+
+    def frame_count(self, size):
+        return max(1, -(-size // self.frame_size))
+
+    def frame_offset(self, index):
+        return HEADER.size + index * (self.frame_size + TAG_SIZE)
+
+    def encrypted_size(self, size):
+        return HEADER.size + size + self.frame_count(size) * TAG_SIZE
+
+    def encrypt_frame(self, index, data, last):
+        start = time.perf_counter()
+        frame = self.aead.encrypt(self.nonce(index, last), bytes(data), self.header)
+        self.stats.add(len(data), time.perf_counter() - start)
+        return frame
+
+    def decrypt_frame(self, index, frame, last):
+        try:
+            return self.aead.decrypt(self.nonce(index, last), bytes(frame), self.header)
+        except Exception:
+            raise Exception(f"Bloque cifrado {index} corrupto, truncado o con otra clave")
+
+
+class StreamEncryptor:
+    """Cifra un flujo secuencial; siempre retiene el último bloque completo hasta saber si es el final."""
+
+    def __init__(self, cipher):
+        self.cipher = cipher
+        self.buffer = bytearray()
+        self.index = 0
+        self.started = False
+
+    def update(self, data):
+        output = bytearray()
+        if not self.started:
+            output += self.cipher.header
+            self.started = True
+        self.buffer += data
+        frame_size = self.cipher.frame_size
+        while len(self.buffer) > frame_size:
+            output += self.cipher.encrypt_frame(self.index, self.buffer[:frame_size], last=False)
+            del self.buffer[:frame_size]
+            self.index += 1
+        return bytes(output)
+
+    def finalize(self):
+        output = self.update(b"")
+        output += self.cipher.encrypt_frame(self.index, self.buffer, last=True)
+        self.buffer = bytearray()
+        return output
+
+
+class StreamDecryptor:
+    def __init__(self, key):
+        self.key = key
+        self.cipher = None
+        self.buffer = bytearray()
+        self.index = 0
+
+    def update(self, data):
+        self.buffer += data
+        if self.cipher is None:
+            if len(self.buffer) < HEADER.size:
+                return b""
+            self.cipher = FrameCipher.from_header(self.key, bytes(self.buffer[:HEADER.size]))
+            del self.buffer[:HEADER.size]
+
+        output = bytearray()
+        stored_frame = self.cipher.frame_size + TAG_SIZE
+        # Un bloque completo solo es intermedio si detrás quedan más datos
+        while len(self.buffer) > stored_frame:
+            output += self.cipher.decrypt_frame(self.index, self.buffer[:stored_frame], last=False)
+            del self.buffer[:stored_frame]
+            self.index += 1
+        return bytes(output)
+
+    def finalize(self):
+        if self.cipher is None or len(self.buffer) < TAG_SIZE:
+            raise Exception("Archivo cifrado truncado")
+        output = self.cipher.decrypt_frame(self.index, self.buffer, last=True)
+        self.buffer = bytearray()
+        return output
+
+
+def decrypt_iter(key, data_iter):
+    decryptor = StreamDecryptor(key)
+    for data in data_iter:
+        output = decryptor.update(data)
+        if output:
+            yield output
+    yield decryptor.finalize()
+
+
+def maybe_decrypt_iter(data_iter, key_loader):
+    """Descifra el flujo si empieza por la cabecera de cifrado; si no, lo devuelve tal cual."""
+    data_iter = iter(data_iter)
+    head = b""
+    for data in data_iter:
+        head += data
+        if len(head) >= len(MAGIC):
+            break
+
+    def chained():
+        if head:
+            yield head
+        yield from data_iter
+
+    if not head.startswith(MAGIC):
+        yield from chained()
+        return
+    yield from decrypt_iter(key_loader(), chained())
+
+
+class EncryptingWriter(io.RawIOBase):
+    """Archivo de solo escritura que cifra lo que recibe (para gzip.open, shutil, etc.)."""
+
+    def __init__(self, file, cipher):
+        self.file = file
+        self.encryptor = StreamEncryptor(cipher)
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.file.write(self.encryptor.update(data))
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.file.write(self.encryptor.finalize())
+            self.file.close()
+        super().close()
+
+
+class DecryptingReader(io.RawIOBase):
+    def __init__(self, file, key, read_size=DEFAULT_FRAME_SIZE):
+        self.file = file
+        self.decryptor = StreamDecryptor(key)
+        self.read_size = read_size
+        self.pending = bytearray()
+        self.finished = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending and not self.finished:
+            data = self.file.read(self.read_size)
+            if data:
+                self.pending += self.decryptor.update(data)
+            else:
+                self.pending += self.decryptor.finalize()
+                self.finished = True
+
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        del self.pending[:size]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self.file.close()
+        super().close()
+
+
+class EncryptedRange:
+    """Lectura aleatoria del contenido descifrado de un origen con `read_at(offset, length)` y `size`.
+
+    Solo se descifran los bloques que cubren cada petición; el último bloque
+    descifrado se conserva porque las lecturas suelen ser consecutivas."""
+
+    def __init__(self, source, key):
+        self.source = source
+        self.cipher = FrameCipher.from_header(key, source.read_at(0, HEADER.size))
+        stored = source.size - HEADER.size
+        self.frames = max(1, -(-stored // (self.cipher.frame_size + TAG_SIZE)))
+        self.size = stored - self.frames * TAG_SIZE
+        if self.size < 0:
+            raise Exception("Archivo cifrado truncado")
+        self.lock = threading.Lock()
+        self.cached = (None, b"")
+
+    def frame(self, index):
+        with self.lock:
+            if self.cached[0] == index:
+                return self.cached[1]
+        frame_size = self.cipher.frame_size
+        plain_size = min(frame_size, self.size - index * frame_size)
+        data = self.cipher.decrypt_frame(index, self.source.read_at(self.cipher.frame_offset(index), plain_size + TAG_SIZE),
+                                         index == self.frames - 1)
+        with self.lock:
+            self.cached = (index, data)
+        return data
+
+    def read_at(self, offset, length):
+        end = min(offset + length, self.size)
+        frame_size = self.cipher.frame_size
+        output = bytearray()
+        for index in range(offset // frame_size, -(-end // frame_size)):
+            start = index * frame_size
+            output += self.frame(index)[max(offset - start, 0):end - start]
+        return bytes(output)
+
+    def close(self):
+        self.source.close()
+
+
+def is_encrypted_file(path):
+    with open(path, 'rb') as file:
+        return file.read(len(MAGIC)) == MAGIC
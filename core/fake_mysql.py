@@ -0,0 +1,249 @@
+"""Cliente `mysql` simulado para benchmarks y pruebas sin servidor MySQL.
+
+Acepta las mismas opciones que usa la aplicación (-u, -p, -h, -e, --batch,
+--skip-column-names, --force, base de datos) y entiende el subconjunto de SQL
+que generan Connection y SchemaBuilder: CREATE/DROP DATABASE, CREATE TABLE/INDEX, USE,
+INSERT, SHOW DATABASES/TABLES/COLUMNS, las consultas a information_schema y
+SELECT de literales. El estado se guarda en un JSON (FAKE_MYSQL_STATE) y cada
+sentencia espera FAKE_MYSQL_LATENCY_MS milisegundos, para simular la red."""
+import fcntl
+import json
+import os
+import re
+import sys
+import time
+
+
+STATE_PATH = os.environ.get('FAKE_MYSQL_STATE', '/tmp/fake_mysql_state.json')
+LATENCY = float(os.environ.get('FAKE_MYSQL_LATENCY_MS', '0')) / 1000
+
+
+class FakeSQLError(Exception):
+    pass
+
+
+def identifier(name):
+    return name.strip().strip('`')
+
+
+def split_top_level(text, separator=','):
+    """Separa por `separator` fuera de paréntesis y comillas."""
+    parts = []
+    current = []
+    depth = 0
+    quote = None
+    for char in text:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"`":
+            quote = char
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == separator and depth == 0:
+            parts.append(''.join(current))
+            current = []
+            continue
+        current.append(char)
+    if ''.join(current).strip():
+        parts.append(''.join(current))
+    return parts
+
+
+class FakeMySQL:
+    def __init__(self, database=None):
+        self.database = database
+
+    def run(self, sql):
+        """Ejecuta una sentencia; devuelve (columnas, filas) o None."""
+        if LATENCY:
+            time.sleep(LATENCY)
+        with open(STATE_PATH + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(STATE_PATH, 'r', encoding='utf-8') as file:
+                    state = json.load(file)
+            except (FileNotFoundError, ValueError):
+                state = {}
+            result = self.execute(state, ' '.join(sql.split()))
+            temp_path = STATE_PATH + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(state, file)
+            os.replace(temp_path, STATE_PATH)
+        return result
+
+    def tables(self, state, name=None):
+        name = identifier(name) if name else self.database
+        if not name:
+            raise FakeSQLError("ERROR 1046 (3D000): No database selected")
+        if name not in state:
+            raise FakeSQLError(f"ERROR 1049 (42000): Unknown database '{name}'")
+        return state[name]
+
+    def table(self, state, name):
+        database, _, table = name.rpartition('.')
+        tables = self.tables(state, database or None)
+        table = identifier(table)
+        if table not in tables:
+            raise FakeSQLError(f"ERROR 1146 (42S02): Table '{table}' doesn't exist")
+        return tables[table]
+
+    def create_table(self, state, name, body):
+        columns = []
+        for definition in split_top_level(body):
+            words = definition.split()
+            if not words or words[0].upper() in ('PRIMARY', 'KEY', 'INDEX', 'UNIQUE', 'CONSTRAINT', 'FOREIGN'):
+                continue
+            options = ' '.join(words[2:]).upper()
+            key = 'PRI' if 'PRIMARY KEY' in options else ('UNI' if 'UNIQUE' in options else '')
+            columns.append([identifier(words[0]), words[1].lower(),
+                            'NO' if 'NOT NULL' in options or key == 'PRI' else 'YES', key, 'NULL',
+                            'auto_increment' if 'AUTO_INCREMENT' in options else ''])
+        self.tables(state).setdefault(identifier(name), {'columns': columns, 'rows': 0})
+
+    def execute(self, state, sql):
+        match = re.match(r"(?i)CREATE DATABASE (IF NOT EXISTS )?(\S+)$", sql)
+        if match:
+            name = identifier(match.group(2))
+            if name in state and not match.group(1):
+                raise FakeSQLError(f"ERROR 1007 (HY000): Can't create database '{name}'; database exists")
+            state.setdefault(name, {})
+            return None
+
+        match = re.match(r"(?i)DROP DATABASE (IF EXISTS )?(\S+)$", sql)
+        if match:
+            name = identifier(match.group(2))
+            if name not in state and not match.group(1):
+                raise FakeSQLError(f"ERROR 1008 (HY000): Can't drop database '{name}'; database doesn't exist")
+            state.pop(name, None)
+            return None
+
+        match = re.match(r"(?i)USE (\S+)$", sql)
+        if match:
+            self.tables(state, match.group(1))
+            self.database = identifier(match.group(1))
+            return None
+
+        match = re.match(r"(?i)CREATE TABLE (IF NOT EXISTS )?(\S+) \((.*)\)$", sql)
+        if match:
+            self.create_table(state, match.group(2), match.group(3))
+            return None
+
+        match = re.match(r"(?i)(?:CREATE|DROP) INDEX \S+ ON (\S+)", sql)
+        if match:
+            self.table(state, match.group(1))
+            return None
+
+        match = re.match(r"(?i)INSERT INTO (\S+).*?VALUES\s*(.*)$", sql)
+        if match:
+            self.table(state, match.group(1))['rows'] += len(split_top_level(match.group(2)))
+            return None
+
+        match = re.match(r"(?i)SHOW DATABASES(?: LIKE '(.*)')?$", sql)
+        if match:
+            return ['Database'], [[name] for name in sorted(state) if match.group(1) in (None, name)]
+
+        match = re.match(r"(?i)SHOW TABLES FROM (\S+)$", sql)
+        if match:
+            return [f"Tables_in_{identifier(match.group(1))}"], [[name] for name in sorted(self.tables(state, match.group(1)))]
+
+        match = re.match(r"(?i)SHOW COLUMNS FROM (\S+)$", sql)
+        if match:
+            return ['Field', 'Type', 'Null', 'Key', 'Default', 'Extra'], self.table(state, match.group(1))['columns']
+
+        if re.match(r"(?i)SELECT schema_name as database_name FROM information_schema\.schemata", sql):
+            return ['database_name'], [[name] for name in sorted(state)]
+
+        match = re.match(r"(?i)SELECT table_name FROM information_schema\.tables WHERE table_schema = '(.*)'$", sql)
+        if match:
+            return ['table_name'], [[name] for name in sorted(state.get(match.group(1), {}))]
+
+        match = re.match(r"(?i)SELECT COUNT\(\*\) FROM (\S+)$", sql)
+        if match:
+            return ['COUNT(*)'], [[str(self.table(state, match.group(1))['rows'])]]
+
+        match = re.match(r"(?i)SELECT (?:'([^']*)'|(\d+))$", sql)
+        if match:
+            value = match.group(1) if match.group(1) is not None else match.group(2)
+            return [value], [[value]]
+
+        # El resto de sentencias (SET, DROP, transacciones...) se aceptan sin efecto
+        return None
+
+
+def main(arguments):
+    database = None
+    execute = None
+    headers = True
+    force = '--force' in arguments
+    index = 0
+    while index < len(arguments):
+        argument = arguments[index]
+        if argument in ('-u', '-h', '-P', '--user', '--host', '--port'):
+            index += 1
+        elif argument == '-e':
+            index += 1
+            execute = arguments[index]
+        elif argument == '--skip-column-names':
+            headers = False
+        elif not argument.startswith('-'):
+            database = argument
+        index += 1
+
+    fake = FakeMySQL()
+
+    def run(statement):
+        result = fake.run(statement)
+        if result:
+            columns, rows = result
+            lines = ['\t'.join(columns)] if headers else []
+            lines.extend('\t'.join(row) for row in rows)
+            sys.stdout.write(''.join(line + '\n' for line in lines))
+            sys.stdout.flush()
+
+    try:
+        if database:
+            run(f"USE {database}")
+        if execute is not None:
+            for statement in split_top_level(execute, ';'):
+                if statement.strip():
+                    run(statement)
+            return 0
+    except FakeSQLError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    # Modo sesión: sentencias por stdin terminadas en ';', ejecutadas según llegan
+    status = 0
+    pending = ''
+    for line in sys.stdin:
+        pending += line
+        statements = split_top_level(pending, ';')
+        pending = '' if pending.rstrip().endswith(';') else (statements.pop() if statements else '')
+        status = run_statements(run, statements, force) or status
+        if status and not force:
+            return status
+    # Como el cliente real, la última sentencia se ejecuta al cerrarse stdin aunque no acabe en ';'
+    return run_statements(run, [pending], force) or status
+
+
+def run_statements(run, statements, force):
+    status = 0
+    for statement in statements:
+        if not statement.strip():
+            continue
+        try:
+            run(statement)
+        except FakeSQLError as e:
+            print(e, file=sys.stderr)
+            sys.stderr.flush()
+            status = 1
+            if not force:
+                break
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,96 @@
+import fnmatch
+import os
+import shlex
+
+
+class FolderRules:
+    """Reglas de inclusión/exclusión y tamaño máximo de archivo de un directorio remoto.
+
+    Los patrones sin '/' se comparan con el nombre de cada archivo o directorio
+    (como `find -name`; un directorio excluido se omite entero) y los patrones
+    con '/' con la ruta relativa al directorio respaldado (como `find -path`).
+    `include` solo filtra archivos: la estructura de directorios se conserva."""
+
+    def __init__(self, exclude=None, include=None, max_file_size_mb=None):
+        self.exclude = list(exclude or [])
+        self.include = list(include or [])
+        self.max_file_size = int(float(max_file_size_mb) * 1024 * 1024) if max_file_size_mb else None
+
+    @classmethod
+    def for_folder(cls, backup_config, folder):
+        """Reglas globales de `backup` combinadas con las de `backup.folder_rules[folder]`."""
+        folder_rules = (backup_config.get('folder_rules') or {})
+        specific = folder_rules.get(folder) or folder_rules.get(folder.rstrip('/')) or {}
+        return cls(
+            exclude=list(backup_config.get('exclude') or []) + list(specific.get('exclude') or []),
+            include=specific.get('include', backup_config.get('include')),
+            max_file_size_mb=specific.get('max_file_size_mb', backup_config.get('max_file_size_mb')),
+        )
+
+    def is_active(self):
+        return bool(self.exclude or self.include or self.max_file_size)
+
+    def _pattern_tests(self, patterns, root):
+        tests = []
+        for pattern in patterns:
+            if '/' in pattern:
+                tests.append(f"-path {shlex.quote(root + '/' + pattern.strip('/'))}")
+            else:
+                tests.append(f"-name {shlex.quote(pattern)}")
+        return " -o ".join(tests)
+
+    def find_expression(self, root, action="-print0"):
+        """Expresión de `find` que aplica las reglas; `root` es la ruta tal como la recibe find."""
+        parts = []
+        if self.exclude:
+            parts.append(f"\\( {self._pattern_tests(self.exclude, root)} \\) -prune -o")
+        if action == "-print0":
+            # Los directorios se listan aparte para conservar los vacíos (tar se usa con --no-recursion)
+            parts.append("-type d -print0 -o")
+        else:
+            parts.append("-type d -o")
+        if self.max_file_size:
+            parts.append(f"-type f -size +{self.max_file_size}c -o")
+        if self.include:
+            parts.append(f"\\( {self._pattern_tests(self.include, root)} \\)")
+        parts.append(action)
+        return " ".join(parts)
+
+    def archive_command(self, parent, name, tar_options, wrap=lambda command: command):
+        """Pipeline find | tar que archiva `parent/name` con las reglas aplicadas.
+
+        `wrap` se aplica a cada lado de la tubería (p. ej. la prioridad del regulador)."""
+        find_command = wrap(f"find {shlex.quote(name)} {self.find_expression(name)}")
+        tar_command = wrap(f"tar {tar_options} --null --no-recursion -T -")
+        return f"cd {shlex.quote(parent)} && {find_command} | {tar_command}"
+
+    def estimate_command(self, folder):
+        """Comando que imprime "<archivos>\\t<bytes>" de lo que se respaldaría de `folder`."""
+        parent, name = os.path.dirname(folder.rstrip('/')) or '/', os.path.basename(folder.rstrip('/')) or '.'
+        expression = self.find_expression(name, action="-printf '%s\\n'")
+        return (f"cd {shlex.quote(parent)} && [ -e {shlex.quote(name)} ] && "
+                f"find {shlex.quote(name)} {expression} 2>/dev/null | "
+                f"awk '{{n++; s+=$1}} END {{printf \"%d\\t%d\\n\", n, s}}'")
+
+    def _matches(self, patterns, relative_path, match_components):
+        parts = relative_path.split('/')
+        # Con match_components cuenta también cualquier directorio padre (find lo habría podado)
+        prefixes = ['/'.join(parts[:index]) for index in range(1, len(parts) + 1)] if match_components \
+            else [relative_path]
+        for pattern in patterns:
+            if '/' in pattern:
+                if any(fnmatch.fnmatchcase(prefix, pattern.strip('/')) for prefix in prefixes):
+                    return True
+            elif any(fnmatch.fnmatchcase(prefix.rsplit('/', 1)[-1], pattern) for prefix in prefixes):
+                return True
+        return False
+
+    def allows(self, relative_path, size=0):
+        """Misma decisión que `find_expression` para un archivo de la lista del backup incremental."""
+        if self.exclude and self._matches(self.exclude, relative_path, match_components=True):
+            return False
+        if self.max_file_size and size > self.max_file_size:
+            return False
+        if self.include and not self._matches(self.include, relative_path, match_components=False):
+            return False
+        return True
@@ -0,0 +1,185 @@
+import io
+import json
+import os
+import re
+import shlex
+import uuid
+from datetime import datetime
+
+
+HASH_SEPARATOR = b"\0__HASHES__\0"
+
+
+class IncrementalBackupManager:
+    def __init__(self, backup_cli, local_save_path, incremental_config=None):
+        incremental_config = incremental_config or {}
+        self.backup_cli = backup_cli
+        self.local_save_path = local_save_path
+        self.state_dir = os.path.join(local_save_path, '.incremental')
+        self.full_every = int(incremental_config.get('full_every', 7))
+        self.use_hash = bool(incremental_config.get('hash', False))
+
+    def state_path(self, directory_path):
+        key = re.sub(r'[^A-Za-z0-9_.-]+', '_', directory_path.strip('/')) or 'root'
+        return os.path.join(self.state_dir, f"{key}.json")
+
+    def load_state(self, directory_path):
+        try:
+            with open(self.state_path(directory_path), 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    @staticmethod
+    def commit_states(states):
+        """Guarda los estados pendientes {ruta del estado: estado} de una ejecución terminada."""
+        for path, state in states.items():
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = path + ".tmp"
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(state, file)
+            os.replace(temp_path, path)
+        states.clear()
+
+    def run_remote(self, command):
+        stdin, stdout, stderr = self.backup_cli.ssh_client.exec_command(command)
+        output = stdout.read()
+        exit_status = stdout.channel.recv_exit_status()
+        error = stderr.read().decode('utf-8', errors='replace').strip()
+        if exit_status != 0:
+            raise Exception(error or f"código de salida {exit_status}")
+        if error:
+            print(f"[WARNING] {error}")
+        return output
+
+    def fetch_remote_manifest(self, directory_path):
+        command = (f"cd {shlex.quote(directory_path)} && "
+                   f"find . \\( -type f -o -type l \\) -printf '%s\\t%T@\\t%P\\0'")
+        if self.use_hash:
+            command += f" && printf '\\0__HASHES__\\0' && find . -type f -exec sha256sum -z {{}} +"
+
+        output = self.run_remote(command)
+        listing, _, hashes = output.partition(HASH_SEPARATOR)
+
+        files = {}
+        for record in listing.split(b"\0"):
+            if not record:
+                continue
+            size, mtime, path = record.split(b"\t", 2)
+            files[path.decode('utf-8', errors='surrogateescape')] = [int(size), mtime.decode('ascii')]
+
+        for record in hashes.split(b"\0"):
+            if not record:
+                continue
+            digest, _, path = record.partition(b"  ")
+            path = path.decode('utf-8', errors='surrogateescape')
+            if path.startswith('./'):
+                path = path[2:]
+            if path in files:
+                files[path].append(digest.decode('ascii'))
+
+        return files
+
+    def diff_manifests(self, previous_files, current_files):
+        changed = [path for path, meta in current_files.items() if previous_files.get(path) != meta]
+        deleted = sorted(set(previous_files) - set(current_files))
+        return sorted(changed), deleted
+
+    def is_full_due(self, state):
+        if not state:
+            return True
+        if self.full_every <= 0:
+            return False
+        return state.get('runs_since_full', 0) + 1 >= self.full_every
+
+    def upload_file_list(self, paths):
+        remote_list_path = f"/tmp/db_generator_files_{uuid.uuid4().hex}.list"
+        data = b"".join(path.encode('utf-8', errors='surrogateescape') + b"\0" for path in paths)
+        sftp = self.backup_cli.ssh_client.open_sftp()
+        try:
+            sftp.putfo(io.BytesIO(data), remote_list_path)
+        finally:
+            sftp.close()
+        return remote_list_path
+
+    def stream_archive(self, directory_path, local_path, paths=None, compress=True):
+        governor = self.backup_cli.get_resource_governor()
+        archive = f"tar -c{'z' if compress else ''}f - --ignore-failed-read -C {shlex.quote(directory_path)}"
+        cleanup = ""
+        if paths is None:
+            archive += " ."
+        else:
+            remote_list_path = self.upload_file_list(paths)
+            archive += f" --null -T {remote_list_path}"
+            cleanup = f"rm -f {remote_list_path}; "
+
+        # El flujo ya se ejecuta con pipefail; tar sale con 1 si un archivo cambió mientras se leía
+        command = f"{governor.wrap(archive)}{governor.rate_limit_pipe()}; rc=$?; {cleanup}[ $rc -le 1 ]"
+        return self.backup_cli.stream_command_to_file(command, local_path)
+
+    def backup_directory(self, directory_path, rules=None):
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        folder_name = os.path.basename(directory_path.rstrip('/')) or 'root'
+        filtered = rules is not None and rules.is_active()
+
+        print(f"[INFO] Obteniendo manifiesto remoto de {directory_path}...")
+        current_files = self.fetch_remote_manifest(directory_path)
+        if filtered:
+            current_files = {path: meta for path, meta in current_files.items() if rules.allows(path, meta[0])}
+        state = self.load_state(directory_path)
+        full = self.is_full_due(state)
+
+        if full:
+            changed, deleted = sorted(current_files), []
+            backup_type = 'full'
+            print(f"[INFO] Backup completo: {len(changed)} archivos")
+        else:
+            changed, deleted = self.diff_manifests(state['files'], current_files)
+            backup_type = 'incremental'
+            changed_bytes = sum(current_files[path][0] for path in changed)
+            print(f"[INFO] Backup incremental: {len(changed)} archivos modificados "
+                  f"({self.backup_cli.format_file_size(changed_bytes)}), {len(deleted)} eliminados")
+
+        backup_paths = []
+        base_name = f"{folder_name}_{'full' if full else 'incr'}_{timestamp}"
+
+        if full or changed:
+            # Con el almacén deduplicado el tar va sin comprimir, como en compress_directory
+            compress = not self.backup_cli.is_dedup_enabled()
+            archive_path = os.path.join(self.local_save_path, f"{base_name}.tar{'.gz' if compress else ''}")
+            # Con reglas de exclusión el completo también se archiva a partir de la lista filtrada
+            if not self.stream_archive(directory_path, archive_path, None if full and not filtered else changed,
+                                       compress):
+                if os.path.exists(archive_path):
+                    os.remove(archive_path)
+                return []
+            backup_paths.append(archive_path)
+            self.backup_cli.component_contents[archive_path] = [
+                os.path.join(directory_path, path) for path in changed
+            ]
+
+        if backup_paths or deleted:
+            index_path = os.path.join(self.local_save_path, f"{base_name}.json")
+            with open(index_path, 'w', encoding='utf-8') as file:
+                json.dump({
+                    'type': backup_type,
+                    'directory': directory_path,
+                    'created': datetime.now().isoformat(timespec='seconds'),
+                    'base_full': timestamp if full else state.get('last_full'),
+                    'changed': len(changed),
+                    'deleted': deleted,
+                }, file, indent=2)
+            backup_paths.append(index_path)
+        else:
+            print(f"[INFO] Sin cambios en {directory_path}")
+
+        # El estado solo se guarda cuando el backup queda registrado como correcto (commit_states):
+        # si la ejecución falla, el siguiente incremental se calcula contra el último backup válido
+        self.backup_cli.incremental_states[self.state_path(directory_path)] = {
+            'directory': directory_path,
+            'last_full': timestamp if full else state.get('last_full'),
+            'runs_since_full': 0 if full else state.get('runs_since_full', 0) + 1,
+            'files': current_files,
+        }
+
+        return backup_paths
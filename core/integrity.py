@@ -0,0 +1,254 @@
+import hashlib
+import json
+import mmap
+import os
+import re
+import shlex
+import struct
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from core.encryption import DecryptingReader, TAG_SIZE, maybe_decrypt_iter
+
+
+DEFAULT_CHUNK_SIZE = 16 * 1024 * 1024
+REMOTE_SHA256_PATTERN = re.compile(r'^([0-9a-f]{64})  -$')
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+def wrap_with_remote_checksum(command):
+    # tee reenvía el flujo por el descriptor 3 (stdout original) y sha256sum escribe el hash en stderr
+    pipeline = f"{{ {command} ; }} | tee /dev/fd/3 | sha256sum >&2"
+    return f"bash -o pipefail -c {shlex.quote('{ ' + pipeline + '; } 3>&1')}"
+
+
+def split_remote_checksum(error_text):
+    checksum = None
+    other_lines = []
+    for line in error_text.splitlines():
+        match = REMOTE_SHA256_PATTERN.match(line.strip())
+        if match:
+            checksum = match.group(1)
+        else:
+            other_lines.append(line)
+    return checksum, "\n".join(other_lines)
+
+
+class ChunkedHasher:
+    """SHA-256 del flujo completo más un SHA-256 por bloque de chunk_size bytes.
+
+    Los hashes por bloque permiten verificar después el archivo en paralelo."""
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.full_hash = hashlib.sha256()
+        self.chunk_hash = hashlib.sha256()
+        self.chunk_filled = 0
+        self.chunks = []
+        self.size = 0
+
+    def update(self, data):
+        self.full_hash.update(data)
+        self.size += len(data)
+
+        view = memoryview(data)
+        while view:
+            take = min(len(view), self.chunk_size - self.chunk_filled)
+            self.chunk_hash.update(view[:take])
+            self.chunk_filled += take
+            view = view[take:]
+            if self.chunk_filled == self.chunk_size:
+                self.chunks.append(self.chunk_hash.hexdigest())
+                self.chunk_hash = hashlib.sha256()
+                self.chunk_filled = 0
+
+    def result(self):
+        chunks = list(self.chunks)
+        if self.chunk_filled or not chunks:
+            chunks.append(self.chunk_hash.hexdigest())
+        return {
+            'size': self.size,
+            'sha256': self.full_hash.hexdigest(),
+            'chunk_size': self.chunk_size,
+            'chunks': chunks,
+        }
+
+
+class OrderedStreamHasher:
+    """Alimenta un ChunkedHasher con fragmentos que llegan desordenados (descargas por rangos).
+
+    Los rangos ya presentes en disco (descarga reanudada) se leen del fichero
+    local cuando les llega el turno; si el fichero está cifrado (`cipher`) se
+    descifran sus bloques. Como mucho se guardan `max_pending` bytes en memoria:
+    los fragmentos que no caben (ya escritos en disco) también se releen del fichero."""
+
+    def __init__(self, hasher, disk_path=None, disk_ranges=None, read_size=1024 * 1024, cipher=None, size=None,
+                 max_pending=64 * 1024 * 1024):
+        self.hasher = hasher
+        self.disk_path = disk_path
+        self.disk_ranges = dict(disk_ranges or {})
+        self.read_size = read_size
+        self.cipher = cipher
+        self.size = size
+        self.max_pending = max_pending
+        self.next_offset = 0
+        self.pending = {}
+        self.pending_bytes = 0
+
+    def feed(self, offset, data):
+        if self.disk_path and offset != self.next_offset and self.pending_bytes + len(data) > self.max_pending:
+            self.disk_ranges[offset] = len(data)
+        else:
+            self.pending[offset] = data
+            self.pending_bytes += len(data)
+        self.drain()
+
+    def drain(self):
+        while True:
+            if self.next_offset in self.pending:
+                data = self.pending.pop(self.next_offset)
+                self.pending_bytes -= len(data)
+                self.hasher.update(data)
+                self.next_offset += len(data)
+            elif self.next_offset in self.disk_ranges:
+                length = self.disk_ranges.pop(self.next_offset)
+                self.feed_from_disk(self.next_offset, length)
+                self.next_offset += length
+            else:
+                break
+
+    def feed_from_disk(self, offset, length):
+        if self.cipher:
+            self.feed_encrypted_from_disk(offset, length)
+            return
+
+        with open(self.disk_path, 'rb') as file:
+            file.seek(offset)
+            remaining = length
+            while remaining:
+                data = file.read(min(self.read_size, remaining))
+                if not data:
+                    raise Exception(f"Fichero local incompleto: {self.disk_path}")
+                self.hasher.update(data)
+                remaining -= len(data)
+
+    def feed_encrypted_from_disk(self, offset, length):
+        frame_size = self.cipher.frame_size
+        last_index = self.cipher.frame_count(self.size) - 1
+        with open(self.disk_path, 'rb') as file:
+            for index in range(offset // frame_size, -(-(offset + length) // frame_size)):
+                plain_size = min(frame_size, self.size - index * frame_size)
+                file.seek(self.cipher.frame_offset(index))
+                frame = file.read(plain_size + TAG_SIZE)
+                self.hasher.update(self.cipher.decrypt_frame(index, frame, index == last_index))
+
+
+def zip_member_data_offset(archive_path, info):
+    with open(archive_path, 'rb') as file:
+        file.seek(info.header_offset)
+        header = file.read(30)
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    return info.header_offset + 30 + name_length + extra_length
+
+
+def hash_chunks_parallel(path, offset=0, length=None, chunk_size=DEFAULT_CHUNK_SIZE, workers=4):
+    if length is None:
+        length = os.path.getsize(path) - offset
+    if length == 0:
+        return [hashlib.sha256().hexdigest()]
+
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)
+        try:
+            def hash_chunk(start):
+                # hashlib libera el GIL con bloques grandes: los hilos trabajan en paralelo
+                return hashlib.sha256(view[start:min(start + chunk_size, offset + length)]).hexdigest()
+
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                return list(executor.map(hash_chunk, range(offset, offset + length, chunk_size)))
+        finally:
+            view.release()
+
+
+def hash_stream_chunks(stream, chunk_size=DEFAULT_CHUNK_SIZE, read_size=1024 * 1024):
+    hasher = ChunkedHasher(chunk_size)
+    while True:
+        data = stream.read(read_size)
+        if not data:
+            break
+        hasher.update(data)
+    return hasher.result()['chunks']
+
+
+def write_manifest(manifest_path, manifest):
+    temp_path = manifest_path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2, ensure_ascii=False)
+    os.replace(temp_path, manifest_path)
+
+
+def verify_manifest(manifest_path, workers=4, key_loader=None, dedup_store=None):
+    with open(manifest_path, 'r', encoding='utf-8') as file:
+        manifest = json.load(file)
+
+    dedup_files = {}
+    if manifest.get('dedup') and dedup_store and os.path.exists(dedup_store.index_path(manifest['dedup'])):
+        dedup_files = {entry['name']: entry for entry in dedup_store.load_backup(manifest['dedup'])['files']}
+
+    base_dir = os.path.dirname(manifest_path)
+    archive_path = os.path.join(base_dir, manifest['archive']) if manifest.get('archive') else None
+    archive = zipfile.ZipFile(archive_path) if archive_path and os.path.exists(archive_path) else None
+
+    results = []
+    try:
+        for component in manifest['components']:
+            chunk_size = component['chunk_size']
+            try:
+                if component['name'] in dedup_files:
+                    # Componente del almacén deduplicado: se recompone fragmento a fragmento
+                    hasher = ChunkedHasher(chunk_size)
+                    data_iter = (dedup_store.get_chunk(digest) for digest, _ in dedup_files[component['name']]['chunks'])
+                    for data in maybe_decrypt_iter(data_iter, key_loader) if component.get('encrypted') else data_iter:
+                        hasher.update(data)
+                    chunks = hasher.result()['chunks']
+                elif component.get('encrypted'):
+                    # Los hashes son del contenido descifrado: se verifica descifrando (y autenticando) el flujo
+                    if archive and component['name'] in archive.NameToInfo:
+                        source = archive.open(component['name'])
+                    elif os.path.exists(os.path.join(base_dir, component['name'])):
+                        source = open(os.path.join(base_dir, component['name']), 'rb')
+                    else:
+                        results.append((component['name'], None, "no encontrado"))
+                        continue
+                    with DecryptingReader(source, key_loader()) as reader:
+                        chunks = hash_stream_chunks(reader, chunk_size)
+                elif archive and component['name'] in archive.NameToInfo:
+                    info = archive.getinfo(component['name'])
+                    if info.compress_type == zipfile.ZIP_STORED:
+                        chunks = hash_chunks_parallel(archive_path, zip_member_data_offset(archive_path, info),
+                                                      info.file_size, chunk_size, workers)
+                    else:
+                        with archive.open(info) as member:
+                            chunks = hash_stream_chunks(member, chunk_size)
+                elif os.path.exists(os.path.join(base_dir, component['name'])):
+                    chunks = hash_chunks_parallel(os.path.join(base_dir, component['name']),
+                                                  chunk_size=chunk_size, workers=workers)
+                else:
+                    results.append((component['name'], None, "no encontrado"))
+                    continue
+
+                bad_chunks = [index for index, (expected, actual) in enumerate(zip(component['chunks'], chunks))
+                              if expected != actual]
+                if len(chunks) != len(component['chunks']):
+                    results.append((component['name'], False, "número de bloques distinto"))
+                elif bad_chunks:
+                    results.append((component['name'], False, f"bloques corruptos: {bad_chunks}"))
+                else:
+                    results.append((component['name'], True, f"{len(chunks)} bloques correctos"))
+            except Exception as e:
+                results.append((component['name'], False, str(e)))
+    finally:
+        if archive:
+            archive.close()
+
+    return manifest, results
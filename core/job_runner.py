@@ -0,0 +1,339 @@
+import json
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+import yaml
+
+from core.mysql_session import MySQLSession, quote_identifier
+
+
+JOB_REPORT_SUFFIX = ".report.json"
+USE_STATEMENT = re.compile(r'^\s*USE\s+(`[^`]+`|[\w$]+)', re.IGNORECASE | re.MULTILINE)
+
+
+class JobError(Exception):
+    pass
+
+
+def load_job(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            job = yaml.safe_load(file) or {}
+    except FileNotFoundError:
+        raise JobError(f"No se encontró el archivo de trabajo {path}")
+    except yaml.YAMLError as e:
+        raise JobError(f"Error en {path}: {e}")
+
+    steps = job.get('steps')
+    if not isinstance(steps, list) or not steps:
+        raise JobError(f"{path} no tiene pasos (steps)")
+
+    ids = set()
+    for index, step in enumerate(steps, 1):
+        if not isinstance(step, dict) or 'op' not in step:
+            raise JobError(f"El paso {index} no indica la operación (op)")
+        step.setdefault('id', f"{step['op']}_{index}")
+        if step['id'] in ids:
+            raise JobError(f"Paso duplicado: {step['id']}")
+        if step['op'] not in JobRunner.OPERATIONS:
+            raise JobError(f"Operación desconocida en '{step['id']}': {step['op']} "
+                           f"({', '.join(JobRunner.OPERATIONS)})")
+        needs = step.get('needs') or []
+        step['needs'] = [needs] if isinstance(needs, str) else list(needs)
+        ids.add(step['id'])
+
+    for step in steps:
+        missing = [need for need in step['needs'] if need not in ids]
+        if missing:
+            raise JobError(f"El paso '{step['id']}' depende de pasos que no existen: {', '.join(missing)}")
+    check_acyclic(steps)
+    return job
+
+
+def check_acyclic(steps):
+    """Orden topológico (Kahn); falla si las dependencias forman un ciclo."""
+    pending = {step['id']: set(step['needs']) for step in steps}
+    order = []
+    while pending:
+        ready = sorted(step_id for step_id, needs in pending.items() if not needs)
+        if not ready:
+            raise JobError(f"Dependencias circulares entre: {', '.join(sorted(pending))}")
+        for step_id in ready:
+            order.append(step_id)
+            del pending[step_id]
+        for needs in pending.values():
+            needs.difference_update(ready)
+    return order
+
+
+class JobContext:
+    """Conexiones compartidas por todos los pasos de un trabajo.
+
+    Hay una sola `Connection` (SSH del .env) para los pasos de bases de datos y
+    un solo `BackupCLI` (SSH de config.yaml) para los de backup; ambos se crean
+    con el primer paso que los necesita. Los pasos de backup comparten el estado
+    de BackupCLI (configuración, progreso), así que se ejecutan de uno en uno.
+    Las sentencias SQL usan sesiones persistentes del cliente mysql sobre la
+    conexión compartida: cada paso toma una sesión libre del grupo y la
+    devuelve al terminar. Como una sesión no puede volver a no tener base de
+    datos, los pasos sin `database` solo reutilizan sesiones que no la cambiaron."""
+
+    def __init__(self, config_path='config.yaml'):
+        self.config_path = config_path
+        self.lock = threading.Lock()
+        self.backup_lock = threading.Lock()
+        self.connection = None
+        self.backup_cli = None
+        self.idle_sessions = queue.LifoQueue()
+        self.sessions = []
+        self.session_databases = {}
+        self.counters = {'ssh_connections': 0, 'mysql_sessions': 0, 'mysql_session_reuses': 0}
+
+    def get_connection(self):
+        with self.lock:
+            if self.connection is None:
+                from core.connection import Connection
+                try:
+                    connection = Connection()
+                except SystemExit:
+                    # Connection termina el programa si no puede conectar; aquí solo falla el paso
+                    raise JobError("No se pudo establecer la conexión SSH de bases de datos (.env)")
+                self.counters['ssh_connections'] += 1
+                self.connection = connection
+            return self.connection
+
+    def run_backup_operation(self, method_name, *args):
+        with self.backup_lock:
+            if self.backup_cli is None:
+                from core.backup_cli import BackupCLI
+                self.backup_cli = BackupCLI(self.config_path)
+                self.backup_cli.keep_connection = True
+            ssh_client = self.backup_cli.ssh_client
+            try:
+                return getattr(self.backup_cli, method_name)(*args)
+            finally:
+                if self.backup_cli.ssh_client is not None and self.backup_cli.ssh_client is not ssh_client:
+                    self.counters['ssh_connections'] += 1
+
+    def acquire_session(self, database=None):
+        """Sesión libre del grupo; sin `database`, una que siga sin base de datos seleccionada."""
+        skipped = []
+        session = None
+        try:
+            while session is None:
+                session = self.idle_sessions.get_nowait()
+                if not database and self.session_databases.get(session):
+                    skipped.append(session)
+                    session = None
+        except queue.Empty:
+            pass
+        for idle in skipped:
+            self.idle_sessions.put(idle)
+        if session is not None:
+            with self.lock:
+                self.counters['mysql_session_reuses'] += 1
+            return session
+
+        connection = self.get_connection()
+        session = MySQLSession(connection.ssh, connection.mysql_client_command())
+        with self.lock:
+            self.sessions.append(session)
+            self.counters['mysql_sessions'] += 1
+        return session
+
+    def release_session(self, session, healthy=True, database=None):
+        """Devuelve la sesión al grupo; `database` es la que quedó seleccionada, si cambió."""
+        if database:
+            self.session_databases[session] = database
+        if healthy:
+            self.idle_sessions.put(session)
+        else:
+            session.close()
+
+    def close(self):
+        for session in self.sessions:
+            session.close()
+        self.sessions = []
+        if self.backup_cli is not None:
+            self.backup_cli.close_connection()
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class JobRunner:
+    """Ejecuta un archivo de trabajo YAML: pasos con dependencias (needs) en forma de DAG.
+
+    Los pasos cuyas dependencias han terminado se ejecutan a la vez, con como
+    mucho `workers` en paralelo. Si un paso falla, los que dependen de él se
+    omiten y el resto sigue. Al terminar se escribe un informe JSON con los
+    tiempos de cada paso."""
+
+    OPERATIONS = ('extract_schema', 'deploy_schema', 'sql', 'backup', 'verify', 'extract', 'upload')
+
+    def __init__(self, job_path, workers=None, report_path=None, config_path=None):
+        self.job_path = job_path
+        self.job = load_job(job_path)
+        self.steps = {step['id']: step for step in self.job['steps']}
+        self.workers = max(1, int(workers or self.job.get('workers', 4)))
+        self.report_path = report_path or self.job.get('report') or \
+            os.path.splitext(job_path)[0] + JOB_REPORT_SUFFIX
+        self.context = JobContext(config_path or self.job.get('config', 'config.yaml'))
+        self.results = {}
+        self.started = None
+
+    def run(self):
+        self.started = datetime.now()
+        start = time.monotonic()
+        print(f"[INFO] Trabajo {os.path.basename(self.job_path)}: {len(self.steps)} pasos, {self.workers} en paralelo")
+
+        pending = dict(self.steps)
+        running = {}
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                while pending or running:
+                    for step_id, step in list(pending.items()):
+                        states = [self.results.get(need, {}).get('status') for need in step['needs']]
+                        if any(state in ('error', 'skipped') for state in states):
+                            del pending[step_id]
+                            self.results[step_id] = self.step_record(step, 'skipped', error="falló una dependencia")
+                            print(f"[WARNING] [{step_id}] omitido: falló una dependencia")
+                        elif all(state == 'ok' for state in states):
+                            del pending[step_id]
+                            running[executor.submit(self.run_step, step, time.monotonic())] = step_id
+                    if not running:
+                        continue
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        step_id = running.pop(future)
+                        self.results[step_id] = future.result()
+        finally:
+            self.context.close()
+
+        seconds = time.monotonic() - start
+        self.print_summary(seconds)
+        try:
+            self.write_report(seconds)
+            print(f"Informe del trabajo: {self.report_path}")
+        except OSError as e:
+            print(f"[WARNING] No se pudo escribir el informe del trabajo: {e}")
+        return all(result['status'] == 'ok' for result in self.results.values())
+
+    def step_record(self, step, status, started=None, seconds=0.0, error=None):
+        return {'id': step['id'], 'op': step['op'], 'needs': step['needs'], 'status': status,
+                'started': started, 'seconds': round(seconds, 3), 'error': error,
+                'waited_seconds': None}
+
+    def run_step(self, step, submitted):
+        started = datetime.now().isoformat(timespec='seconds')
+        print(f"[INFO] [{step['id']}] {step['op']} iniciado")
+        start = time.monotonic()
+        try:
+            ok = getattr(self, f"op_{step['op']}")(step)
+            error = None if ok else "la operación terminó con errores"
+        except Exception as e:
+            ok, error = False, str(e)
+        seconds = time.monotonic() - start
+
+        record = self.step_record(step, 'ok' if ok else 'error', started, seconds, error)
+        # Tiempo esperando un hilo libre (límite de workers)
+        record['waited_seconds'] = round(start - submitted, 3)
+        if ok:
+            print(f"[OK] [{step['id']}] completado en {seconds:.2f}s")
+        else:
+            print(f"[ERROR] [{step['id']}] {error} ({seconds:.2f}s)")
+        return record
+
+    def op_extract_schema(self, step):
+        from core.schema_builder import SchemaBuilder
+        output_file = os.path.abspath(step['output']) if step.get('output') else None
+        return SchemaBuilder().extract_database_schema(self.context.get_connection(), step['database'], output_file)
+
+    def op_deploy_schema(self, step):
+        from core.schema_builder import SchemaBuilder
+        schema_builder = SchemaBuilder(step['schema_file'])
+        schema_builder.load_schema()
+        if step.get('database'):
+            # Permite desplegar el mismo esquema con otro nombre (p. ej. staging)
+            schema_builder.schema_data['database_name'] = step['database']
+        return schema_builder.create_database_structure(self.context.get_connection())
+
+    def op_sql(self, step):
+        statements = step.get('sql') or []
+        if isinstance(statements, str):
+            statements = [statements]
+        if step.get('file'):
+            with open(step['file'], 'r', encoding='utf-8') as file:
+                statements = list(statements) + [file.read()]
+        if not statements:
+            raise JobError("el paso sql necesita 'sql' o 'file'")
+
+        session = self.context.acquire_session(step.get('database'))
+        healthy = True
+        # Las sesiones se reutilizan: siempre se fija la base de datos del paso
+        database = step.get('database')
+        try:
+            if database:
+                session.execute(f"USE {quote_identifier(database)}")
+            for statement in statements:
+                used = USE_STATEMENT.findall(statement)
+                session.execute(statement)
+                if used:
+                    database = used[-1].strip('`')
+            return True
+        except Exception:
+            # Una sesión que falló puede haber quedado a medias: no vuelve al grupo
+            healthy = False
+            raise
+        finally:
+            self.context.release_session(session, healthy, database)
+
+    def op_backup(self, step):
+        return self.context.run_backup_operation('run_backup')
+
+    def op_verify(self, step):
+        return self.context.run_backup_operation('verify_backups_option')
+
+    def op_extract(self, step):
+        return self.context.run_backup_operation('extract_files_option', step.get('run', 'latest'),
+                                                 step.get('path', ''), step.get('destination', ''),
+                                                 step.get('component'))
+
+    def op_upload(self, step):
+        return self.context.run_backup_operation('upload_offsite_option', step.get('run', 'latest'))
+
+    def print_summary(self, seconds):
+        print("\n" + "=" * 50)
+        print("    RESUMEN DEL TRABAJO")
+        print("=" * 50)
+        icons = {'ok': '✅', 'error': '❌', 'skipped': '⏭'}
+        for step_id in self.steps:
+            result = self.results.get(step_id)
+            if result:
+                print(f"   {icons[result['status']]} {step_id} ({result['op']}): {result['seconds']:.2f}s"
+                      + (f" - {result['error']}" if result['error'] else ""))
+        step_seconds = sum(result['seconds'] for result in self.results.values())
+        print(f"Tiempo total: {seconds:.2f}s (suma de pasos {step_seconds:.2f}s)")
+        counters = self.context.counters
+        print(f"Sesiones MySQL: {counters['mysql_sessions']} abiertas, {counters['mysql_session_reuses']} reutilizadas")
+
+    def write_report(self, seconds):
+        report = {
+            'job': os.path.abspath(self.job_path),
+            'started': self.started.isoformat(timespec='seconds'),
+            'seconds': round(seconds, 3),
+            'workers': self.workers,
+            'status': 'ok' if all(result['status'] == 'ok' for result in self.results.values()) else 'error',
+            'connections': dict(self.context.counters),
+            'steps': [self.results[step_id] for step_id in self.steps if step_id in self.results],
+        }
+        temp_path = self.report_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+        os.replace(temp_path, self.report_path)
+        return self.report_path
@@ -0,0 +1,406 @@
+import gzip
+import json
+import math
+import os
+import queue
+import re
+import shlex
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from core.mysql_session import MySQLSession, MySQLSessionError, quote_identifier, quote_literal, unescape_batch_field
+
+
+INTEGER_TYPES = ('tinyint', 'smallint', 'mediumint', 'int', 'bigint')
+BINARY_TYPES = ('binary', 'varbinary', 'tinyblob', 'blob', 'mediumblob', 'longblob', 'geometry', 'point',
+                'linestring', 'polygon', 'multipoint', 'multilinestring', 'multipolygon', 'geometrycollection')
+SECONDARY_KEY_PATTERN = re.compile(r'^\s*(UNIQUE |FULLTEXT |SPATIAL )?KEY ')
+FOREIGN_KEY_PATTERN = re.compile(r'^\s*CONSTRAINT .* FOREIGN KEY ')
+KEY_COLUMNS_PATTERN = re.compile(r'\(`([^`]+)`')
+MANIFEST_NAME = "manifest.json"
+OBJECTS_NAME = "objects.sql"
+
+
+def split_create_table(create_sql):
+    lines = create_sql.splitlines()
+    header, definitions, footer = lines[0], lines[1:-1], lines[-1]
+
+    auto_increment_column = None
+    primary_key_first = None
+    for definition in definitions:
+        stripped = definition.strip()
+        if 'AUTO_INCREMENT' in stripped and stripped.startswith('`'):
+            auto_increment_column = stripped.split('`')[1]
+        elif stripped.startswith('PRIMARY KEY'):
+            match = KEY_COLUMNS_PATTERN.search(stripped)
+            primary_key_first = match.group(1) if match else None
+
+    kept, deferred_keys, foreign_keys = [], [], []
+    auto_increment_key_kept = auto_increment_column is None or auto_increment_column == primary_key_first
+    for definition in definitions:
+        clean = definition.strip().rstrip(',')
+        if SECONDARY_KEY_PATTERN.match(definition):
+            match = KEY_COLUMNS_PATTERN.search(clean)
+            if not auto_increment_key_kept and match and match.group(1) == auto_increment_column:
+                auto_increment_key_kept = True
+                kept.append(clean)
+            else:
+                deferred_keys.append(clean)
+        elif FOREIGN_KEY_PATTERN.match(definition):
+            foreign_keys.append(clean)
+        else:
+            kept.append(clean)
+
+    create_sql = header + "\n  " + ",\n  ".join(kept) + "\n" + footer
+    return create_sql, deferred_keys, foreign_keys
+
+
+class ParallelMySQLDumper:
+    def __init__(self, backup_cli, mysql_config, workers=4, chunk_rows=100000, insert_rows=1000):
+        self.backup_cli = backup_cli
+        self.client_command = backup_cli.build_mysql_client_command('mysql', mysql_config)
+        self.dump_command = backup_cli.build_mysql_client_command('mysqldump', mysql_config)
+        self.workers = max(1, int(workers))
+        self.chunk_rows = max(1, int(chunk_rows))
+        self.insert_rows = max(1, int(insert_rows))
+
+    def open_session(self):
+        return MySQLSession(self.backup_cli.ssh_client, self.client_command)
+
+    def load_tables(self, session, database):
+        schema = quote_literal(database)
+        tables = {}
+        for name, rows in session.query(
+                f"SELECT table_name, IFNULL(table_rows, 0) FROM information_schema.tables "
+                f"WHERE table_schema = {schema} AND table_type = 'BASE TABLE' ORDER BY table_name"):
+            tables[name] = {'name': name, 'rows': int(rows), 'columns': [], 'primary_key': []}
+
+        for table, column, data_type, extra in session.query(
+                f"SELECT table_name, column_name, data_type, extra FROM information_schema.columns "
+                f"WHERE table_schema = {schema} ORDER BY table_name, ordinal_position"):
+            if table in tables and 'GENERATED' not in extra.upper():
+                tables[table]['columns'].append({'name': column, 'type': data_type.lower()})
+
+        for table, column in session.query(
+                f"SELECT table_name, column_name FROM information_schema.key_column_usage "
+                f"WHERE table_schema = {schema} AND constraint_name = 'PRIMARY' ORDER BY table_name, ordinal_position"):
+            if table in tables:
+                tables[table]['primary_key'].append(column)
+
+        for table in tables.values():
+            rows = session.query(f"SHOW CREATE TABLE {quote_identifier(database)}.{quote_identifier(table['name'])}")
+            table['create'], table['deferred_keys'], table['foreign_keys'] = split_create_table(rows[0][1])
+
+        return list(tables.values())
+
+    def load_views(self, session, database):
+        # Con la base de datos por defecto, SHOW CREATE VIEW no la antepone a las tablas y la vista
+        # se puede restaurar con otro nombre de base de datos
+        session.execute(f"USE {quote_identifier(database)}")
+        views = []
+        for (name,) in session.query(f"SELECT table_name FROM information_schema.views "
+                                     f"WHERE table_schema = {quote_literal(database)} ORDER BY table_name"):
+            rows = session.query(f"SHOW CREATE VIEW {quote_identifier(name)}")
+            views.append({'name': name, 'create': rows[0][1]})
+        return views
+
+    def dump_objects(self, database, output_dir):
+        """Triggers, rutinas y eventos con mysqldump, sin tablas ni datos (las vistas van en el manifiesto)."""
+        path = os.path.join(output_dir, OBJECTS_NAME)
+        command = (f"{self.dump_command} --single-transaction --no-data --no-create-info --skip-comments "
+                   f"--routines --triggers --events {shlex.quote(database)}")
+        if not self.backup_cli.stream_command_to_file(command, path):
+            raise Exception("No se pudieron volcar triggers, rutinas y eventos")
+        return os.path.basename(path)
+
+    def plan_chunks(self, session, database, table):
+        primary_key = table['primary_key']
+        if len(primary_key) != 1 or table['rows'] <= self.chunk_rows:
+            return [None]
+
+        column_types = {column['name']: column['type'] for column in table['columns']}
+        if column_types.get(primary_key[0]) not in INTEGER_TYPES:
+            return [None]
+
+        pk = quote_identifier(primary_key[0])
+        rows = session.query(f"SELECT MIN({pk}), MAX({pk}) FROM "
+                             f"{quote_identifier(database)}.{quote_identifier(table['name'])}")
+        if not rows or rows[0][0] == 'NULL':
+            return [None]
+
+        low, high = int(rows[0][0]), int(rows[0][1])
+        chunk_count = math.ceil(table['rows'] / self.chunk_rows)
+        step = max(1, math.ceil((high - low + 1) / chunk_count))
+        bounds = list(range(low + step, high + 1, step))
+        if not bounds:
+            return [None]
+
+        chunks = [f"{pk} < {bounds[0]}"]
+        for start, end in zip(bounds, bounds[1:]):
+            chunks.append(f"{pk} >= {start} AND {pk} < {end}")
+        chunks.append(f"{pk} >= {bounds[-1]}")
+        return chunks
+
+    def column_expression(self, column):
+        name = quote_identifier(column['name'])
+        if column['type'] in BINARY_TYPES:
+            return f"IF({name} IS NULL, 'NULL', CONCAT('0x', HEX({name})))"
+        if column['type'] == 'bit':
+            return f"IFNULL(CAST({name} AS UNSIGNED), 'NULL')"
+        return f"QUOTE({name})"
+
+    def read_binlog_position(self, coordinator):
+        for statement in ("SHOW MASTER STATUS", "SHOW BINARY LOG STATUS"):
+            try:
+                return coordinator.query(statement)
+            except MySQLSessionError:
+                continue
+        return []
+
+    def start_snapshot(self, coordinator, sessions):
+        coordinator.execute("FLUSH TABLES WITH READ LOCK")
+        try:
+            binlog = self.read_binlog_position(coordinator)
+            markers = [session.send("SET SESSION TRANSACTION ISOLATION LEVEL REPEATABLE READ; "
+                                    "START TRANSACTION WITH CONSISTENT SNAPSHOT")
+                       for session in sessions]
+            for session, marker in zip(sessions, markers):
+                for _ in session.iter_rows(marker):
+                    pass
+        finally:
+            coordinator.execute("UNLOCK TABLES")
+
+        if binlog and len(binlog[0]) >= 2:
+            return {'file': binlog[0][0], 'position': int(binlog[0][1])}
+        return None
+
+    def dump_chunk(self, session, database, table, where, path):
+        columns = ", ".join(self.column_expression(column) for column in table['columns'])
+        select_sql = (f"SELECT CONCAT('(', CONCAT_WS(',', {columns}), ')') "
+                      f"FROM {quote_identifier(database)}.{quote_identifier(table['name'])}")
+        if where:
+            select_sql += f" WHERE {where}"
+
+        column_list = ", ".join(quote_identifier(column['name']) for column in table['columns'])
+        insert_prefix = f"INSERT INTO {quote_identifier(table['name'])} ({column_list}) VALUES\n".encode('utf-8')
+
+        rows = 0
+        batch = []
+        with self.backup_cli.open_local_writer(path) as raw_file:
+            # Sin gzip (almacén deduplicado) los fragmentos que no cambian se reutilizan entre volcados
+            chunk_file = gzip.open(raw_file, 'wb', compresslevel=6) if path.endswith('.gz') else raw_file
+            with chunk_file:
+                for line in session.stream(select_sql):
+                    batch.append(unescape_batch_field(line))
+                    if len(batch) >= self.insert_rows:
+                        chunk_file.write(insert_prefix + b",\n".join(batch) + b";\n")
+                        rows += len(batch)
+                        batch = []
+                if batch:
+                    chunk_file.write(insert_prefix + b",\n".join(batch) + b";\n")
+                    rows += len(batch)
+
+        return {'file': os.path.basename(path), 'where': where, 'rows': rows, 'bytes': os.path.getsize(path)}
+
+    def dump_database(self, database, output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+        coordinator = self.open_session()
+        sessions = []
+
+        try:
+            print(f"[INFO] Analizando tablas de {database}...")
+            tables = self.load_tables(coordinator, database)
+            views = self.load_views(coordinator, database)
+            objects = self.dump_objects(database, output_dir)
+            print(f"[OK] {len(views)} vistas, triggers, rutinas y eventos volcados")
+
+            extension = "sql" if self.backup_cli.is_dedup_enabled() else "sql.gz"
+            tasks = []
+            for table in tables:
+                table['chunks'] = []
+                for index, where in enumerate(self.plan_chunks(coordinator, database, table)):
+                    tasks.append((table, where, os.path.join(output_dir, f"{table['name']}.{index:05d}.{extension}")))
+
+            print(f"[INFO] {len(tables)} tablas divididas en {len(tasks)} fragmentos, {self.workers} workers")
+
+            sessions = [self.open_session() for _ in range(min(self.workers, max(1, len(tasks))))]
+            binlog = self.start_snapshot(coordinator, sessions)
+            print("[OK] Instantánea consistente iniciada en todos los workers")
+
+            available = queue.Queue()
+            for session in sessions:
+                available.put(session)
+
+            def run_task(task):
+                session = available.get()
+                try:
+                    return task, self.dump_chunk(session, database, *task)
+                finally:
+                    available.put(session)
+
+            completed = 0
+            with ThreadPoolExecutor(max_workers=len(sessions)) as executor:
+                futures = [executor.submit(run_task, task) for task in tasks]
+                for future in as_completed(futures):
+                    (table, _, _), chunk = future.result()
+                    table['chunks'].append(chunk)
+                    completed += 1
+                    print(f"\r[INFO] Fragmentos volcados: {completed}/{len(tasks)}", end="")
+            print()
+
+            manifest = {
+                'format': 2,
+                'database': database,
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'binlog': binlog,
+                'tables': [{
+                    'name': table['name'],
+                    'create': table['create'],
+                    'deferred_keys': table['deferred_keys'],
+                    'foreign_keys': table['foreign_keys'],
+                    'chunks': sorted(table['chunks'], key=lambda chunk: chunk['file']),
+                } for table in tables],
+                'views': views,
+                'objects': objects,
+            }
+            manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+            with open(manifest_path, 'w', encoding='utf-8') as file:
+                json.dump(manifest, file, indent=2, ensure_ascii=False)
+
+            return manifest_path
+
+        finally:
+            for session in sessions:
+                session.close()
+            coordinator.close()
+
+
+class ParallelMySQLLoader:
+    def __init__(self, backup_cli, mysql_config, workers=4, read_size=256 * 1024):
+        self.backup_cli = backup_cli
+        self.client_command = backup_cli.build_mysql_client_command('mysql', mysql_config)
+        self.workers = max(1, int(workers))
+        self.read_size = read_size
+
+    def drain_output(self, channel, output, limit=64 * 1024):
+        # Se lee la salida mientras se envía el SQL: si la ventana del canal se llena, mysql deja de leer stdin
+        size = 0
+        for data in iter(lambda: channel.recv(self.read_size), b""):
+            output.append(data)
+            size += len(data)
+            while size > limit and len(output) > 1:
+                size -= len(output.pop(0))
+
+    def run_sql_stream(self, database, chunks):
+        channel = self.backup_cli.ssh_client.get_transport().open_session()
+        channel.set_combine_stderr(True)
+        channel.exec_command(f"{self.client_command} --default-character-set=utf8mb4 {shlex.quote(database)}")
+        output = []
+        reader = threading.Thread(target=self.drain_output, args=(channel, output), daemon=True)
+        reader.start()
+        try:
+            channel.sendall(b"SET SESSION FOREIGN_KEY_CHECKS=0;\nSET SESSION UNIQUE_CHECKS=0;\n")
+            for chunk in chunks:
+                channel.sendall(chunk)
+            channel.shutdown_write()
+        except OSError:
+            pass  # mysql terminó antes de leerlo todo: su código de salida y su salida dicen por qué
+
+        exit_status = channel.recv_exit_status()
+        reader.join()
+        channel.close()
+
+        if exit_status != 0:
+            error = b"".join(output).decode('utf-8', errors='replace')
+            error = "\n".join(line for line in error.splitlines() if line.strip() and '[Warning]' not in line)
+            raise Exception(error or f"código de salida {exit_status}")
+
+    def read_sql_file(self, path):
+        with self.backup_cli.open_local_reader(path) as raw_file:
+            sql_file = gzip.open(raw_file, 'rb') if path.endswith('.gz') else raw_file
+            with sql_file:
+                while True:
+                    data = sql_file.read(self.read_size)
+                    if not data:
+                        break
+                    yield data
+
+    def create_views(self, database, views):
+        # Una vista puede usar otra: las que fallan se reintentan mientras alguna se haya creado
+        session = MySQLSession(self.backup_cli.ssh_client, self.client_command)
+        try:
+            session.execute(f"USE {quote_identifier(database)}")
+            pending = views
+            while pending:
+                failed = []
+                for view in pending:
+                    try:
+                        session.execute(view['create'])
+                    except MySQLSessionError as e:
+                        failed.append((view, e))
+                if len(failed) == len(pending):
+                    raise failed[0][1]
+                pending = [view for view, _ in failed]
+        finally:
+            session.close()
+
+    def run_parallel(self, label, jobs):
+        completed = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(job) for job in jobs]
+            for future in as_completed(futures):
+                future.result()
+                completed += 1
+                print(f"\r[INFO] {label}: {completed}/{len(jobs)}", end="")
+        print()
+
+    def load(self, manifest_path, target_database=None):
+        with open(manifest_path, 'r', encoding='utf-8') as file:
+            manifest = json.load(file)
+
+        database = target_database or manifest['database']
+        base_dir = os.path.dirname(manifest_path)
+        tables = manifest['tables']
+
+        print(f"[INFO] Creando base de datos y {len(tables)} tablas en {database}...")
+        session = MySQLSession(self.backup_cli.ssh_client, self.client_command)
+        try:
+            session.execute(f"CREATE DATABASE IF NOT EXISTS {quote_identifier(database)}")
+            session.execute(f"USE {quote_identifier(database)}")
+            session.execute("SET SESSION FOREIGN_KEY_CHECKS=0")
+            for table in tables:
+                session.execute(table['create'])
+        finally:
+            session.close()
+
+        chunks = sorted(((table, chunk) for table in tables for chunk in table['chunks']),
+                        key=lambda item: item[1]['bytes'], reverse=True)
+        self.run_parallel("Fragmentos cargados", [
+            (lambda path=os.path.join(base_dir, chunk['file']): self.run_sql_stream(database, self.read_sql_file(path)))
+            for _, chunk in chunks
+        ])
+
+        def alter_job(table, definitions):
+            statement = (f"ALTER TABLE {quote_identifier(table['name'])} "
+                         + ", ".join(f"ADD {definition}" for definition in definitions) + ";\n")
+            return lambda: self.run_sql_stream(database, [statement.encode('utf-8')])
+
+        key_jobs = [alter_job(table, table['deferred_keys']) for table in tables if table['deferred_keys']]
+        if key_jobs:
+            self.run_parallel("Índices secundarios creados", key_jobs)
+
+        foreign_key_jobs = [alter_job(table, table['foreign_keys']) for table in tables if table['foreign_keys']]
+        if foreign_key_jobs:
+            self.run_parallel("Claves foráneas creadas", foreign_key_jobs)
+
+        # Vistas y triggers al final: los triggers no deben dispararse con la carga de datos
+        views = manifest.get('views', [])
+        if views:
+            print(f"[INFO] Creando {len(views)} vistas...")
+            self.create_views(database, views)
+        if manifest.get('objects'):
+            print("[INFO] Creando triggers, rutinas y eventos...")
+            self.run_sql_stream(database, self.read_sql_file(os.path.join(base_dir, manifest['objects'])))
+
+        return True
@@ -0,0 +1,531 @@
+import re
+import select
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+
+COM_QUIT = 0x01
+COM_INIT_DB = 0x02
+COM_QUERY = 0x03
+COM_CHANGE_USER = 0x11
+COM_STMT_PREPARE = 0x16
+COM_STMT_EXECUTE = 0x17
+COM_STMT_CLOSE = 0x19
+
+CLIENT_CONNECT_WITH_DB = 0x00000008
+CLIENT_COMPRESS = 0x00000020
+CLIENT_SSL = 0x00000800
+CLIENT_QUERY_ATTRIBUTES = 0x08000000
+CLIENT_DEPRECATE_EOF = 0x01000000
+
+SERVER_STATUS_IN_TRANS = 0x0001
+SERVER_STATUS_AUTOCOMMIT = 0x0002
+SERVER_MORE_RESULTS_EXISTS = 0x0008
+
+MAX_PACKET = 0xffffff
+
+DEFAULT_PATTERNS = (r'^SELECT\b', r'^SHOW\b', r'^(DESCRIBE|DESC|EXPLAIN)\b')
+# Resultados que cambian en cada ejecución o dependen de la sesión: nunca se guardan
+UNCACHEABLE = re.compile(
+    r'\b(NOW|SYSDATE|CURDATE|CURTIME|CURRENT_(DATE|TIME|TIMESTAMP|USER)|UTC_\w+|UNIX_TIMESTAMP|RAND|UUID\w*|'
+    r'LAST_INSERT_ID|FOUND_ROWS|ROW_COUNT|CONNECTION_ID|SLEEP|GET_LOCK|RELEASE_LOCK|USER|DATABASE|SCHEMA)\s*\(|'
+    r'\bFOR\s+UPDATE\b|\bLOCK\s+IN\s+SHARE\s+MODE\b|\bFOR\s+SHARE\b|\bSQL_NO_CACHE\b|\bINTO\b|@|'
+    r'^SHOW\s+(FULL\s+)?PROCESSLIST\b|^SHOW\s+(GLOBAL\s+|SESSION\s+)?STATUS\b|^SHOW\s+(ENGINE|MASTER|SLAVE|REPLICA|BINARY)\b',
+    re.IGNORECASE)
+WRITE_STATEMENT = re.compile(r'^(INSERT|UPDATE|DELETE|REPLACE|TRUNCATE|ALTER|DROP|CREATE|RENAME|LOAD|CALL|GRANT|REVOKE)\b',
+                             re.IGNORECASE)
+DDL_STATEMENT = re.compile(r'^(ALTER|DROP|CREATE|RENAME|TRUNCATE)\b', re.IGNORECASE)
+IDENTIFIER = r'(?:`[^`]+`|[\w$]+)(?:\s*\.\s*(?:`[^`]+`|[\w$]+))?'
+TABLE_KEYWORD = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO|TABLE|DESCRIBE|DESC|EXPLAIN)\s+', re.IGNORECASE)
+CLAUSE_END = re.compile(r'\b(?:WHERE|GROUP|HAVING|ORDER|LIMIT|UNION|WINDOW|ON|USING|SET|VALUES|VALUE|PARTITION|'
+                        r'PROCEDURE|FOR|LOCK|SELECT|TO)\b|[()]', re.IGNORECASE)
+JOIN_SEPARATOR = re.compile(r',|\b(?:(?:NATURAL|LEFT|RIGHT|INNER|CROSS|OUTER)\s+)*(?:STRAIGHT_)?JOIN\b', re.IGNORECASE)
+COMMENTS = re.compile(r'/\*(?!!).*?\*/|(?:--\s|#)[^\n]*', re.DOTALL)
+USE_STATEMENT = re.compile(r'^USE\s+(`[^`]+`|[\w$]+)\s*;?$', re.IGNORECASE)
+SET_NAMES = re.compile(r'^SET\s+(NAMES|CHARACTER\s+SET|CHARSET)\s', re.IGNORECASE)
+SET_STATEMENT = re.compile(r'^SET\b', re.IGNORECASE)
+
+
+def normalize_sql(sql):
+    return ' '.join(COMMENTS.sub(' ', sql).split()).rstrip(';').strip()
+
+
+def split_statements(sql):
+    """Separa sentencias por ';' fuera de comillas (suficiente para clasificar, no para ejecutar)."""
+    statements, current, quote = [], [], None
+    for char in sql:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in ("'", '"', '`'):
+            quote = char
+        elif char == ';':
+            statements.append(''.join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    statements.append(''.join(current).strip())
+    return [statement for statement in statements if statement]
+
+
+def referenced_tables(sql, schema):
+    """Tablas de la consulta como 'esquema.tabla' en minúsculas; las no cualificadas van al esquema actual.
+
+    Es un análisis aproximado: ante la duda sobra alguna tabla, lo que solo
+    provoca invalidaciones de más."""
+    tables = set()
+    for match in TABLE_KEYWORD.finditer(sql):
+        rest = sql[match.end():]
+        end = CLAUSE_END.search(rest)
+        for piece in JOIN_SEPARATOR.split(rest[:end.start()] if end else rest):
+            reference = re.match(rf'\s*({IDENTIFIER})', piece)
+            if not reference:
+                continue
+            parts = [part.strip().strip('`').lower() for part in reference.group(1).split('.')]
+            if len(parts) == 1:
+                parts.insert(0, (schema or '').lower())
+            if parts[-1] in ('dual', 'table', ''):
+                continue
+            tables.add('.'.join(parts[-2:]))
+    return tables
+
+
+def read_lenenc(data, offset):
+    first = data[offset]
+    if first < 0xfb:
+        return first, offset + 1
+    if first == 0xfc:
+        return struct.unpack_from('<H', data, offset + 1)[0], offset + 3
+    if first == 0xfd:
+        return struct.unpack_from('<I', data[offset + 1:offset + 4] + b"\0")[0], offset + 4
+    return struct.unpack_from('<Q', data, offset + 1)[0], offset + 9
+
+
+class QueryCache:
+    """Caché LRU de resultados de consultas de solo lectura, limitada en bytes y con caducidad.
+
+    Cada entrada guarda la respuesta del servidor tal cual (paquetes del
+    protocolo) y las tablas que la consulta lee; una escritura en cualquiera
+    de ellas hecha a través del proxy elimina la entrada."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=300, max_entry_bytes=1024 * 1024, patterns=DEFAULT_PATTERNS):
+        self.max_bytes = int(max_bytes)
+        self.ttl = float(ttl)
+        self.max_entry_bytes = int(max_entry_bytes)
+        self.patterns = [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+        self.entries = OrderedDict()
+        self.by_table = {}
+        self.size = 0
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'expired': 0, 'invalidations': 0,
+                         'bypassed': 0}
+
+    def is_cacheable(self, sql):
+        return any(pattern.search(sql) for pattern in self.patterns) and not UNCACHEABLE.search(sql)
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.counters['misses'] += 1
+                return None
+            if entry['expires'] < time.monotonic():
+                self._remove(key)
+                self.counters['expired'] += 1
+                self.counters['misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.counters['hits'] += 1
+            return entry['response']
+
+    def put(self, key, response, tables):
+        if len(response) > self.max_entry_bytes:
+            return False
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = {'response': response, 'tables': tables, 'expires': time.monotonic() + self.ttl}
+            self.size += len(response)
+            for table in tables:
+                self.by_table.setdefault(table, set()).add(key)
+            while self.size > self.max_bytes and self.entries:
+                self._remove(next(iter(self.entries)))
+                self.counters['evictions'] += 1
+            self.counters['stores'] += 1
+        return True
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.size -= len(entry['response'])
+        for table in entry['tables']:
+            keys = self.by_table.get(table)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self.by_table[table]
+
+    def invalidate(self, tables=None):
+        """Elimina las entradas que leen alguna de `tables` (todas si es None)."""
+        with self.lock:
+            if tables is None:
+                keys = list(self.entries)
+            else:
+                keys = {key for table in tables for key in self.by_table.get(table, ())}
+            for key in keys:
+                self._remove(key)
+            self.counters['invalidations'] += len(keys)
+            return len(keys)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counters['hits'] + self.counters['misses']
+            return dict(self.counters, entries=len(self.entries), bytes=self.size,
+                        hit_ratio=round(self.counters['hits'] / lookups, 3) if lookups else 0.0)
+
+
+class PacketStream:
+    """Lectura de paquetes MySQL (cabecera de 3+1 bytes) sobre un socket o canal SSH."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.buffer = bytearray()
+
+    def fill(self, size):
+        while len(self.buffer) < size:
+            data = self.connection.recv(max(65536, size - len(self.buffer)))
+            if not data:
+                raise EOFError("conexión cerrada")
+            self.buffer += data
+
+    def read_packet(self):
+        """(carga útil, bytes originales) de un paquete, juntando los fragmentos de 16 MB."""
+        raw = bytearray()
+        payload = bytearray()
+        while True:
+            self.fill(4)
+            length = int.from_bytes(self.buffer[:3], 'little')
+            self.fill(4 + length)
+            raw += self.buffer[:4 + length]
+            payload += self.buffer[4:4 + length]
+            del self.buffer[:4 + length]
+            if length < MAX_PACKET:
+                return bytes(payload), bytes(raw)
+
+    def take_buffer(self):
+        data = bytes(self.buffer)
+        self.buffer = bytearray()
+        return data
+
+
+class MySQLProxySession:
+    """Intermedia una conexión de cliente MySQL y sirve desde la caché las consultas repetidas.
+
+    El saludo y la autenticación pasan sin cambios. Después, cada COM_QUERY
+    se clasifica: las lecturas permitidas se buscan en la caché y, si no
+    están, su respuesta completa se guarda; las escrituras invalidan las
+    tablas que tocan. El resto de comandos (sentencias preparadas, ping,
+    etc.) se reenvían tal cual. Con TLS o compresión no se puede leer el
+    protocolo y la conexión se reenvía en bruto.
+
+    La clave de la caché incluye el usuario, el juego de caracteres y el
+    formato de fin de resultado (CLIENT_DEPRECATE_EOF) de la sesión; tras un
+    SET distinto de SET NAMES la sesión deja de usar la caché. Las escrituras
+    hechas dentro de una transacción se invalidan otra vez al terminarla: entre
+    tanto otra conexión pudo guardar en la caché los datos anteriores."""
+
+    def __init__(self, client, server, cache, on_bytes=None):
+        self.client = PacketStream(client)
+        self.server = PacketStream(server)
+        self.client_socket = client
+        self.server_channel = server
+        self.cache = cache
+        self.on_bytes = on_bytes or (lambda sent, received: None)
+        self.capabilities = 0
+        self.user = None
+        self.charset = None
+        self.session_modified = False
+        self.in_transaction = False
+        self.transaction_writes = []
+        self.schema = None
+        self.prepared = {}
+        self.transparent = False
+
+    def send_client(self, data):
+        self.client_socket.sendall(data)
+        self.on_bytes(0, len(data))
+
+    def send_server(self, data):
+        self.server_channel.sendall(data)
+        self.on_bytes(len(data), 0)
+
+    def run(self):
+        try:
+            if self.handshake():
+                self.command_loop()
+            self.pump_raw()
+        except (EOFError, OSError):
+            pass
+
+    def handshake(self):
+        greeting, raw = self.server.read_packet()
+        self.send_client(raw)
+        if greeting[:1] != b"\x0a":
+            return False
+        position = greeting.index(b"\0", 1) + 1 + 4 + 8 + 1
+        server_capabilities = struct.unpack_from('<H', greeting, position)[0]
+        if len(greeting) >= position + 7:
+            server_capabilities |= struct.unpack_from('<H', greeting, position + 5)[0] << 16
+
+        response, raw = self.client.read_packet()
+        self.send_server(raw)
+        client_capabilities = struct.unpack_from('<I', response, 0)[0] if len(response) >= 4 else 0
+        self.capabilities = client_capabilities & server_capabilities
+        if self.capabilities & (CLIENT_SSL | CLIENT_COMPRESS):
+            return False
+        if len(response) > 32:
+            self.charset = response[8]
+            self.user = response[32:response.find(b"\0", 32)].decode('utf-8', errors='replace')
+        if self.capabilities & CLIENT_CONNECT_WITH_DB:
+            self.schema = self.read_handshake_schema(response)
+
+        while True:
+            packet, raw = self.server.read_packet()
+            self.send_client(raw)
+            if packet[:1] in (b"\x00", b"\xff"):
+                return packet[:1] == b"\x00"
+            # Autenticación rápida de caching_sha2_password: el OK llega sin respuesta del cliente
+            if packet == b"\x01\x03":
+                continue
+            packet, raw = self.client.read_packet()
+            self.send_server(raw)
+
+    def read_handshake_schema(self, response):
+        try:
+            position = 4 + 4 + 1 + 23
+            position = response.index(b"\0", position) + 1
+            if self.capabilities & 0x00200000:
+                length, position = read_lenenc(response, position)
+            else:
+                length, position = response[position], position + 1
+            position += length
+            end = response.index(b"\0", position)
+            return response[position:end].decode('utf-8', errors='replace') or None
+        except (ValueError, IndexError):
+            return None
+
+    def command_loop(self):
+        while True:
+            pending = self.server.take_buffer()
+            if pending:
+                self.send_client(pending)
+            readable, _, _ = select.select([self.client_socket, self.server_channel], [], [])
+            if self.server_channel in readable:
+                data = self.server_channel.recv(65536)
+                if not data:
+                    return
+                self.send_client(data)
+                continue
+
+            packet, raw = self.client.read_packet()
+            command = packet[:1][0] if packet else None
+            if command == COM_QUERY:
+                self.handle_query(packet, raw)
+                continue
+
+            self.send_server(raw)
+            if command == COM_QUIT:
+                return
+            if command == COM_INIT_DB:
+                self.schema = packet[1:].decode('utf-8', errors='replace')
+            elif command == COM_CHANGE_USER:
+                # Nueva autenticación a mitad de conexión: a partir de aquí se reenvía en bruto
+                self.transparent = True
+                return
+            elif command == COM_STMT_PREPARE:
+                self.handle_prepare(packet[1:].decode('utf-8', errors='replace'))
+            elif command == COM_STMT_EXECUTE and len(packet) >= 5:
+                sql = self.prepared.get(struct.unpack_from('<I', packet, 1)[0])
+                if sql:
+                    # La respuesta se reenvía sin leerla: vale el último estado conocido de la transacción
+                    invalidations = self.classify_write(sql)
+                    if self.in_transaction:
+                        self.transaction_writes.extend(invalidations)
+            elif command == COM_STMT_CLOSE and len(packet) >= 5:
+                self.prepared.pop(struct.unpack_from('<I', packet, 1)[0], None)
+
+    def handle_prepare(self, sql):
+        # Solo hace falta el identificador del primer paquete; el resto se reenvía en el bucle
+        packet, raw = self.server.read_packet()
+        self.send_client(raw)
+        if SET_STATEMENT.match(normalize_sql(sql)):
+            self.session_modified = True
+        if packet[:1] == b"\x00" and len(packet) >= 5 and WRITE_STATEMENT.match(normalize_sql(sql)):
+            self.prepared[struct.unpack_from('<I', packet, 1)[0]] = sql
+
+    def query_text(self, packet):
+        position = 1
+        if self.capabilities & CLIENT_QUERY_ATTRIBUTES:
+            parameters, position = read_lenenc(packet, position)
+            _, position = read_lenenc(packet, position)
+            if parameters:
+                return None
+        return packet[position:].decode('utf-8', errors='replace')
+
+    def classify_write(self, sql):
+        """Invalida la caché según las escrituras de `sql`; devuelve las tablas invalidadas por sentencia (None es toda la caché)."""
+        invalidations = []
+        for statement in split_statements(normalize_sql(sql)):
+            if not WRITE_STATEMENT.match(statement):
+                continue
+            tables = referenced_tables(statement, self.schema)
+            if not tables or re.match(r'^(CALL|GRANT|REVOKE|RENAME)\b', statement, re.IGNORECASE):
+                tables = None
+            elif DDL_STATEMENT.match(statement):
+                # Los cambios de estructura afectan también a SHOW/DESCRIBE del esquema
+                tables |= {f"{table.split('.')[0]}.*" for table in tables}
+            self.cache.invalidate(tables)
+            invalidations.append(tables)
+        return invalidations
+
+    def track_transaction(self, status, invalidations):
+        """Acumula las escrituras de la transacción abierta y las invalida de nuevo cuando termina."""
+        if status is None:
+            # Error: el estado no cambia
+            if self.in_transaction:
+                self.transaction_writes.extend(invalidations)
+            return
+        if status & SERVER_STATUS_IN_TRANS:
+            self.in_transaction = True
+            self.transaction_writes.extend(invalidations)
+            return
+        self.in_transaction = False
+        for tables in self.transaction_writes:
+            self.cache.invalidate(tables)
+        self.transaction_writes = []
+
+    def handle_query(self, packet, raw):
+        sql = self.query_text(packet)
+        statement = normalize_sql(sql) if sql is not None else ''
+        use = USE_STATEMENT.match(statement)
+        if use:
+            self.schema = use.group(1).strip('`')
+        for part in split_statements(statement):
+            if SET_NAMES.match(part):
+                self.charset = ' '.join(part.split()[1:]).lower()
+            elif SET_STATEMENT.match(part):
+                # Variables de sesión (sql_mode, time_zone...) pueden cambiar los resultados
+                self.session_modified = True
+
+        key = None
+        invalidations = self.classify_write(sql) if sql is not None else []
+        if sql is not None and not invalidations and len(split_statements(statement)) == 1 \
+                and not self.session_modified and self.cache.is_cacheable(statement):
+            key = (self.user, self.charset, bool(self.capabilities & CLIENT_DEPRECATE_EOF), self.schema, statement)
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.send_client(cached)
+                return
+        elif sql is not None:
+            self.cache.count('bypassed')
+
+        self.send_server(raw)
+        response, status, complete = self.relay_query_response()
+        self.track_transaction(status, invalidations)
+        if key is None or not complete:
+            return
+        # Dentro de una transacción el resultado puede incluir cambios sin confirmar
+        if status & SERVER_STATUS_IN_TRANS or not status & SERVER_STATUS_AUTOCOMMIT:
+            self.cache.count('bypassed')
+            return
+        tables = referenced_tables(statement, self.schema)
+        if re.match(r'^(SHOW|DESCRIBE|DESC|EXPLAIN)\b', statement, re.IGNORECASE) or 'information_schema' in statement.lower():
+            tables.add(f"{(self.schema or '').lower()}.*")
+        self.cache.put(key, response, tables)
+
+    def relay_query_response(self):
+        """Reenvía la respuesta completa de un COM_QUERY.
+
+        Devuelve (bytes, estado del servidor o None si no se conoce, True si la respuesta se puede guardar)."""
+        response = bytearray()
+        outgoing = bytearray()
+        cacheable = True
+        deprecate_eof = bool(self.capabilities & CLIENT_DEPRECATE_EOF)
+
+        def forward():
+            nonlocal cacheable
+            packet, raw = self.server.read_packet()
+            # Las filas se envían al cliente por lotes, no paquete a paquete
+            outgoing.extend(raw)
+            if len(outgoing) >= 256 * 1024:
+                self.send_client(bytes(outgoing))
+                outgoing.clear()
+            if cacheable:
+                response.extend(raw)
+                if len(response) > self.cache.max_entry_bytes:
+                    cacheable = False
+                    response.clear()
+            return packet
+
+        try:
+            while True:
+                first = forward()
+                if first[:1] in (b"\xff", b"\xfb"):
+                    # Error o LOAD DATA LOCAL: no se guarda (y en el segundo caso el cliente sigue hablando)
+                    return bytes(response), None, False
+                if first[:1] == b"\x00":
+                    status = self.ok_status(first)
+                    if status & SERVER_MORE_RESULTS_EXISTS:
+                        cacheable = False
+                        continue
+                    return bytes(response), status, False
+
+                columns, _ = read_lenenc(first, 0)
+                for _ in range(columns + (0 if deprecate_eof else 1)):
+                    forward()
+
+                while True:
+                    packet = forward()
+                    if packet[:1] == b"\xfe" and len(packet) < (MAX_PACKET if deprecate_eof else 9):
+                        status = self.ok_status(packet) if deprecate_eof else struct.unpack_from('<H', packet, 3)[0]
+                        break
+                    if packet[:1] == b"\xff":
+                        return bytes(response), None, False
+
+                if status & SERVER_MORE_RESULTS_EXISTS:
+                    cacheable = False
+                    continue
+                return bytes(response), status, cacheable
+        finally:
+            if outgoing:
+                self.send_client(bytes(outgoing))
+
+    def ok_status(self, packet):
+        _, position = read_lenenc(packet, 1)
+        _, position = read_lenenc(packet, position)
+        return struct.unpack_from('<H', packet, position)[0]
+
+    def pump_raw(self):
+        pending = self.client.take_buffer()
+        if pending:
+            self.send_server(pending)
+        pending = self.server.take_buffer()
+        if pending:
+            self.send_client(pending)
+        while True:
+            readable, _, _ = select.select([self.client_socket, self.server_channel], [], [])
+            if self.client_socket in readable:
+                data = self.client_socket.recv(65536)
+                if not data:
+                    return
+                self.send_server(data)
+            if self.server_channel in readable:
+                data = self.server_channel.recv(65536)
+                if not data:
+                    return
+                self.send_client(data)
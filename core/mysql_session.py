@@ -0,0 +1,144 @@
+import re
+import uuid
+from collections import deque
+
+
+BATCH_ESCAPES = {b'n': b'\n', b't': b'\t', b'0': b'\0', b'\\': b'\\'}
+BATCH_ESCAPE_PATTERN = re.compile(rb'\\(.)', re.S)
+CLIENT_NOTICE_PATTERN = re.compile(rb'^mysql: \[(Warning|Note)\] ')
+
+
+def unescape_batch_field(value):
+    if b'\\' not in value:
+        return value
+    return BATCH_ESCAPE_PATTERN.sub(lambda match: BATCH_ESCAPES.get(match.group(1), match.group(1)), value)
+
+
+def quote_identifier(name):
+    return "`" + str(name).replace("`", "``") + "`"
+
+
+def quote_literal(value):
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+class MySQLSessionError(Exception):
+    pass
+
+
+class LineReader:
+    """Líneas de uno de los flujos (stdout o stderr) de un canal SSH.
+
+    Cada bloque recibido se parte en líneas una sola vez; el final incompleto
+    espera al siguiente bloque."""
+
+    def __init__(self, recv, read_size):
+        self.recv = recv
+        self.read_size = read_size
+        self.lines = deque()
+        self.partial = []
+
+    def read_line(self):
+        """Siguiente línea, o None si el flujo terminó."""
+        while not self.lines:
+            data = self.recv(self.read_size)
+            if not data:
+                return None
+            if b"\n" not in data:
+                self.partial.append(data)
+                continue
+            lines = data.split(b"\n")
+            if self.partial:
+                lines[0] = b"".join(self.partial) + lines[0]
+            self.partial = [lines.pop()]
+            self.lines.extend(lines)
+        return self.lines.popleft()
+
+    def rest(self):
+        """Lo que queda en el flujo hasta su cierre."""
+        lines = list(self.lines)
+        self.lines.clear()
+        while True:
+            line = self.read_line()
+            if line is None:
+                break
+            lines.append(line)
+        lines.append(b"".join(self.partial))
+        self.partial = []
+        return [line for line in lines if line]
+
+
+class MySQLSession:
+    """Sesión persistente del cliente mysql sobre un canal SSH.
+
+    Cada sentencia se envía por stdin seguida de un SELECT marcador, de modo que
+    la salida se puede leer sin cerrar la sesión (necesario para mantener
+    transacciones y bloqueos abiertos entre consultas). stdout solo lleva filas;
+    los errores se leen de stderr hasta un segundo marcador, un USE de una base
+    de datos inexistente con el mismo nombre, cuyo error delimita los de la sentencia."""
+
+    def __init__(self, ssh_client, client_command, database=None, read_size=256 * 1024):
+        self.channel = ssh_client.get_transport().open_session()
+        self.stdout = LineReader(self.channel.recv, read_size)
+        self.stderr = LineReader(self.channel.recv_stderr, read_size)
+
+        command = f"{client_command} --batch --skip-column-names --unbuffered --force --default-character-set=utf8mb4"
+        if database:
+            command += f" {database}"
+        self.channel.exec_command(command)
+
+    def send(self, sql):
+        marker = f"__db_generator_{uuid.uuid4().hex}__"
+        statement = sql.strip().rstrip(';')
+        try:
+            self.channel.sendall(f"{statement};\nSELECT '{marker}';\nUSE `{marker}`;\n".encode('utf-8'))
+        except OSError:
+            # El cliente ya terminó (p. ej. no pudo conectar): su stderr explica por qué
+            raise self.closed_error(self.stderr.rest())
+        return marker.encode('ascii')
+
+    def closed_error(self, errors):
+        message = b"\n".join(errors).decode('utf-8', errors='replace')
+        return MySQLSessionError("La sesión MySQL se cerró inesperadamente" + (f"\n{message}" if message else ""))
+
+    def read_errors(self, marker):
+        errors = []
+        while True:
+            line = self.stderr.read_line()
+            if line is None:
+                raise self.closed_error(errors + self.stderr.rest())
+            if marker in line:
+                return errors
+            if not CLIENT_NOTICE_PATTERN.match(line):
+                errors.append(line)
+
+    def iter_rows(self, marker):
+        while True:
+            line = self.stdout.read_line()
+            if line is None:
+                raise self.closed_error(self.stderr.rest())
+            if line == marker:
+                break
+            yield line
+
+        errors = self.read_errors(marker)
+        if errors:
+            raise MySQLSessionError(b"\n".join(errors).decode('utf-8', errors='replace'))
+
+    def stream(self, sql):
+        return self.iter_rows(self.send(sql))
+
+    def query(self, sql):
+        return [[unescape_batch_field(field).decode('utf-8', errors='replace') for field in line.split(b"\t")]
+                for line in self.stream(sql)]
+
+    def execute(self, sql):
+        for _ in self.stream(sql):
+            pass
+
+    def close(self):
+        try:
+            self.channel.shutdown_write()
+            self.channel.close()
+        except Exception:
+            pass
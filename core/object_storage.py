@@ -0,0 +1,213 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+UPLOAD_STATE_SUFFIX = ".upload.json"
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+
+def create_s3_client(offsite_config, workers):
+    try:
+        import boto3
+        from botocore.config import Config
+    except ImportError:
+        raise Exception("La subida a almacenamiento externo requiere el paquete 'boto3' (pip install boto3)")
+
+    return boto3.client(
+        's3',
+        endpoint_url=offsite_config.get('endpoint_url') or None,
+        region_name=offsite_config.get('region') or None,
+        aws_access_key_id=offsite_config.get('access_key') or None,
+        aws_secret_access_key=offsite_config.get('secret_key') or None,
+        # Una conexión HTTP por parte en vuelo; los reintentos de botocore cubren errores transitorios
+        config=Config(max_pool_connections=workers + 2, retries={'max_attempts': 5, 'mode': 'standard'},
+                      s3={'addressing_style': offsite_config.get('addressing_style', 'auto')}),
+    )
+
+
+class ObjectStorageUploader:
+    """Sube archivos a almacenamiento compatible con S3 (AWS, MinIO, ...) con multipart en paralelo.
+
+    Cada parte se lee del disco con su propio desplazamiento y se envía con
+    Content-MD5: el servidor rechaza las que lleguen alteradas. Las partes
+    completadas se guardan en <archivo>.upload.json; si la subida se interrumpe,
+    la siguiente llamada reutiliza la subida multipart abierta y solo envía las
+    partes pendientes. Al terminar se verifica el tamaño del objeto. Un ETag
+    distinto del MD5 solo se avisa: con cifrado en el servidor (SSE-KMS, SSE-C)
+    y en algunos servicios compatibles el ETag no es el MD5 del contenido."""
+
+    def __init__(self, offsite_config, progress=None, client=None):
+        self.bucket = offsite_config['bucket']
+        self.prefix = (offsite_config.get('prefix') or '').strip('/')
+        self.workers = max(1, int(offsite_config.get('workers', 4)))
+        self.part_size = max(MIN_PART_SIZE, int(float(offsite_config.get('part_size_mb', 16)) * 1024 * 1024))
+        self.storage_class = offsite_config.get('storage_class')
+        self.progress = progress
+        self.client = client or create_s3_client(offsite_config, self.workers)
+        self.state_lock = threading.Lock()
+        self.etag_warnings = set()
+
+    def object_key(self, path):
+        name = os.path.basename(path)
+        return f"{self.prefix}/{name}" if self.prefix else name
+
+    def extra_arguments(self):
+        return {'StorageClass': self.storage_class} if self.storage_class else {}
+
+    def part_size_for(self, size):
+        # S3 admite como mucho 10000 partes: los archivos muy grandes usan partes mayores
+        part_size = self.part_size
+        while -(-size // part_size) > MAX_PARTS:
+            part_size *= 2
+        return part_size
+
+    def read_part(self, path, offset, length):
+        with open(path, 'rb') as file:
+            file.seek(offset)
+            return file.read(length)
+
+    def upload_file(self, path, key=None):
+        """Sube `path` y devuelve {'key', 'size', 'etag', 'parts', 'resumed'}."""
+        key = key or self.object_key(path)
+        size = os.path.getsize(path)
+        part_size = self.part_size_for(size)
+        stream = self.progress.stream(os.path.basename(path), size) if self.progress else None
+        try:
+            if size <= part_size:
+                return self.put_single(path, key, size, stream)
+            return self.put_multipart(path, key, size, part_size, stream)
+        finally:
+            if stream:
+                stream.close()
+
+    def check_etag(self, key, etag, expected):
+        if etag == expected:
+            return
+        with self.state_lock:
+            if key in self.etag_warnings:
+                return
+            self.etag_warnings.add(key)
+        print(f"[WARNING] El ETag de {key} no es el MD5 esperado ({etag} != {expected}); es normal con cifrado "
+              f"en el servidor, la integridad de cada parte ya la comprobó el servidor con Content-MD5")
+
+    def put_single(self, path, key, size, stream):
+        data = self.read_part(path, 0, size)
+        digest = hashlib.md5(data).digest()
+        response = self.client.put_object(Bucket=self.bucket, Key=key, Body=data,
+                                          ContentMD5=base64.b64encode(digest).decode('ascii'), **self.extra_arguments())
+        etag = response['ETag'].strip('"')
+        self.check_etag(key, etag, digest.hex())
+        if stream:
+            stream.add(size)
+        return {'key': key, 'size': size, 'etag': etag, 'parts': 1, 'resumed': False}
+
+    def load_state(self, state_path, expected):
+        try:
+            with open(state_path, 'r', encoding='utf-8') as file:
+                state = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if any(state.get(name) != value for name, value in expected.items()):
+            return None
+        return state
+
+    def save_state(self, state_path, state):
+        temp_path = state_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(state, file)
+        os.replace(temp_path, state_path)
+
+    def listed_parts(self, key, upload_id):
+        """Partes que el servidor tiene realmente de una subida abierta (None si ya no existe)."""
+        parts = {}
+        marker = 0
+        while True:
+            try:
+                response = self.client.list_parts(Bucket=self.bucket, Key=key, UploadId=upload_id,
+                                                  PartNumberMarker=marker)
+            except Exception:
+                return None
+            for part in response.get('Parts', []):
+                parts[part['PartNumber']] = part['ETag'].strip('"')
+            if not response.get('IsTruncated'):
+                return parts
+            marker = response['NextPartNumberMarker']
+
+    def resume_state(self, state_path, key, size, part_size, mtime):
+        expected = {'bucket': self.bucket, 'key': key, 'size': size, 'part_size': part_size, 'mtime': mtime}
+        state = self.load_state(state_path, expected)
+        if state:
+            remote_parts = self.listed_parts(key, state['upload_id'])
+            if remote_parts is not None:
+                # Solo cuentan las partes anotadas localmente que el servidor confirma con el mismo ETag
+                state['parts'] = {number: part for number, part in state['parts'].items()
+                                  if remote_parts.get(int(number)) == part['etag']}
+                return state, True
+            print(f"[INFO] La subida anterior de {key} ya no existe: se empieza de nuevo")
+
+        response = self.client.create_multipart_upload(Bucket=self.bucket, Key=key, **self.extra_arguments())
+        state = dict(expected, upload_id=response['UploadId'], parts={})
+        self.save_state(state_path, state)
+        return state, False
+
+    def upload_part(self, path, key, state, state_path, number, offset, length, stream):
+        data = self.read_part(path, offset, length)
+        digest = hashlib.md5(data).digest()
+        response = self.client.upload_part(Bucket=self.bucket, Key=key, UploadId=state['upload_id'],
+                                           PartNumber=number, Body=data,
+                                           ContentMD5=base64.b64encode(digest).decode('ascii'))
+        etag = response['ETag'].strip('"')
+        self.check_etag(key, etag, digest.hex())
+        with self.state_lock:
+            state['parts'][str(number)] = {'etag': etag, 'md5': digest.hex(), 'size': length}
+            self.save_state(state_path, state)
+        if stream:
+            stream.add(length)
+        return number
+
+    def put_multipart(self, path, key, size, part_size, stream):
+        state_path = path + UPLOAD_STATE_SUFFIX
+        state, resumed = self.resume_state(state_path, key, size, part_size, int(os.path.getmtime(path)))
+
+        ranges = [(index + 1, offset, min(part_size, size - offset))
+                  for index, offset in enumerate(range(0, size, part_size))]
+        pending = [part for part in ranges if str(part[0]) not in state['parts']]
+        if stream:
+            stream.add(sum(length for number, _, length in ranges if str(number) in state['parts']))
+        if resumed:
+            print(f"[INFO] Reanudando subida de {key}: {len(ranges) - len(pending)} de {len(ranges)} partes ya enviadas")
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self.upload_part, path, key, state, state_path, number, offset, length, stream)
+                       for number, offset, length in pending]
+            errors = []
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    errors.append(e)
+        if errors:
+            # La subida queda abierta: la siguiente ejecución enviará solo lo que falte
+            raise Exception(f"{len(errors)} partes de {key} fallaron ({errors[0]})")
+
+        parts = [{'PartNumber': number, 'ETag': state['parts'][str(number)]['etag']} for number, _, _ in ranges]
+        response = self.client.complete_multipart_upload(Bucket=self.bucket, Key=key, UploadId=state['upload_id'],
+                                                         MultipartUpload={'Parts': parts})
+
+        # ETag de una subida multipart: MD5 de los MD5 de las partes y el número de partes
+        part_md5s = [state['parts'][str(number)].get('md5', state['parts'][str(number)]['etag'])
+                     for number, _, _ in ranges]
+        expected_etag = f"{hashlib.md5(b''.join(bytes.fromhex(md5) for md5 in part_md5s)).hexdigest()}-{len(parts)}"
+        etag = response['ETag'].strip('"')
+        self.check_etag(key, etag, expected_etag)
+        remote_size = self.client.head_object(Bucket=self.bucket, Key=key)['ContentLength']
+        if remote_size != size:
+            raise Exception(f"Tamaño del objeto {key} no coincide ({remote_size} != {size})")
+
+        os.remove(state_path)
+        return {'key': key, 'size': size, 'etag': etag, 'parts': len(parts), 'resumed': resumed}
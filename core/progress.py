@@ -0,0 +1,170 @@
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+
+REPORT_SUFFIX = ".report.json"
+STAGES = ('compress', 'transfer', 'package', 'upload', 'cleanup')
+
+
+class ProgressStream:
+    """Contador de bytes de una transferencia; varios hilos pueden sumar en el mismo flujo."""
+
+    def __init__(self, bus, label, total=None):
+        self.bus = bus
+        self.label = label
+        self.total = total
+        self.done = 0
+        self.sample = (time.monotonic(), 0)
+        self.rate = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, amount):
+        with self.lock:
+            self.done += amount
+
+    def set(self, done, total=None):
+        with self.lock:
+            self.done = done
+            if total is not None:
+                self.total = total
+
+    def close(self):
+        self.bus.close_stream(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+
+class ProgressBus:
+    """Progreso de todas las transferencias activas y tiempos de cada etapa del backup.
+
+    Las transferencias solo suman bytes a su `ProgressStream`; un hilo pinta el
+    caudal total, el de cada flujo y el tiempo restante cada `refresh` segundos,
+    por muchos flujos que haya en paralelo. Las etapas (compress, transfer,
+    package, upload, cleanup) se acumulan para el informe JSON de la ejecución."""
+
+    def __init__(self, format_size, refresh=0.5, output=None):
+        self.format_size = format_size
+        self.refresh = max(0.05, float(refresh))
+        self.output = output or sys.stdout
+        self.streams = []
+        self.stages = []
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.last_width = 0
+
+    def stream(self, label, total=None):
+        stream = ProgressStream(self, label, total)
+        with self.lock:
+            self.streams.append(stream)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._render_loop, daemon=True)
+                self.thread.start()
+        return stream
+
+    def close_stream(self, stream):
+        with self.lock:
+            if stream not in self.streams:
+                return
+            self._update_rates()
+            self.render()
+            self.streams.remove(stream)
+            if not self.streams:
+                # Deja la última línea pintada y pasa a la siguiente
+                self.output.write("\n")
+                self.output.flush()
+                self.last_width = 0
+
+    def _render_loop(self):
+        while not self.wakeup.wait(self.refresh):
+            with self.lock:
+                if self.streams:
+                    self._update_rates()
+                    self.render()
+
+    def _update_rates(self):
+        now = time.monotonic()
+        for stream in self.streams:
+            sample_time, sample_done = stream.sample
+            if now - sample_time <= 0:
+                continue
+            current = (stream.done - sample_done) / (now - sample_time)
+            # Media exponencial para que el caudal y el ETA no salten en cada refresco
+            stream.rate = current if not stream.rate else 0.3 * current + 0.7 * stream.rate
+            stream.sample = (now, stream.done)
+
+    def render(self):
+        if not self.streams:
+            return
+
+        done = sum(stream.done for stream in self.streams)
+        rate = sum(stream.rate for stream in self.streams)
+        totals = [stream.total for stream in self.streams]
+
+        if all(total is not None for total in totals):
+            total = sum(totals)
+            percent = done / total * 100 if total else 100.0
+            line = f"[INFO] Progreso: {percent:.1f}% ({self.format_size(done)}/{self.format_size(total)})"
+            if rate > 0:
+                line += f" {self.format_size(rate)}/s ETA {timedelta(seconds=int((total - done) / rate))}"
+        else:
+            line = f"[INFO] Transferido: {self.format_size(done)} {self.format_size(rate)}/s"
+
+        if len(self.streams) > 1:
+            line += " | " + ", ".join(f"{stream.label} {self.format_size(stream.rate)}/s" for stream in self.streams)
+
+        width = max(20, shutil.get_terminal_size((120, 20)).columns - 1)
+        line = line[:width]
+        self.output.write("\r" + line.ljust(self.last_width))
+        self.output.flush()
+        self.last_width = len(line)
+
+    @contextmanager
+    def stage(self, name, component=None):
+        """Mide una etapa; quien la usa puede fijar `bytes` y `ok` en el registro devuelto."""
+        record = {'stage': name, 'component': component, 'started': datetime.now().isoformat(timespec='seconds'),
+                  'seconds': 0.0, 'bytes': 0, 'ok': True}
+        start = time.monotonic()
+        try:
+            yield record
+        except BaseException:
+            record['ok'] = False
+            raise
+        finally:
+            record['seconds'] = round(time.monotonic() - start, 3)
+            with self.lock:
+                self.stages.append(record)
+
+    def reset(self):
+        with self.lock:
+            self.stages = []
+
+    def stage_totals(self):
+        totals = {name: {'seconds': 0.0, 'bytes': 0, 'count': 0, 'errors': 0} for name in STAGES}
+        for record in self.stages:
+            total = totals.setdefault(record['stage'], {'seconds': 0.0, 'bytes': 0, 'count': 0, 'errors': 0})
+            total['seconds'] = round(total['seconds'] + record['seconds'], 3)
+            total['bytes'] += record['bytes']
+            total['count'] += 1
+            total['errors'] += 0 if record['ok'] else 1
+        return totals
+
+    def report(self, **run_info):
+        return dict(run_info, stages=self.stage_totals(), steps=list(self.stages))
+
+    def write_report(self, path, **run_info):
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.report(**run_info), file, indent=2, ensure_ascii=False)
+        os.replace(temp_path, path)
+        return path
@@ -0,0 +1,207 @@
+import hashlib
+import io
+import json
+import posixpath
+import shlex
+
+from core import seekable_archive
+
+
+def _module_source(module):
+    # Lectura directa del archivo: inspect.getsource cuesta más que el resto del módulo al importarlo
+    with open(module.__file__, 'r', encoding='utf-8') as file:
+        return file.read()
+
+
+# El agente incluye el módulo de formato de acceso directo (solo biblioteca estándar)
+AGENT_SOURCE = _module_source(seekable_archive) + r'''
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+
+def run_shell(command):
+    return subprocess.run(['bash', '-o', 'pipefail', '-c', command], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def service_state(service):
+    return run_shell('systemctl is-active ' + service).stdout.decode().strip()
+
+
+def op_run(step):
+    process = run_shell(step['command'])
+    return {
+        'ok': process.returncode in step.get('ok_codes', [0]),
+        'code': process.returncode,
+        'stdout': process.stdout.decode('utf-8', 'replace'),
+        'stderr': process.stderr.decode('utf-8', 'replace')[-4000:],
+    }
+
+
+def op_stop_service(step):
+    run_shell('sudo systemctl stop ' + step['service'])
+    state = service_state(step['service'])
+    return {'ok': state in ('inactive', 'failed'), 'state': state}
+
+
+def op_start_service(step):
+    run_shell('sudo systemctl start ' + step['service'])
+    state = service_state(step['service'])
+    return {'ok': state == 'active', 'state': state}
+
+
+class HashingFile:
+    def __init__(self, file):
+        self.file = file
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.file.write(data)
+        self.digest.update(data)
+        self.size += len(data)
+
+
+def op_archive(step):
+    process = subprocess.Popen(['bash', '-o', 'pipefail', '-c', step['command']],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    errors = []
+    reader = threading.Thread(target=lambda: errors.append(process.stderr.read()))
+    reader.start()
+
+    with open(step['path'], 'wb') as file:
+        output = HashingFile(file)
+        seekable = step.get('seekable')
+        if seekable:
+            # El tar sin comprimir se convierte al vuelo en el formato con índice por archivo
+            writer = SeekableArchiveWriter(output, seekable.get('codec', 'zlib'), seekable.get('level', 6),
+                                           seekable.get('frame_size', 4 * 1024 * 1024))
+            writer.start()
+            writer.add_tar_stream(process.stdout)
+            writer.finish()
+            # Relleno final del tar que tarfile no consume
+            while process.stdout.read(1024 * 1024):
+                pass
+        else:
+            while True:
+                data = process.stdout.read(1024 * 1024)
+                if not data:
+                    break
+                output.write(data)
+
+    code = process.wait()
+    reader.join()
+    result = {
+        'ok': code in step.get('ok_codes', [0]),
+        'code': code,
+        'size': output.size,
+        'sha256': output.digest.hexdigest(),
+        'stderr': b''.join(errors).decode('utf-8', 'replace')[-4000:],
+    }
+
+    listing = step.get('listing')
+    if listing and os.path.exists(listing):
+        with open(listing, 'r', encoding='utf-8', errors='surrogateescape') as file:
+            result['listing'] = [line.rstrip('\n') for line in file if line.strip()]
+        os.remove(listing)
+    return result
+
+
+OPERATIONS = {
+    'run': op_run,
+    'stop_service': op_stop_service,
+    'start_service': op_start_service,
+    'archive': op_archive,
+}
+
+
+def main():
+    job = json.load(sys.stdin)
+    results = []
+    failed = False
+    for step in job['steps']:
+        if failed and not step.get('always'):
+            results.append({'op': step['op'], 'ok': False, 'skipped': True})
+            continue
+        start = time.time()
+        try:
+            result = OPERATIONS[step['op']](step)
+        except Exception as error:
+            result = {'ok': False, 'error': str(error)}
+        result['op'] = step['op']
+        result['seconds'] = round(time.time() - start, 3)
+        failed = failed or not result['ok']
+        results.append(result)
+    json.dump({'steps': results}, sys.stdout, ensure_ascii=True)
+
+
+main()
+'''
+
+AGENT_VERSION = hashlib.sha256(AGENT_SOURCE.encode('utf-8')).hexdigest()[:16]
+AGENT_DIR = ".cache/backup-maker"
+AGENT_MISSING = 90
+PYTHON_MISSING = 91
+
+
+class RemoteAgentUnavailable(Exception):
+    pass
+
+
+class RemoteAgent:
+    """Ejecuta trabajos completos (parar, archivar, medir, limpiar, arrancar) en un solo viaje SSH.
+
+    El script se sube una vez por versión a ~/.cache/backup-maker/agent-<hash>.py;
+    las siguientes ejecuciones solo envían la descripción JSON del trabajo."""
+
+    def __init__(self, ssh_client):
+        self.ssh_client = ssh_client
+        self.remote_path = posixpath.join(AGENT_DIR, f"agent-{AGENT_VERSION}.py")
+
+    def upload(self):
+        sftp = self.ssh_client.open_sftp()
+        try:
+            path = ""
+            for part in AGENT_DIR.split('/'):
+                path = posixpath.join(path, part)
+                try:
+                    sftp.stat(path)
+                except IOError:
+                    sftp.mkdir(path)
+            temp_path = self.remote_path + ".tmp"
+            sftp.putfo(io.BytesIO(AGENT_SOURCE.encode('utf-8')), temp_path)
+            sftp.posix_rename(temp_path, self.remote_path)
+        finally:
+            sftp.close()
+
+    def execute(self, payload):
+        path = shlex.quote(self.remote_path)
+        command = (f"[ -f {path} ] || exit {AGENT_MISSING}; "
+                   f"command -v python3 >/dev/null 2>&1 || exit {PYTHON_MISSING}; exec python3 {path}")
+        stdin, stdout, stderr = self.ssh_client.exec_command(command)
+        try:
+            stdin.write(payload)
+            stdin.channel.shutdown_write()
+        except (OSError, EOFError):
+            # El script terminó sin leer la entrada (agente no instalado): cuenta el código de salida
+            pass
+        output = stdout.read()
+        error = stderr.read()
+        return stdout.channel.recv_exit_status(), output, error
+
+    def run(self, steps):
+        payload = json.dumps({'steps': steps}).encode('utf-8')
+        exit_status, output, error = self.execute(payload)
+        if exit_status == AGENT_MISSING:
+            self.upload()
+            exit_status, output, error = self.execute(payload)
+
+        if exit_status == PYTHON_MISSING:
+            raise RemoteAgentUnavailable("python3 no está disponible en el servidor")
+        if exit_status != 0:
+            raise Exception(error.decode('utf-8', errors='replace').strip() or f"código de salida {exit_status}")
+        return json.loads(output.decode('utf-8'))['steps']
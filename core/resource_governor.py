@@ -0,0 +1,94 @@
+import shlex
+import threading
+import time
+
+
+IONICE_CLASSES = {'realtime': 1, 'best-effort': 2, 'idle': 3}
+
+
+class TokenBucket:
+    """Limita el caudal a `rate` bytes/s permitiendo ráfagas de hasta `burst` bytes.
+
+    Es compartido por todos los hilos de una descarga, de modo que el límite
+    se aplica al total y no a cada sesión."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Se permite quedar en negativo: la espera se reparte en la siguiente petición
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+
+        if wait:
+            time.sleep(wait)
+
+
+class ResourceGovernor:
+    """Prioridad de CPU/disco y límites de caudal para los trabajos de backup."""
+
+    def __init__(self, governor_config, execute_command):
+        self.config = governor_config or {}
+        self.execute_command = execute_command
+        self.pv_available = None
+        self.download_bucket = None
+
+        download_limit = float(self.config.get('download_limit_mb', 0) or 0)
+        if download_limit > 0:
+            burst = float(self.config.get('burst_mb', download_limit) or download_limit)
+            self.download_bucket = TokenBucket(download_limit * 1024 * 1024, burst * 1024 * 1024)
+
+    def command_prefix(self):
+        prefix = []
+
+        nice = self.config.get('nice')
+        if nice is not None:
+            prefix.append(f"nice -n {int(nice)}")
+
+        ionice_class = self.config.get('ionice_class')
+        if ionice_class is not None:
+            ionice_class = IONICE_CLASSES.get(str(ionice_class), ionice_class)
+            ionice = f"ionice -c {int(ionice_class)}"
+            if self.config.get('ionice_level') is not None and int(ionice_class) != 3:
+                ionice += f" -n {int(self.config['ionice_level'])}"
+            prefix.append(ionice)
+
+        return " ".join(prefix) + " " if prefix else ""
+
+    def wrap(self, command):
+        return self.command_prefix() + command
+
+    def rate_limit_pipe(self):
+        limit = float(self.config.get('remote_read_limit_mb', 0) or 0)
+        if limit <= 0:
+            return ""
+
+        if self.pv_available is None:
+            self.pv_available = bool(self.execute_command("command -v pv").strip())
+            if not self.pv_available:
+                print("[WARNING] 'pv' no está instalado en el servidor: se ignora remote_read_limit_mb")
+        if not self.pv_available:
+            return ""
+
+        # La contrapresión de pv frena a tar, que deja de leer del disco al ritmo limitado
+        return f" | pv -q -L {shlex.quote(str(int(limit * 1024 * 1024)))}"
+
+    def describe(self):
+        parts = []
+        if self.config.get('nice') is not None:
+            parts.append(f"nice {self.config['nice']}")
+        if self.config.get('ionice_class') is not None:
+            parts.append(f"ionice {self.config['ionice_class']}")
+        if self.config.get('remote_read_limit_mb'):
+            parts.append(f"lectura remota {self.config['remote_read_limit_mb']} MB/s")
+        if self.download_bucket:
+            parts.append(f"descarga {self.config['download_limit_mb']} MB/s")
+        return ", ".join(parts)
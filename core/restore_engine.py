@@ -0,0 +1,245 @@
+import hashlib
+import json
+import os
+import re
+import shlex
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from core.encryption import MAGIC, EncryptedRange, maybe_decrypt_iter
+from core.integrity import zip_member_data_offset
+from core.seekable_archive import FileRange, SeekableArchive
+
+
+INCREMENTAL_ARCHIVE_PATTERN = re.compile(r'_(full|incr)_\d{8}_\d{6}\.tar(\.gz)?$')
+
+
+class StreamingRestoreEngine:
+    """Restaura componentes de backup en el servidor enviándolos por SSH sin copia intermedia.
+
+    Cada componente se lee del ZIP final, del almacén deduplicado o del archivo
+    suelto y se escribe directamente en la entrada de `tar -x` o del cliente
+    `mysql`. Los grupos (uno por directorio origen) se restauran en paralelo;
+    dentro de un grupo el orden se respeta (completo y después incrementales)."""
+
+    def __init__(self, backup_cli, local_save_path, dedup_store=None, workers=3, chunk_size=1024 * 1024):
+        self.backup_cli = backup_cli
+        self.local_save_path = local_save_path
+        self.dedup_store = dedup_store
+        self.workers = max(1, int(workers))
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+        self.results = []
+
+    def iter_component(self, unit):
+        # Los componentes cifrados se reconocen por su cabecera y se descifran al vuelo
+        return maybe_decrypt_iter(self.iter_stored_component(unit), self.backup_cli.get_encryption_key)
+
+    def iter_stored_component(self, unit):
+        archive_path = os.path.join(self.local_save_path, unit['archive']) if unit.get('archive') else None
+        if archive_path and os.path.exists(archive_path):
+            with zipfile.ZipFile(archive_path) as archive, archive.open(unit['name']) as member:
+                for data in iter(lambda: member.read(self.chunk_size), b""):
+                    yield data
+            return
+
+        if unit.get('dedup_name') and self.dedup_store:
+            backup = self.dedup_store.load_backup(unit['dedup_name'])
+            entry = next((entry for entry in backup['files'] if entry['name'] == unit['name']), None)
+            if entry is None:
+                raise Exception(f"{unit['name']} no está en el backup {unit['dedup_name']} del almacén")
+            for digest, _ in entry['chunks']:
+                yield self.dedup_store.get_chunk(digest)
+            return
+
+        loose_path = os.path.join(self.local_save_path, unit['name'])
+        if not os.path.exists(loose_path):
+            raise Exception(f"No se encuentra {unit['name']} (ni en el ZIP ni suelto)")
+        with open(loose_path, 'rb') as file:
+            for data in iter(lambda: file.read(self.chunk_size), b""):
+                yield data
+
+    def open_component_range(self, unit):
+        """Acceso aleatorio (descifrado si hace falta) a un componente del ZIP o suelto."""
+        archive_path = os.path.join(self.local_save_path, unit['archive']) if unit.get('archive') else None
+        source = None
+        if archive_path and os.path.exists(archive_path):
+            with zipfile.ZipFile(archive_path) as archive:
+                info = archive.getinfo(unit['name'])
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise Exception(f"{unit['name']} está comprimido dentro del ZIP: no admite acceso directo")
+            source = FileRange(archive_path, zip_member_data_offset(archive_path, info), info.file_size)
+        else:
+            loose_path = os.path.join(self.local_save_path, unit['name'])
+            if not os.path.exists(loose_path):
+                raise Exception(f"No se encuentra {unit['name']} (ni en el ZIP ni suelto)")
+            source = FileRange(loose_path)
+
+        if source.read_at(0, len(MAGIC)) == MAGIC:
+            return EncryptedRange(source, self.backup_cli.get_encryption_key())
+        return source
+
+    def open_seekable(self, unit):
+        return SeekableArchive(self.open_component_range(unit))
+
+    def stream_to_remote(self, command, data_iter, expected_sha256=None, label=None):
+        channel = self.backup_cli.ssh_client.get_transport().open_session()
+        channel.exec_command(f"bash -o pipefail -c {shlex.quote(command)}")
+
+        file_hash = hashlib.sha256()
+        sent = 0
+        start = time.monotonic()
+        try:
+            with self.backup_cli.get_progress().stream(label or command.split()[0]) as stream:
+                for data in data_iter:
+                    channel.sendall(data)
+                    file_hash.update(data)
+                    sent += len(data)
+                    stream.add(len(data))
+            channel.shutdown_write()
+
+            exit_status = channel.recv_exit_status()
+            error = b""
+            while channel.recv_stderr_ready():
+                error += channel.recv_stderr(self.chunk_size)
+        finally:
+            channel.close()
+
+        if exit_status != 0:
+            raise Exception(error.decode('utf-8', errors='replace').strip() or f"código de salida {exit_status}")
+        if expected_sha256 and file_hash.hexdigest() != expected_sha256:
+            # verify_component ya lo comprobó: el componente ha cambiado mientras se enviaba
+            raise Exception(f"{label}: el SHA-256 enviado no coincide con el del catálogo")
+        return sent, time.monotonic() - start
+
+    def verify_component(self, unit):
+        """Comprueba el SHA-256 del catálogo antes de enviar nada, para que un componente
+        dañado no llegue a extraerse ni a ejecutarse en el servidor."""
+        if not unit.get('sha256'):
+            return
+        file_hash = hashlib.sha256()
+        for data in self.iter_component(unit):
+            file_hash.update(data)
+        if file_hash.hexdigest() != unit['sha256']:
+            raise Exception(f"{unit['name']} está dañado: su SHA-256 no coincide con el del catálogo")
+
+    def directory_target(self, unit, target_root):
+        # Los archivos incrementales se crean con "-C <directorio> ." y los normales con "-C <padre> <nombre>"
+        relative_to_directory = bool(INCREMENTAL_ARCHIVE_PATTERN.search(unit['name']))
+        source = unit.get('source')
+
+        if target_root is None:
+            if not source:
+                raise Exception(f"Origen desconocido para {unit['name']}: indica un destino")
+            return source if relative_to_directory else os.path.dirname(source)
+
+        if relative_to_directory and source:
+            return os.path.join(target_root, os.path.basename(source))
+        return target_root
+
+    def restore_archive(self, unit, target_root):
+        target = self.directory_target(unit, target_root)
+        self.verify_component(unit)
+        if SeekableArchive.is_seekable(unit['name']):
+            # El formato de acceso directo se reconvierte en un flujo tar sin comprimir
+            archive = self.open_seekable(unit)
+            try:
+                command = f"mkdir -p {shlex.quote(target)} && tar -xf - -C {shlex.quote(target)}"
+                return self.stream_to_remote(command, archive.iter_tar(archive.entries), label=unit['name'])
+            finally:
+                archive.source.close()
+        decompress = 'z' if unit['name'].endswith('.gz') else ''
+        command = f"mkdir -p {shlex.quote(target)} && tar -x{decompress}f - -C {shlex.quote(target)}"
+        return self.stream_to_remote(command, self.iter_component(unit), unit.get('sha256'), unit['name'])
+
+    def apply_deletions(self, unit, target_root):
+        self.verify_component(unit)
+        index = json.loads(b"".join(self.iter_component(unit)).decode('utf-8'))
+        deleted = index.get('deleted') or []
+        if not deleted:
+            return 0, 0.0
+
+        target = self.directory_target(dict(unit, name=unit['name'][:-len('.json')] + '.tar.gz'), target_root)
+        payload = b"".join(path.encode('utf-8', errors='surrogateescape') + b"\0" for path in deleted)
+        command = f"cd {shlex.quote(target)} && xargs -0 -r rm -rf --"
+        return self.stream_to_remote(command, iter([payload]), label=unit['name'])
+
+    def restore_sql(self, unit, mysql_config):
+        client = self.backup_cli.build_mysql_client_command('mysql', mysql_config)
+        command = f"gzip -dc | {client}" if unit['name'].endswith('.gz') else client
+        self.verify_component(unit)
+        return self.stream_to_remote(command, self.iter_component(unit), unit.get('sha256'), unit['name'])
+
+    def restore_mysql_datadir(self, unit, data_path, service_name):
+        # Antes de detener MySQL: con un componente dañado el datadir actual no se toca
+        self.verify_component(unit)
+        suffix = time.strftime("%Y%m%d_%H%M%S")
+        quoted_path = shlex.quote(data_path.rstrip('/'))
+        saved_path = f"{quoted_path}.before_restore_{suffix}"
+        start_command = f"sudo systemctl start {service_name}"
+
+        print(f"[INFO] Deteniendo {service_name} y apartando {data_path} en {data_path.rstrip('/')}.before_restore_{suffix}")
+        output = self.backup_cli.execute_command(
+            f"sudo systemctl stop {service_name} && sudo mv {quoted_path} {saved_path} && echo ok")
+        if output.strip() != "ok":
+            # El datadir sigue en su sitio: se arranca tal como estaba
+            self.backup_cli.execute_command(start_command)
+            raise Exception(f"No se pudo detener {service_name} o apartar {data_path}")
+
+        decompress = 'z' if unit['name'].endswith('.gz') else ''
+        command = (f"sudo tar -x{decompress}f - -C {shlex.quote(os.path.dirname(data_path.rstrip('/')))} && "
+                   f"sudo chown -R mysql:mysql {quoted_path}")
+        try:
+            result = self.stream_to_remote(command, self.iter_component(unit), unit.get('sha256'), unit['name'])
+        except Exception:
+            # No se arranca MySQL sobre un datadir a medio extraer: se recupera el original
+            recover_command = f"sudo rm -rf {quoted_path} && sudo mv {saved_path} {quoted_path}"
+            print(f"[ERROR] Falló la extracción de {data_path}; recuperando el directorio original")
+            if self.backup_cli.execute_command(f"{recover_command} && echo ok").strip() == "ok":
+                self.backup_cli.execute_command(start_command)
+            else:
+                print(f"[ERROR] {service_name} queda detenido. Para recuperarlo: {recover_command} && {start_command}")
+            raise
+
+        self.backup_cli.execute_command(start_command)
+        return result
+
+    def run_step(self, label, step):
+        sent, seconds = step()
+        rate = sent / seconds if seconds else 0
+        with self.lock:
+            self.results.append({'label': label, 'bytes': sent, 'seconds': seconds})
+            print(f"[OK] {label}: {self.backup_cli.format_file_size(sent)} en {seconds:.1f}s "
+                  f"({self.backup_cli.format_file_size(rate)}/s)")
+
+    def run_group(self, group):
+        for label, step in group:
+            self.run_step(label, step)
+
+    def restore(self, groups):
+        """`groups` es una lista de listas de (etiqueta, función); cada función devuelve (bytes, segundos)."""
+        self.results = []
+        errors = []
+        start = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, max(1, len(groups)))) as executor:
+            futures = {executor.submit(self.run_group, group): group for group in groups}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    label = futures[future][0][0]
+                    errors.append((label, e))
+                    print(f"[ERROR] Error restaurando {label}: {e}")
+
+        elapsed = time.monotonic() - start
+        total_bytes = sum(result['bytes'] for result in self.results)
+        return {
+            'steps': list(self.results),
+            'errors': errors,
+            'bytes': total_bytes,
+            'seconds': elapsed,
+            'throughput': total_bytes / elapsed if elapsed else 0,
+        }
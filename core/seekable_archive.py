@@ -0,0 +1,275 @@
+import json
+import os
+import queue
+import stat
+import struct
+import tarfile
+import threading
+import zlib
+
+
+# Este módulo solo usa la biblioteca estándar: el agente remoto lo incluye tal cual
+SEEKABLE_MAGIC = b"BMARC1\n"
+SEEKABLE_EXTENSION = ".bma"
+TRAILER = struct.Struct('<QQ8s')
+TRAILER_MAGIC = b"BMAIDX01"
+CODECS = ('zlib', 'zstd')
+
+
+def get_codec(name, level=6):
+    """(comprimir, descomprimir) para cada bloque; zstd requiere el paquete opcional zstandard."""
+    if name == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise Exception("El formato con zstd requiere el paquete 'zstandard' (pip install zstandard)")
+        compressor = zstandard.ZstdCompressor(level=level)
+        decompressor = zstandard.ZstdDecompressor()
+        return compressor.compress, decompressor.decompress
+    if name != 'zlib':
+        raise Exception(f"Compresión no válida: {name} ({', '.join(CODECS)})")
+    return (lambda data: zlib.compress(data, level)), zlib.decompress
+
+
+class SeekableArchiveWriter:
+    """Escribe el formato de acceso directo a partir de un flujo tar.
+
+    Cada archivo se comprime en bloques independientes de `frame_size` bytes y
+    al final se añade un índice comprimido ruta → bloques (desplazamiento y
+    tamaño) seguido de una cola fija que indica dónde empieza el índice."""
+
+    def __init__(self, output, codec='zlib', level=6, frame_size=4 * 1024 * 1024):
+        self.output = output
+        self.codec = codec
+        self.compress, _ = get_codec(codec, level)
+        self.frame_size = frame_size
+        self.offset = 0
+        self.entries = []
+
+    def write(self, data):
+        self.output.write(data)
+        self.offset += len(data)
+
+    def add_member(self, member, data_file=None):
+        if member.isdir():
+            entry_type = 'd'
+        elif member.issym():
+            entry_type = 'l'
+        elif member.islnk():
+            entry_type = 'h'
+        elif member.isfile():
+            entry_type = 'f'
+        else:
+            return None
+
+        frames = []
+        if entry_type == 'f' and data_file is not None:
+            while True:
+                data = data_file.read(self.frame_size)
+                if not data:
+                    break
+                compressed = self.compress(data)
+                frames.append([self.offset, len(compressed)])
+                self.write(compressed)
+
+        entry = [member.name.rstrip('/'), entry_type, member.mode, int(member.mtime), member.size if entry_type == 'f' else 0,
+                 member.linkname, [member.uid, member.gid, member.uname, member.gname], frames]
+        self.entries.append(entry)
+        return entry
+
+    def add_tar_stream(self, stream):
+        with tarfile.open(fileobj=stream, mode='r|') as tar:
+            for member in tar:
+                self.add_member(member, tar.extractfile(member) if member.isfile() else None)
+
+    def start(self):
+        self.write(SEEKABLE_MAGIC + self.codec.encode('ascii').ljust(8, b"\0"))
+
+    def finish(self):
+        index = zlib.compress(json.dumps({
+            'version': 1,
+            'codec': self.codec,
+            'frame_size': self.frame_size,
+            'entries': self.entries,
+        }, separators=(',', ':')).encode('utf-8'), 9)
+        index_offset = self.offset
+        self.write(index)
+        self.write(TRAILER.pack(index_offset, len(index), TRAILER_MAGIC))
+
+
+class FileRange:
+    """Acceso aleatorio a un archivo local o a una porción de él (miembro STORED de un ZIP)."""
+
+    def __init__(self, path, offset=0, length=None):
+        self.file = open(path, 'rb')
+        self.base = offset
+        self.size = os.path.getsize(path) - offset if length is None else length
+        self.lock = threading.Lock()
+
+    def read_at(self, offset, length):
+        with self.lock:
+            self.file.seek(self.base + offset)
+            return self.file.read(min(length, self.size - offset))
+
+    def close(self):
+        self.file.close()
+
+
+class SeekableArchive:
+    """Lectura del formato de acceso directo: listar y extraer cuesta lo que ocupan los archivos pedidos."""
+
+    def __init__(self, source):
+        self.source = source
+        head = source.read_at(0, len(SEEKABLE_MAGIC))
+        if head != SEEKABLE_MAGIC:
+            raise Exception("No es un archivo de acceso directo de backup-maker")
+        index_offset, index_length, magic = TRAILER.unpack(source.read_at(source.size - TRAILER.size, TRAILER.size))
+        if magic != TRAILER_MAGIC:
+            raise Exception("Índice del archivo no encontrado (archivo truncado)")
+
+        index = json.loads(zlib.decompress(source.read_at(index_offset, index_length)).decode('utf-8'))
+        self.codec = index['codec']
+        self.decompress = get_codec(self.codec)[1]
+        self.entries = [dict(zip(('name', 'type', 'mode', 'mtime', 'size', 'link', 'owner', 'frames'), entry))
+                        for entry in index['entries']]
+
+    @staticmethod
+    def is_seekable(name):
+        return name.endswith(SEEKABLE_EXTENSION)
+
+    def find(self, prefix=''):
+        """Entradas iguales a `prefix` o dentro de él (todas si está vacío)."""
+        prefix = prefix.strip('/')
+        if not prefix:
+            return list(self.entries)
+        return [entry for entry in self.entries
+                if entry['name'] == prefix or entry['name'].startswith(prefix + '/')]
+
+    def iter_data(self, entry):
+        for offset, length in entry['frames']:
+            yield self.decompress(self.source.read_at(offset, length))
+
+    def safe_path(self, destination, name):
+        path = os.path.normpath(os.path.join(destination, name))
+        if os.path.isabs(name) or not path.startswith(destination + os.sep):
+            raise Exception(f"Ruta no permitida en el archivo: {name}")
+        # Un enlace simbólico ya presente no puede llevar la escritura fuera del destino
+        if not self.is_inside(destination, os.path.dirname(path)):
+            raise Exception(f"Ruta no permitida en el archivo (sale por un enlace): {name}")
+        return path
+
+    @staticmethod
+    def is_inside(destination, path):
+        real_destination = os.path.realpath(destination)
+        real_path = os.path.realpath(path)
+        return real_path == real_destination or real_path.startswith(real_destination + os.sep)
+
+    def extract(self, entries, destination):
+        """Extrae las entradas en `destination`.
+
+        Los enlaces simbólicos se crean al final, para que ninguna entrada se
+        escriba a través de ellos, y se descartan los que apuntan fuera del destino."""
+        destination = os.path.abspath(destination)
+        written = 0
+        directories = []
+        symlinks = []
+        for entry in entries:
+            path = self.safe_path(destination, entry['name'])
+            if entry['type'] == 'd':
+                os.makedirs(path, exist_ok=True)
+                directories.append((path, entry))
+                continue
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if entry['type'] == 'l':
+                symlinks.append((path, entry))
+                continue
+            if os.path.islink(path):
+                os.remove(path)
+            if entry['type'] == 'h':
+                source_path = self.safe_path(destination, entry['link'])
+                if os.path.exists(source_path) and self.is_inside(destination, source_path):
+                    if os.path.lexists(path):
+                        os.remove(path)
+                    os.link(source_path, path)
+                continue
+
+            with open(path, 'wb') as file:
+                for data in self.iter_data(entry):
+                    file.write(data)
+                    written += len(data)
+            os.chmod(path, stat.S_IMODE(entry['mode']))
+            os.utime(path, (entry['mtime'], entry['mtime']))
+
+        for path, entry in symlinks:
+            target = os.path.join(os.path.dirname(path), entry['link'])
+            if os.path.isabs(entry['link']) or not self.is_inside(destination, target):
+                print(f"[WARNING] Enlace simbólico omitido, apunta fuera del destino: {entry['name']} -> {entry['link']}")
+                continue
+            if os.path.lexists(path):
+                os.remove(path)
+            os.symlink(entry['link'], path)
+
+        # Las fechas de los directorios se fijan al final, después de crear su contenido
+        for path, entry in reversed(directories):
+            os.chmod(path, stat.S_IMODE(entry['mode']) | stat.S_IWUSR | stat.S_IXUSR)
+            os.utime(path, (entry['mtime'], entry['mtime']))
+        return written
+
+    def tar_info(self, entry):
+        info = tarfile.TarInfo(entry['name'])
+        info.mode = entry['mode']
+        info.mtime = entry['mtime']
+        info.uid, info.gid, info.uname, info.gname = entry['owner']
+        info.type = {'d': tarfile.DIRTYPE, 'l': tarfile.SYMTYPE, 'h': tarfile.LNKTYPE}.get(entry['type'], tarfile.REGTYPE)
+        info.linkname = entry['link'] or ''
+        info.size = entry['size'] if entry['type'] == 'f' else 0
+        return info
+
+    def iter_tar(self, entries, chunk_size=1024 * 1024):
+        """Flujo tar de las entradas, para enviarlo a `tar -x` en el servidor sin archivo temporal."""
+        chunks = queue.Queue(maxsize=8)
+
+        class QueueWriter:
+            def write(self, data):
+                chunks.put(bytes(data))
+                return len(data)
+
+        archive = self
+
+        class FrameReader:
+            def __init__(self, entry):
+                self.frames = archive.iter_data(entry)
+                self.buffer = b""
+
+            def read(self, size=-1):
+                while size < 0 or len(self.buffer) < size:
+                    data = next(self.frames, None)
+                    if data is None:
+                        break
+                    self.buffer += data
+                data, self.buffer = (self.buffer, b"") if size < 0 else (self.buffer[:size], self.buffer[size:])
+                return data
+
+        errors = []
+
+        def produce():
+            try:
+                with tarfile.open(fileobj=QueueWriter(), mode='w|', bufsize=chunk_size) as tar:
+                    for entry in entries:
+                        tar.addfile(self.tar_info(entry), FrameReader(entry) if entry['type'] == 'f' else None)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                chunks.put(None)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        while True:
+            data = chunks.get()
+            if data is None:
+                break
+            yield data
+        producer.join()
+        if errors:
+            raise errors[0]
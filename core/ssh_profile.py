@@ -0,0 +1,228 @@
+import os
+import shlex
+import shutil
+import socket
+import time
+
+import yaml
+
+
+PROFILE_KEY = "ssh_profile"
+PROFILE_HEADER = "# Perfil de transferencia medido con benchmark-transfer\n"
+DEFAULT_CIPHERS = ('aes128-ctr', 'aes256-ctr', 'aes128-gcm@openssh.com', 'aes256-gcm@openssh.com')
+DEFAULT_WINDOW_SIZES_MB = (2, 8, 32, 128)
+DEFAULT_PACKET_SIZES_KB = (32, 128, 512)
+
+
+def load_ssh_profile(config_path='config.yaml'):
+    """Perfil de transferencia guardado por benchmark-transfer ({} si no hay)."""
+    try:
+        with open(config_path, 'r') as file:
+            config = yaml.safe_load(file) or {}
+    except (OSError, yaml.YAMLError):
+        return {}
+    return config.get(PROFILE_KEY) or {}
+
+
+def supported_ciphers():
+    """Cifrados que admite paramiko, en su orden de preferencia."""
+    import paramiko
+
+    with socket.socket() as sock:
+        transport = paramiko.Transport(sock)
+        try:
+            return tuple(transport.get_security_options().ciphers)
+        finally:
+            transport.close()
+
+
+def profile_connect_options(profile):
+    options = {'compress': bool(profile.get('compress', False))}
+    cipher = profile.get('cipher')
+    ciphers = supported_ciphers() if cipher else ()
+    if cipher in ciphers:
+        # paramiko no permite fijar el orden de cifrados: se desactivan todos los demás
+        options['disabled_algorithms'] = {'ciphers': [name for name in ciphers if name != cipher]}
+    return options
+
+
+def apply_transport_profile(transport, profile):
+    """Ventana y tamaño de paquete para los canales (SFTP, exec) que se abran a partir de ahora."""
+    if transport is None:
+        return
+    if profile.get('window_size'):
+        transport.default_window_size = int(profile['window_size'])
+    if profile.get('max_packet_size'):
+        transport.default_max_packet_size = int(profile['max_packet_size'])
+
+
+def connect_with_profile(client, profile, **connect_kwargs):
+    from paramiko.ssh_exception import IncompatiblePeer
+
+    profile = profile or {}
+    options = profile_connect_options(profile)
+    try:
+        client.connect(**connect_kwargs, **options)
+    except IncompatiblePeer:
+        if 'disabled_algorithms' not in options:
+            raise
+        # El perfil se midió contra otro servidor (p. ej. el de los túneles): se negocia con los cifrados por defecto
+        print(f"[WARNING] {connect_kwargs.get('hostname')} no admite el cifrado {profile['cipher']} del perfil: "
+              f"se usan los cifrados por defecto")
+        client.close()
+        del options['disabled_algorithms']
+        client.connect(**connect_kwargs, **options)
+    apply_transport_profile(client.get_transport(), profile)
+    return client
+
+
+def save_ssh_profile(config_path, profile):
+    """Guarda el perfil en config.yaml sustituyendo solo la sección ssh_profile.
+
+    El resto del archivo (comentarios incluidos) se conserva; antes se deja una
+    copia en config.yaml.bak."""
+    with open(config_path, 'r') as file:
+        lines = file.readlines()
+    shutil.copy2(config_path, config_path + ".bak")
+
+    kept = []
+    skipping = False
+    for line in lines:
+        if line.startswith(f"{PROFILE_KEY}:"):
+            if kept and kept[-1].strip() == PROFILE_HEADER.strip():
+                kept.pop()
+            skipping = True
+            continue
+        if skipping and (line.startswith((' ', '\t', '#')) or not line.strip()):
+            continue
+        skipping = False
+        kept.append(line)
+
+    while kept and not kept[-1].strip():
+        kept.pop()
+    if kept and not kept[-1].endswith('\n'):
+        kept[-1] += '\n'
+
+    block = yaml.safe_dump({PROFILE_KEY: profile}, default_flow_style=False, sort_keys=False)
+    temp_path = config_path + ".tmp"
+    with open(temp_path, 'w') as file:
+        file.writelines(kept)
+        file.write("\n" + PROFILE_HEADER + block)
+    os.replace(temp_path, config_path)
+
+
+class TransferBenchmark:
+    """Mide el caudal SSH con distintas combinaciones de cifrado, ventana, paquete y compresión.
+
+    Cada prueba abre una conexión nueva con el perfil candidato y recibe `size`
+    bytes del servidor: un tar de `sample_paths` (los directorios del backup, para
+    que la compresión se mida con datos reales) o, si se indica, el archivo
+    `source`. Los parámetros se ajustan de uno en uno partiendo del mejor perfil
+    encontrado hasta el momento, en lugar de probar todas las combinaciones."""
+
+    def __init__(self, connect, size=256 * 1024 * 1024, source=None, sample_paths=None, chunk_size=256 * 1024,
+                 format_size=None):
+        self.connect = connect
+        self.size = int(size)
+        self.source = source or (None if sample_paths else '/dev/urandom')
+        self.sample_paths = list(sample_paths or [])
+        self.chunk_size = chunk_size
+        self.format_size = format_size or (lambda size: f"{size} B")
+        self.results = []
+
+    def stream_command(self):
+        if self.source:
+            return f"head -c {self.size} {shlex.quote(self.source)}"
+        paths = ' '.join(shlex.quote(path) for path in self.sample_paths)
+        return f"tar -cf - {paths} 2>/dev/null | head -c {self.size}"
+
+    def sample_size(self):
+        """Bytes que da la muestra de directorios (menos de `size` si ocupan menos)."""
+        client = self.connect({})
+        try:
+            stdin, stdout, stderr = client.exec_command(f"{self.stream_command()} | wc -c")
+            return int(stdout.read().decode('utf-8').strip() or 0)
+        finally:
+            client.close()
+
+    def measure(self, profile):
+        client = self.connect(profile)
+        try:
+            channel = client.get_transport().open_session()
+            channel.exec_command(self.stream_command())
+
+            received = 0
+            cpu_start = time.process_time()
+            start = time.monotonic()
+            while True:
+                data = channel.recv(self.chunk_size)
+                if not data:
+                    break
+                received += len(data)
+            elapsed = time.monotonic() - start
+            cpu = time.process_time() - cpu_start
+            exit_status = channel.recv_exit_status()
+            channel.close()
+        finally:
+            client.close()
+
+        if exit_status != 0 or received != self.size:
+            raise Exception(f"flujo incompleto ({received} de {self.size} bytes)")
+
+        result = {
+            'profile': dict(profile),
+            'mb_per_second': round(received / elapsed / (1024 * 1024), 2) if elapsed else 0.0,
+            'cpu_percent': round(cpu / elapsed * 100, 1) if elapsed else 0.0,
+            'seconds': round(elapsed, 2),
+        }
+        self.results.append(result)
+        return result
+
+    def describe(self, profile):
+        return (f"{profile['cipher'] or 'por defecto'}, ventana {self.format_size(profile['window_size'])}, "
+                f"paquete {self.format_size(profile['max_packet_size'])}, "
+                f"compresión {'sí' if profile['compress'] else 'no'}")
+
+    def run(self, ciphers=DEFAULT_CIPHERS, window_sizes_mb=DEFAULT_WINDOW_SIZES_MB,
+            packet_sizes_kb=DEFAULT_PACKET_SIZES_KB, compression=(False, True)):
+        import paramiko
+
+        if not self.source:
+            self.size = self.sample_size()
+            if not self.size:
+                raise Exception("los directorios del backup no tienen datos legibles para la muestra")
+
+        available = supported_ciphers()
+        ciphers = [cipher for cipher in ciphers if cipher in available]
+        best = {
+            'cipher': ciphers[0] if ciphers else None,
+            'window_size': paramiko.common.DEFAULT_WINDOW_SIZE,
+            'max_packet_size': paramiko.common.DEFAULT_MAX_PACKET_SIZE,
+            'compress': False,
+        }
+        best_result = None
+
+        dimensions = [
+            ('cipher', ciphers),
+            ('window_size', [int(size * 1024 * 1024) for size in window_sizes_mb]),
+            ('max_packet_size', [int(size * 1024) for size in packet_sizes_kb]),
+            ('compress', list(compression)),
+        ]
+        for key, values in dimensions:
+            for value in values:
+                candidate = dict(best, **{key: value})
+                if best_result and candidate == best_result['profile']:
+                    continue
+                try:
+                    result = self.measure(candidate)
+                except Exception as e:
+                    print(f"[WARNING] {self.describe(candidate)}: {e}")
+                    continue
+
+                print(f"[INFO] {self.describe(candidate)}: {result['mb_per_second']:.1f} MB/s, "
+                      f"CPU {result['cpu_percent']:.0f}%")
+                if best_result is None or result['mb_per_second'] > best_result['mb_per_second']:
+                    best_result = result
+                    best = dict(candidate)
+
+        return best_result
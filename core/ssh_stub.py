@@ -0,0 +1,252 @@
+import os
+import socket
+import subprocess
+import threading
+
+import paramiko
+
+
+class StubSFTPHandle(paramiko.SFTPHandle):
+    def stat(self):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def chattr(self, attr):
+        return paramiko.SFTP_OK
+
+
+class StubSFTPServer(paramiko.SFTPServerInterface):
+    """SFTP sobre el sistema de archivos local; las rutas relativas parten del HOME del servidor."""
+
+    def __init__(self, server, *args, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.home = server.stub.home
+
+    def local_path(self, path):
+        return os.path.join(self.home, path)
+
+    def list_folder(self, path):
+        try:
+            path = self.local_path(path)
+            return [paramiko.SFTPAttributes.from_stat(os.lstat(os.path.join(path, name)), name)
+                    for name in os.listdir(path)]
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(self.local_path(path)))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def lstat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.lstat(self.local_path(path)))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def open(self, path, flags, attr):
+        try:
+            descriptor = os.open(self.local_path(path), flags | getattr(os, 'O_BINARY', 0), 0o644)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+        if flags & os.O_WRONLY:
+            mode = 'ab' if flags & os.O_APPEND else 'wb'
+        elif flags & os.O_RDWR:
+            mode = 'a+b' if flags & os.O_APPEND else 'r+b'
+        else:
+            mode = 'rb'
+        handle = StubSFTPHandle(flags)
+        handle.filename = path
+        handle.readfile = handle.writefile = os.fdopen(descriptor, mode)
+        return handle
+
+    def remove(self, path):
+        try:
+            os.remove(self.local_path(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def rename(self, oldpath, newpath):
+        try:
+            os.rename(self.local_path(oldpath), self.local_path(newpath))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def posix_rename(self, oldpath, newpath):
+        return self.rename(oldpath, newpath)
+
+    def mkdir(self, path, attr):
+        try:
+            os.mkdir(self.local_path(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def rmdir(self, path):
+        try:
+            os.rmdir(self.local_path(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def chattr(self, path, attr):
+        return paramiko.SFTP_OK
+
+    def canonicalize(self, path):
+        return os.path.normpath(self.local_path(path))
+
+
+class QuickAckSocket:
+    """Socket que confirma cada lectura al momento (TCP_QUICKACK).
+
+    Con el ACK retardado del núcleo, el algoritmo de Nagle del cliente espera
+    ~40 ms antes de enviar cada petición corta; un servidor de pruebas no debe
+    añadir esa latencia a lo que se mide."""
+
+    def __init__(self, sock):
+        self.sock = sock
+
+    def recv(self, size):
+        data = self.sock.recv(size)
+        if hasattr(socket, 'TCP_QUICKACK'):
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+
+class StubServerInterface(paramiko.ServerInterface):
+    def __init__(self, stub):
+        self.stub = stub
+
+    def get_allowed_auths(self, username):
+        return 'publickey'
+
+    def check_auth_publickey(self, username, key):
+        if key.asbytes() == self.stub.authorized_key.asbytes():
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if kind == 'session' else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self.stub.run_command, args=(channel, command.decode('utf-8')), daemon=True).start()
+        return True
+
+    def check_global_request(self, kind, msg):
+        # keepalive@openssh.com y similares: basta con responder
+        return True
+
+
+class SSHServerStub:
+    """Servidor SSH local para pruebas y benchmarks: ejecuta los comandos en esta máquina.
+
+    Solo acepta la clave `authorized_key`, ejecuta cada exec con `bash -c` (con
+    `env` añadido al entorno, p. ej. un PATH con un mysql simulado) y ofrece
+    SFTP sobre el sistema de archivos local. Como en un servidor real, los
+    comandos empiezan en `home`, que es también su HOME y la base de las rutas
+    SFTP relativas. No es un servidor seguro: solo
+    escucha en 127.0.0.1 y está pensado para procesos de corta duración."""
+
+    def __init__(self, authorized_key, port=0, env=None, host_key=None, home=None):
+        self.authorized_key = authorized_key
+        self.home = os.path.abspath(home or os.getcwd())
+        self.env = dict(os.environ, HOME=self.home, **(env or {}))
+        self.host_key = host_key or paramiko.RSAKey.generate(2048)
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(('127.0.0.1', port))
+        self.server.listen(32)
+        self.port = self.server.getsockname()[1]
+        self.transports = []
+        self.commands = 0
+        self.lock = threading.Lock()
+        self.running = False
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        return self
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                break
+            # Sin Nagle: cada comando es un intercambio de mensajes cortos
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            transport = paramiko.Transport(QuickAckSocket(client))
+            transport.add_server_key(self.host_key)
+            transport.set_subsystem_handler('sftp', paramiko.SFTPServer, StubSFTPServer)
+            try:
+                transport.start_server(server=StubServerInterface(self))
+            except Exception:
+                client.close()
+                continue
+            with self.lock:
+                self.transports.append(transport)
+            threading.Thread(target=self._accept_channels, args=(transport,), daemon=True).start()
+
+    def _accept_channels(self, transport):
+        # Se guarda una referencia a cada canal abierto: paramiko cierra los canales que se liberan
+        channels = []
+        while transport.is_active():
+            channel = transport.accept(1)
+            channels = [open_channel for open_channel in channels if not open_channel.closed]
+            if channel is not None:
+                channels.append(channel)
+
+    def run_command(self, channel, command):
+        with self.lock:
+            self.commands += 1
+        process = subprocess.Popen(['bash', '-c', command], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, env=self.env, cwd=self.home)
+
+        def feed_stdin():
+            try:
+                while True:
+                    data = channel.recv(64 * 1024)
+                    if not data:
+                        break
+                    process.stdin.write(data)
+                    process.stdin.flush()
+            except (OSError, ValueError):
+                pass
+            finally:
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+
+        def copy_stderr():
+            for data in iter(lambda: process.stderr.read1(64 * 1024), b""):
+                channel.sendall_stderr(data)
+
+        threads = [threading.Thread(target=feed_stdin, daemon=True), threading.Thread(target=copy_stderr, daemon=True)]
+        for thread in threads:
+            thread.start()
+        try:
+            for data in iter(lambda: process.stdout.read1(64 * 1024), b""):
+                channel.sendall(data)
+        except OSError:
+            process.kill()
+        threads[1].join()
+        channel.send_exit_status(process.wait())
+        channel.close()
+
+    def stop(self):
+        self.running = False
+        self.server.close()
+        with self.lock:
+            transports, self.transports = self.transports, []
+        for transport in transports:
+            transport.close()
@@ -0,0 +1,347 @@
+import contextlib
+import csv
+import gzip
+import io
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from decimal import Decimal
+
+from core.mysql_parallel_dump import BINARY_TYPES, INTEGER_TYPES
+from core.mysql_session import MySQLSession, MySQLSessionError, quote_identifier, quote_literal, unescape_batch_field
+
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+TEXT_COMPRESSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+PARQUET_COMPRESSIONS = ('snappy', 'zstd', 'gzip')
+FLOAT_TYPES = ('float', 'double', 'real')
+TYPE_PATTERN = re.compile(r'^(\w+)(?:\((\d+)(?:,(\d+))?\))?')
+NULL_FIELD = b'N'
+QUERY_COLUMNS_TABLE = "_export_query_columns"
+DUPLICATE_COLUMN_PATTERN = re.compile(r"ERROR 1060 .*Duplicate column name '([^']*)'")
+
+
+def parse_column_type(column_type):
+    """'decimal(10,2) unsigned' -> ('decimal', 10, 2, True)."""
+    match = TYPE_PATTERN.match(column_type.lower())
+    base = match.group(1) if match else column_type.lower()
+    precision = int(match.group(2)) if match and match.group(2) else None
+    scale = int(match.group(3)) if match and match.group(3) else 0
+    return base, precision, scale, 'unsigned' in column_type.lower()
+
+
+def column_expression(column):
+    # Cada valor llega con un prefijo: 'N' es NULL y 'v...' un valor, así la cadena 'NULL' no se confunde con NULL
+    name = quote_identifier(column['name'])
+    if column['type'] in BINARY_TYPES:
+        value = f"HEX({name})"
+    elif column['type'] == 'bit':
+        value = f"CAST({name} AS UNSIGNED)"
+    else:
+        value = name
+    return f"IF({name} IS NULL, 'N', CONCAT('v', {value}))"
+
+
+def value_converter(column):
+    if column['type'] in INTEGER_TYPES or column['type'] == 'bit':
+        return int
+    if column['type'] in FLOAT_TYPES:
+        return float
+    if column['type'] == 'decimal':
+        return Decimal
+    if column['type'] in BINARY_TYPES:
+        return bytes.fromhex
+    return str
+
+
+def key_literal(column, value):
+    if column['type'] in BINARY_TYPES:
+        return f"X'{value.hex()}'"
+    if column['type'] in INTEGER_TYPES:
+        return str(value)
+    return quote_literal(value)
+
+
+def plain_value(value):
+    """Valor para CSV/JSON: bytes en hexadecimal y decimales como texto (sin perder precisión)."""
+    if isinstance(value, bytes):
+        return value.hex()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def output_extension(file_format, compression=None):
+    extension = '.' + file_format
+    if file_format != 'parquet' and compression:
+        extension += TEXT_COMPRESSIONS[compression]
+    return extension
+
+
+def check_format(file_format, compression=None):
+    if file_format not in FORMATS:
+        raise Exception(f"Formato no válido: {file_format} ({', '.join(FORMATS)})")
+    valid = PARQUET_COMPRESSIONS if file_format == 'parquet' else tuple(TEXT_COMPRESSIONS)
+    if compression and compression not in valid:
+        raise Exception(f"Compresión no válida para {file_format}: {compression} ({', '.join(valid)})")
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise Exception("La exportación a Parquet requiere el paquete 'pyarrow' (pip install pyarrow)")
+    return pyarrow
+
+
+def open_compressed(path, compression, stack):
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise Exception("La compresión zstd requiere el paquete 'zstandard' (pip install zstandard)")
+    raw_file = stack.enter_context(open(path, 'wb'))
+    if compression == 'gzip':
+        return stack.enter_context(gzip.GzipFile(fileobj=raw_file, mode='wb', compresslevel=6))
+    if compression == 'zstd':
+        return stack.enter_context(zstandard.ZstdCompressor(level=3).stream_writer(raw_file, closefd=False))
+    return raw_file
+
+
+class CSVExportWriter:
+    def __init__(self, path, columns, compression=None):
+        self.stack = contextlib.ExitStack()
+        stream = open_compressed(path, compression, self.stack)
+        text = self.stack.enter_context(io.TextIOWrapper(stream, encoding='utf-8', newline=''))
+        self.writer = csv.writer(text)
+        self.writer.writerow([column['name'] for column in columns])
+
+    def write_rows(self, rows):
+        self.writer.writerows(['' if value is None else plain_value(value) for value in row] for row in rows)
+
+    def close(self):
+        self.stack.close()
+
+
+class JSONLExportWriter:
+    def __init__(self, path, columns, compression=None):
+        self.stack = contextlib.ExitStack()
+        stream = open_compressed(path, compression, self.stack)
+        self.text = self.stack.enter_context(io.TextIOWrapper(stream, encoding='utf-8', newline='\n'))
+        self.names = [column['name'] for column in columns]
+
+    def write_rows(self, rows):
+        self.text.writelines(json.dumps(dict(zip(self.names, row)), ensure_ascii=False, default=plain_value) + "\n"
+                             for row in rows)
+
+    def close(self):
+        self.stack.close()
+
+
+class ParquetExportWriter:
+    """Cada llamada a write_rows escribe un row group; el archivo nunca se tiene entero en memoria."""
+
+    def __init__(self, path, columns, compression=None):
+        self.pyarrow = import_pyarrow()
+        self.schema = self.pyarrow.schema([(column['name'], self.arrow_type(column)) for column in columns])
+        self.writer = self.pyarrow.parquet.ParquetWriter(path, self.schema, compression=compression or 'none')
+
+    def arrow_type(self, column):
+        pa = self.pyarrow
+        if column['type'] in INTEGER_TYPES or column['type'] == 'bit':
+            return pa.uint64() if column['unsigned'] or column['type'] == 'bit' else pa.int64()
+        if column['type'] in FLOAT_TYPES:
+            return pa.float64()
+        if column['type'] == 'decimal':
+            precision = column['precision'] or 10
+            return (pa.decimal128 if precision <= 38 else pa.decimal256)(precision, column['scale'])
+        if column['type'] in BINARY_TYPES:
+            return pa.binary()
+        # Fechas y horas se guardan como texto: MySQL admite valores como '0000-00-00' que Arrow no representa
+        return pa.string()
+
+    def write_rows(self, rows):
+        if rows:
+            self.writer.write_table(self.pyarrow.Table.from_pylist(
+                [dict(zip(self.schema.names, row)) for row in rows], schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {'csv': CSVExportWriter, 'jsonl': JSONLExportWriter, 'parquet': ParquetExportWriter}
+
+
+class TableExporter:
+    """Exporta tablas o consultas de MySQL a CSV, JSONL o Parquet con memoria constante.
+
+    Las tablas con clave primaria de una columna se leen por páginas de
+    `chunk_rows` filas (WHERE clave > última ORDER BY clave LIMIT n), así ni el
+    servidor ni el cliente mysql mantienen el resultado completo. El resto de
+    tablas y las consultas se leen con un único SELECT en modo --quick, fila a
+    fila. Las filas se escriben en bloques de `chunk_rows` (un row group en
+    Parquet). Cada tabla usa su propia sesión mysql sobre la misma conexión
+    SSH, hasta `workers` a la vez."""
+
+    def __init__(self, ssh_client, client_command, workers=4, chunk_rows=50000):
+        self.ssh_client = ssh_client
+        # --quick: el cliente mysql remoto tampoco acumula el resultado antes de enviarlo
+        self.client_command = f"{client_command} --quick"
+        self.workers = max(1, int(workers))
+        self.chunk_rows = max(1, int(chunk_rows))
+
+    def open_session(self, database=None):
+        session = MySQLSession(self.ssh_client, self.client_command)
+        if database:
+            try:
+                session.execute(f"USE {quote_identifier(database)}")
+            except Exception:
+                session.close()
+                raise
+        return session
+
+    def load_columns(self, session, relation):
+        columns = []
+        for row in session.query(f"SHOW COLUMNS FROM {relation}"):
+            base, precision, scale, unsigned = parse_column_type(row[1])
+            columns.append({'name': row[0], 'type': base, 'precision': precision, 'scale': scale,
+                            'unsigned': unsigned, 'primary': row[3] == 'PRI'})
+        return columns
+
+    def list_tables(self, database):
+        session = self.open_session()
+        try:
+            return [row[0] for row in session.query(
+                f"SELECT table_name FROM information_schema.tables WHERE table_schema = {quote_literal(database)} "
+                f"AND table_type = 'BASE TABLE' ORDER BY table_name")]
+        finally:
+            session.close()
+
+    def read_rows(self, session, select_sql, converters):
+        for line in session.stream(select_sql):
+            row = []
+            for field, convert in zip(line.split(b"\t"), converters):
+                field = unescape_batch_field(field)
+                if field == NULL_FIELD:
+                    row.append(None)
+                else:
+                    value = field[1:].decode('utf-8', errors='replace')
+                    row.append(value if convert is str else convert(value))
+            yield row
+
+    def iter_pages(self, session, columns, relation, key=None):
+        """Genera listas de como mucho chunk_rows filas."""
+        expressions = ", ".join(column_expression(column) for column in columns)
+        converters = [value_converter(column) for column in columns]
+
+        if key is None:
+            page = []
+            for row in self.read_rows(session, f"SELECT {expressions} FROM {relation}", converters):
+                page.append(row)
+                if len(page) >= self.chunk_rows:
+                    yield page
+                    page = []
+            if page:
+                yield page
+            return
+
+        key_index = columns.index(key)
+        key_name = quote_identifier(key['name'])
+        last_key = None
+        while True:
+            select_sql = f"SELECT {expressions} FROM {relation}"
+            if last_key is not None:
+                select_sql += f" WHERE {key_name} > {key_literal(key, last_key)}"
+            page = list(self.read_rows(session, f"{select_sql} ORDER BY {key_name} LIMIT {self.chunk_rows}",
+                                       converters))
+            if page:
+                yield page
+            if len(page) < self.chunk_rows:
+                return
+            last_key = page[-1][key_index]
+
+    def write_export(self, session, columns, relation, output_path, file_format, compression, key=None):
+        temp_path = output_path + ".part"
+        writer = WRITERS[file_format](temp_path, columns, compression)
+        rows = 0
+        try:
+            try:
+                for page in self.iter_pages(session, columns, relation, key):
+                    writer.write_rows(page)
+                    rows += len(page)
+            finally:
+                writer.close()
+            os.replace(temp_path, output_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return {'rows': rows, 'file': output_path, 'bytes': os.path.getsize(output_path)}
+
+    def export_table(self, database, table, output_path, file_format='csv', compression=None):
+        check_format(file_format, compression)
+        start = time.perf_counter()
+        relation = f"{quote_identifier(database)}.{quote_identifier(table)}"
+        session = self.open_session()
+        try:
+            columns = self.load_columns(session, relation)
+            primary = [column for column in columns if column['primary']]
+            key = primary[0] if len(primary) == 1 else None
+            result = self.write_export(session, columns, relation, output_path, file_format, compression, key)
+        finally:
+            session.close()
+        result.update({'table': table, 'paged': key is not None, 'seconds': round(time.perf_counter() - start, 3)})
+        return result
+
+    def export_query(self, database, sql, output_path, file_format='csv', compression=None):
+        check_format(file_format, compression)
+        start = time.perf_counter()
+        relation = f"({sql.strip().rstrip(';')}) AS export_query"
+        session = self.open_session(database)
+        try:
+            # Las columnas y sus tipos se obtienen de una tabla temporal vacía con la forma del resultado
+            try:
+                session.execute(f"CREATE TEMPORARY TABLE {QUERY_COLUMNS_TABLE} SELECT * FROM {relation} LIMIT 0")
+            except MySQLSessionError as e:
+                # La consulta se lee como tabla derivada: cada columna necesita un nombre propio
+                duplicate = DUPLICATE_COLUMN_PATTERN.search(str(e))
+                if duplicate:
+                    raise Exception(f"La consulta devuelve varias columnas '{duplicate.group(1)}': "
+                                    f"usa alias distintos (AS) para exportarla")
+                raise
+            try:
+                columns = self.load_columns(session, QUERY_COLUMNS_TABLE)
+            finally:
+                session.execute(f"DROP TEMPORARY TABLE IF EXISTS {QUERY_COLUMNS_TABLE}")
+            result = self.write_export(session, columns, relation, output_path, file_format, compression)
+        finally:
+            session.close()
+        result.update({'table': None, 'paged': False, 'seconds': round(time.perf_counter() - start, 3)})
+        return result
+
+    def export_tables(self, database, tables, output_dir, file_format='csv', compression=None):
+        """Exporta varias tablas en paralelo; devuelve (resultados, errores por tabla)."""
+        check_format(file_format, compression)
+        os.makedirs(output_dir, exist_ok=True)
+        extension = output_extension(file_format, compression)
+        results, errors = [], {}
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, max(1, len(tables)))) as executor:
+            futures = {executor.submit(self.export_table, database, table, os.path.join(output_dir, table + extension),
+                                       file_format, compression): table
+                       for table in tables}
+            for future in as_completed(futures):
+                table = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors[table] = str(e)
+                    print(f"[ERROR] {table}: {e}")
+                    continue
+                results.append(result)
+                print(f"[OK] {table}: {result['rows']} filas → {result['file']} "
+                      f"({result['bytes'] / (1024 * 1024):.1f} MB, {result['seconds']:.1f} s)")
+        return sorted(results, key=lambda result: result['table']), errors
@@ -0,0 +1,193 @@
+import json
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from core.encryption import FrameCipher, HEADER
+from core.integrity import OrderedStreamHasher
+
+
+class SFTPTransferEngine:
+    """Descargas SFTP por rangos en paralelo, reanudables, con sesiones persistentes.
+
+    El progreso se guarda en un fichero lateral <destino>.part.json con los rangos
+    completados; si la transferencia se interrumpe, la siguiente llamada con el
+    mismo fichero remoto (mismo tamaño y fecha) solo descarga los rangos pendientes.
+
+    Con `cipher` cada fragmento se cifra como un bloque del formato de
+    core.encryption y se escribe en su posición, sin que el contenido en claro
+    llegue al disco."""
+
+    def __init__(self, ssh_client, streams=4, range_size=32 * 1024 * 1024, piece_size=1024 * 1024,
+                 read_ahead=64, rate_limiter=None):
+        self.ssh_client = ssh_client
+        self.streams = max(1, int(streams))
+        self.range_size = max(piece_size, int(range_size))
+        self.piece_size = piece_size
+        self.read_ahead = read_ahead
+        self.rate_limiter = rate_limiter
+        self.sessions = queue.LifoQueue()
+        self.all_sessions = []
+        self.lock = threading.Lock()
+        self.hash_lock = threading.Lock()
+
+    def acquire_session(self):
+        try:
+            return self.sessions.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self.lock:
+            if len(self.all_sessions) < self.streams:
+                sftp = self.ssh_client.open_sftp()
+                self.all_sessions.append(sftp)
+                return sftp
+        return self.sessions.get()
+
+    def release_session(self, sftp):
+        self.sessions.put(sftp)
+
+    def close(self):
+        with self.lock:
+            for sftp in self.all_sessions:
+                try:
+                    sftp.close()
+                except Exception:
+                    pass
+            self.all_sessions = []
+            self.sessions = queue.LifoQueue()
+
+    def stat(self, remote_path):
+        sftp = self.acquire_session()
+        try:
+            return sftp.stat(remote_path)
+        finally:
+            self.release_session(sftp)
+
+    def load_resume_state(self, state_path, part_path, expected):
+        try:
+            with open(state_path, 'r', encoding='utf-8') as file:
+                state = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return set()
+
+        if any(state.get(key) != value for key, value in expected.items()):
+            return set()
+        if not os.path.exists(part_path) or os.path.getsize(part_path) != expected.get('stored_size', expected['size']):
+            return set()
+        return set(state.get('done', []))
+
+    def save_resume_state(self, state_path, expected, done):
+        temp_path = state_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(dict(expected, done=sorted(done)), file)
+        os.replace(temp_path, state_path)
+
+    def preallocate(self, part_path, size):
+        with open(part_path, 'wb') as file:
+            if size and hasattr(os, 'posix_fallocate'):
+                try:
+                    os.posix_fallocate(file.fileno(), 0, size)
+                    return
+                except OSError:
+                    pass
+            file.truncate(size)
+
+    def fetch_range(self, remote_path, part_path, offset, length, on_piece, cipher=None, size=None):
+        piece_size = cipher.frame_size if cipher else self.piece_size
+        last_index = cipher.frame_count(size) - 1 if cipher else None
+        sftp = self.acquire_session()
+        try:
+            pieces = [(position, min(piece_size, offset + length - position))
+                      for position in range(offset, offset + length, piece_size)]
+            batch_size = len(pieces)
+            if self.rate_limiter:
+                # readv pide todo el lote de golpe: el límite se aplica antes de cada lote,
+                # que no supera la ráfaga permitida
+                burst = getattr(self.rate_limiter, 'capacity', piece_size * self.read_ahead)
+                batch_size = max(1, min(self.read_ahead, int(burst // piece_size)))
+            with sftp.open(remote_path, 'rb') as remote_file, open(part_path, 'r+b') as local_file:
+                local_file.seek(offset)
+                for start in range(0, len(pieces), batch_size):
+                    batch = pieces[start:start + batch_size]
+                    if self.rate_limiter:
+                        self.rate_limiter.consume(sum(piece_length for _, piece_length in batch))
+                    for (position, _), data in zip(batch, remote_file.readv(batch, self.read_ahead)):
+                        if cipher:
+                            index = position // piece_size
+                            local_file.seek(cipher.frame_offset(index))
+                            local_file.write(cipher.encrypt_frame(index, data, index == last_index))
+                        else:
+                            local_file.write(data)
+                        # El hash puede releer este fragmento del disco si no cabe en memoria
+                        local_file.flush()
+                        on_piece(position, data)
+        finally:
+            self.release_session(sftp)
+
+    def download(self, remote_path, local_path, progress_callback=None, hasher=None, cipher=None):
+        attrs = self.stat(remote_path)
+        size = attrs.st_size
+        part_path = local_path + ".part"
+        state_path = local_path + ".part.json"
+        range_size = self.range_size
+        expected = {'remote_path': remote_path, 'size': size, 'mtime': attrs.st_mtime, 'range_size': range_size}
+        if cipher:
+            # Los rangos deben empezar en un bloque cifrado para poder cifrarse por separado
+            range_size = max(cipher.frame_size, range_size // cipher.frame_size * cipher.frame_size)
+            expected.update(range_size=range_size, stored_size=cipher.encrypted_size(size),
+                            encryption=f"{cipher.algorithm}/{cipher.frame_size}")
+
+        ranges = [(index, offset, min(range_size, size - offset))
+                  for index, offset in enumerate(range(0, size, range_size))]
+        done = self.load_resume_state(state_path, part_path, expected)
+        if done:
+            print(f"[INFO] Reanudando descarga: {len(done)}/{len(ranges)} rangos ya descargados")
+            if cipher:
+                # Se reutiliza el nonce del archivo parcial para que los bloques ya escritos sigan siendo válidos
+                with open(part_path, 'rb') as file:
+                    cipher = FrameCipher.from_header(cipher.key, file.read(HEADER.size), cipher.stats)
+        else:
+            self.preallocate(part_path, expected.get('stored_size', size))
+            if cipher:
+                with open(part_path, 'r+b') as file:
+                    file.write(cipher.header)
+                    if not size:
+                        file.write(cipher.encrypt_frame(0, b"", last=True))
+        self.save_resume_state(state_path, expected, done)
+
+        transferred = [sum(length for index, _, length in ranges if index in done)]
+        ordered_hasher = None
+        if hasher is not None:
+            ordered_hasher = OrderedStreamHasher(
+                hasher, part_path, {offset: length for index, offset, length in ranges if index in done},
+                cipher=cipher, size=size)
+
+        def on_piece(position, data):
+            if ordered_hasher:
+                with self.hash_lock:
+                    ordered_hasher.feed(position, data)
+            with self.lock:
+                transferred[0] += len(data)
+                current = transferred[0]
+            if progress_callback:
+                progress_callback(current, size)
+
+        def run_range(index, offset, length):
+            self.fetch_range(remote_path, part_path, offset, length, on_piece, cipher, size)
+            with self.lock:
+                done.add(index)
+                self.save_resume_state(state_path, expected, done)
+
+        pending = [item for item in ranges if item[0] not in done]
+        with ThreadPoolExecutor(max_workers=min(self.streams, max(1, len(pending)))) as executor:
+            for future in [executor.submit(run_range, *item) for item in pending]:
+                future.result()
+
+        if ordered_hasher:
+            ordered_hasher.drain()
+
+        os.replace(part_path, local_path)
+        os.remove(state_path)
+        return size
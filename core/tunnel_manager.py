@@ -0,0 +1,394 @@
+import json
+import os
+import select
+import socket
+import struct
+import threading
+import time
+
+from core.mysql_proxy import MySQLProxySession
+from core.ssh_profile import connect_with_profile, load_ssh_profile
+
+
+class PortForward:
+    """Reenvío de un puerto local a un servicio remoto a través del transporte SSH compartido.
+
+    El socket local queda escuchando al crearse, así que el túnel está listo en
+    cuanto el constructor termina. Cada cliente abre su propio canal
+    direct-tcpip y un hilo bombea los datos en ambos sentidos con select. Con
+    `cache` el túnel actúa como proxy MySQL y sirve desde ella las lecturas repetidas."""
+
+    def __init__(self, manager, local_port, remote_host, remote_port, bind_address='127.0.0.1', buffer_size=64 * 1024,
+                 cache=None):
+        self.manager = manager
+        self.cache = cache
+        self.local_port = int(local_port)
+        self.remote_host = remote_host
+        self.remote_port = int(remote_port)
+        self.bind_address = bind_address
+        self.buffer_size = buffer_size
+        self.lock = threading.Lock()
+        self.connections = set()
+        self.total_connections = 0
+        self.failed_connections = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.started = time.time()
+        self.running = True
+        # Los rellena TunnelMonitor en cada sondeo
+        self.health = {'status': 'desconocido', 'rtt_ms': None, 'rtt_avg_ms': None, 'last_probe': None,
+                       'last_error': None, 'probe_failures': 0, 'server_version': None}
+
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            self.server.bind((bind_address, self.local_port))
+            self.server.listen(64)
+        except OSError:
+            self.server.close()
+            raise
+        self.accept_thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self.accept_thread.start()
+
+    @property
+    def label(self):
+        return f"{self.bind_address}:{self.local_port} → {self.remote_host}:{self.remote_port}"
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                client, address = self.server.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._handle_client, args=(client, address), daemon=True).start()
+
+    def _handle_client(self, client, address):
+        try:
+            channel = self.manager.open_channel(self.remote_host, self.remote_port, address)
+        except Exception as e:
+            with self.lock:
+                self.failed_connections += 1
+            print(f"\n[WARNING] Túnel {self.local_port}: no se pudo abrir el canal a "
+                  f"{self.remote_host}:{self.remote_port} ({e})")
+            client.close()
+            return
+
+        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.lock:
+            self.connections.add(client)
+            self.total_connections += 1
+        try:
+            if self.cache is not None:
+                MySQLProxySession(client, channel, self.cache, on_bytes=self.count_bytes).run()
+            else:
+                self._pump(client, channel)
+        finally:
+            with self.lock:
+                self.connections.discard(client)
+            channel.close()
+            client.close()
+
+    def count_bytes(self, sent, received):
+        with self.lock:
+            self.bytes_sent += sent
+            self.bytes_received += received
+
+    def _pump(self, client, channel):
+        while self.running:
+            readable, _, _ = select.select([client, channel], [], [], 1.0)
+            if client in readable:
+                data = client.recv(self.buffer_size)
+                if not data:
+                    break
+                channel.sendall(data)
+                self.count_bytes(len(data), 0)
+            if channel in readable:
+                data = channel.recv(self.buffer_size)
+                if not data:
+                    break
+                client.sendall(data)
+                self.count_bytes(0, len(data))
+
+    def stats(self):
+        with self.lock:
+            return dict({
+                'local_port': self.local_port,
+                'remote': f"{self.remote_host}:{self.remote_port}",
+                'active_connections': len(self.connections),
+                'total_connections': self.total_connections,
+                'failed_connections': self.failed_connections,
+                'bytes_sent': self.bytes_sent,
+                'bytes_received': self.bytes_received,
+                'uptime_seconds': round(time.time() - self.started, 1),
+                'cache': self.cache.stats() if self.cache is not None else None,
+            }, **self.health)
+
+    def close(self):
+        self.running = False
+        try:
+            self.server.close()
+        except OSError:
+            pass
+        with self.lock:
+            connections = list(self.connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class TunnelManager:
+    """Varios reenvíos de puertos sobre una única conexión SSH de paramiko, sin procesos externos."""
+
+    def __init__(self, ssh_config, config_path='config.yaml'):
+        self.ssh_config = ssh_config
+        self.config_path = config_path
+        self.client = None
+        self.forwards = {}
+        self.lock = threading.Lock()
+        self.connected_at = None
+        self.reconnects = 0
+
+    def connect(self):
+        # paramiko solo se importa al conectar: los errores de configuración y puertos salen sin cargarlo
+        import paramiko
+
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        connect_with_profile(
+            client, load_ssh_profile(self.config_path),
+            hostname=self.ssh_config['host'],
+            port=int(self.ssh_config.get('port', 22)),
+            username=self.ssh_config['username'],
+            key_filename=self.ssh_config.get('key_path'),
+            password=self.ssh_config.get('password'),
+            timeout=int(self.ssh_config.get('connect_timeout', 10)),
+        )
+        client.get_transport().set_keepalive(int(self.ssh_config.get('keepalive_seconds', 30)))
+        if self.connected_at is not None:
+            self.reconnects += 1
+        self.client = client
+        self.connected_at = time.time()
+        return client
+
+    def is_connected(self):
+        transport = self.client.get_transport() if self.client else None
+        return bool(transport and transport.is_active())
+
+    def ensure_connected(self):
+        with self.lock:
+            if not self.is_connected():
+                if self.client:
+                    self.client.close()
+                self.connect()
+
+    def open_channel(self, remote_host, remote_port, source_address):
+        self.ensure_connected()
+        return self.client.get_transport().open_channel('direct-tcpip', (remote_host, remote_port), source_address)
+
+    def add_forward(self, local_port, remote_host=None, remote_port=None, cache=None):
+        if int(local_port) in self.forwards:
+            raise Exception(f"Ya hay un túnel en el puerto {local_port}")
+        self.ensure_connected()
+        forward = PortForward(
+            self, local_port,
+            remote_host or self.ssh_config['remote_host'],
+            remote_port or self.ssh_config['remote_port'],
+            bind_address=self.ssh_config.get('bind_address', '127.0.0.1'),
+            cache=cache,
+        )
+        self.forwards[forward.local_port] = forward
+        return forward
+
+    def remove_forward(self, local_port):
+        forward = self.forwards.pop(int(local_port), None)
+        if forward:
+            forward.close()
+        return forward
+
+    def close(self):
+        for local_port in list(self.forwards):
+            self.remove_forward(local_port)
+        if self.client:
+            self.client.close()
+            self.client = None
+
+
+MYSQL_PROBE_CAPABILITIES = 0x00000001 | 0x00000200 | 0x00008000 | 0x00080000  # LONG_PASSWORD, PROTOCOL_41, SECURE_CONNECTION, PLUGIN_AUTH
+
+
+def read_mysql_packet(sock):
+    header = b""
+    while len(header) < 4:
+        data = sock.recv(4 - len(header))
+        if not data:
+            raise Exception("conexión cerrada por MySQL")
+        header += data
+    length = struct.unpack('<I', header[:3] + b"\0")[0]
+    payload = b""
+    while len(payload) < length:
+        data = sock.recv(length - len(payload))
+        if not data:
+            raise Exception("paquete de MySQL incompleto")
+        payload += data
+    return header[3], payload
+
+
+def write_mysql_packet(sock, sequence, payload):
+    sock.sendall(struct.pack('<I', len(payload))[:3] + bytes([sequence & 0xff]) + payload)
+
+
+def read_mysql_greeting(sock):
+    """Versión del servidor según el paquete de saludo que MySQL envía al aceptar la conexión."""
+    _, payload = read_mysql_packet(sock)
+    if payload[:1] == b"\xff":
+        # Paquete de error (p. ej. host bloqueado): el servidor responde, pero rechaza la conexión
+        raise Exception(payload[9:].decode('utf-8', errors='replace') or "MySQL rechazó la conexión")
+    if payload[:1] != b"\x0a":
+        raise Exception("respuesta que no es un saludo de MySQL")
+    return payload[1:payload.index(b"\0", 1)].decode('ascii', errors='replace')
+
+
+def finish_mysql_handshake(sock, user):
+    """Completa el saludo con un usuario sin contraseña y cierra con COM_QUIT.
+
+    Una conexión cortada a mitad del saludo cuenta para max_connect_errors y
+    acaba bloqueando el host; un acceso denegado no cuenta."""
+    response = (struct.pack('<IIB', MYSQL_PROBE_CAPABILITIES, 16 * 1024 * 1024, 33) + b"\0" * 23
+                + user.encode('utf-8') + b"\0" + b"\0" + b"mysql_native_password\0")
+    sequence = 1
+    write_mysql_packet(sock, sequence, response)
+    for _ in range(4):
+        sequence, payload = read_mysql_packet(sock)
+        if payload[:1] == b"\x00":
+            write_mysql_packet(sock, 0, b"\x01")
+            return
+        if payload[:1] == b"\xff":
+            return
+        # Cambio de método de autenticación o más datos: se responde sin contraseña
+        sequence += 1
+        write_mysql_packet(sock, sequence, b"")
+    raise Exception("el saludo de MySQL no terminó")
+
+
+class TunnelMonitor:
+    """Sondea cada túnel en segundo plano y reconecta la sesión SSH con espera exponencial.
+
+    El sondeo abre una conexión al puerto local (con lo que recorre todo el
+    camino: socket, canal SSH y servicio remoto) y, en los túneles de MySQL,
+    espera el saludo del servidor; el tiempo hasta recibirlo es el RTT (después
+    se completa el saludo con `probe_user` y se cierra con COM_QUIT). En el
+    resto de servicios el RTT es el de un keepalive de la sesión SSH."""
+
+    def __init__(self, manager, interval=10, timeout=5, max_backoff=60, probe='auto', probe_user='tunnel_probe'):
+        self.manager = manager
+        self.interval = max(1.0, float(interval))
+        self.timeout = float(timeout)
+        self.max_backoff = float(max_backoff)
+        self.probe = probe
+        self.probe_user = probe_user
+        self.backoff = 0.0
+        self.last_reconnect_error = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._loop, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=self.timeout + 1)
+            self.thread = None
+
+    def is_mysql(self, forward):
+        return self.probe == 'mysql' or (self.probe == 'auto' and forward.remote_port in (3306, 33060))
+
+    def ssh_round_trip(self):
+        start = time.monotonic()
+        # El servidor responde aunque rechace la petición: basta para medir la ida y vuelta
+        self.manager.client.get_transport().global_request('keepalive@openssh.com', wait=True)
+        return (time.monotonic() - start) * 1000
+
+    def probe_forward(self, forward):
+        start = time.monotonic()
+        with socket.create_connection((forward.bind_address, forward.local_port), timeout=self.timeout) as sock:
+            if self.is_mysql(forward):
+                version = read_mysql_greeting(sock)
+                rtt_ms = (time.monotonic() - start) * 1000
+                finish_mysql_handshake(sock, self.probe_user)
+                return rtt_ms, version
+
+            # Sin protocolo conocido basta con que el canal no se cierre de inmediato;
+            # el RTT es el de la sesión SSH
+            sock.settimeout(0.2)
+            try:
+                if sock.recv(1, socket.MSG_PEEK) == b"":
+                    raise Exception("el servicio remoto cerró la conexión")
+            except socket.timeout:
+                pass
+        return self.ssh_round_trip(), None
+
+    def check(self):
+        """Un ciclo de sondeo de todos los túneles; devuelve los segundos hasta el siguiente."""
+        if not self.manager.is_connected():
+            try:
+                self.manager.ensure_connected()
+                self.backoff = 0.0
+                self.last_reconnect_error = None
+                print(f"\n[OK] Conexión SSH de los túneles restablecida (reconexión {self.manager.reconnects})")
+            except Exception as e:
+                self.backoff = min(self.max_backoff, self.backoff * 2 if self.backoff else 1.0)
+                self.last_reconnect_error = str(e)
+                for forward in list(self.manager.forwards.values()):
+                    forward.health.update(status='caído', last_error=f"SSH: {e}", last_probe=time.time())
+                return self.backoff
+
+        for forward in list(self.manager.forwards.values()):
+            try:
+                rtt_ms, version = self.probe_forward(forward)
+            except Exception as e:
+                forward.health['probe_failures'] += 1
+                forward.health.update(status='caído', last_error=str(e), last_probe=time.time())
+                continue
+            average = forward.health['rtt_avg_ms']
+            forward.health.update(
+                status='activo', rtt_ms=round(rtt_ms, 2), last_error=None, last_probe=time.time(),
+                rtt_avg_ms=round(rtt_ms if average is None else 0.2 * rtt_ms + 0.8 * average, 2),
+                server_version=version or forward.health['server_version'],
+            )
+        return self.interval
+
+    def _loop(self):
+        while not self.stop_event.is_set():
+            try:
+                wait = self.check()
+            except Exception as e:
+                print(f"\n[WARNING] Error sondeando túneles: {e}")
+                wait = self.interval
+            self.stop_event.wait(wait)
+
+    def snapshot(self):
+        return {
+            'generated': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'ssh': {
+                'host': self.manager.ssh_config['host'],
+                'connected': self.manager.is_connected(),
+                'connected_since': self.manager.connected_at,
+                'reconnects': self.manager.reconnects,
+                'backoff_seconds': self.backoff,
+                'last_error': self.last_reconnect_error,
+            },
+            'tunnels': [forward.stats() for forward in list(self.manager.forwards.values())],
+        }
+
+    def export(self, path):
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.snapshot(), file, indent=2, ensure_ascii=False)
+        os.replace(temp_path, path)
+        return path
@@ -1,4 +1,12 @@
-from core import DatabaseCLI, BackupCLI, DevelopmentCLI
+import argparse
+import os
+import sys
+import time
+
+# Los módulos de core se importan dentro de cada opción: un comando solo carga
+# el subsistema que usa (el túnel no necesita los backups, ni un backup dotenv)
+STARTUP = time.perf_counter()
+
 
 class MainApplication:
     def __init__(self):
@@ -17,6 +25,7 @@ class MainApplication:
     def databases_option(self):
         print("\nIniciando módulo de gestión de bases de datos...")
         try:
+            from core.database_cli import DatabaseCLI
             database_cli = DatabaseCLI()
             database_cli.run()
         except Exception as e:
@@ -27,6 +36,7 @@ class MainApplication:
     def backup_option(self):
         print("\nIniciando módulo de backups...")
         try:
+            from core.backup_cli import BackupCLI
             backup_cli = BackupCLI()
             backup_cli.run()
         except Exception as e:
@@ -37,6 +47,7 @@ class MainApplication:
     def development_option(self):
         print("\nIniciando módulo de herramientas de desarrollo...")
         try:
+            from core.dev_cli import DevelopmentCLI
             development_cli = DevelopmentCLI()
             development_cli.run()
         except Exception as e:
@@ -78,9 +89,210 @@ class MainApplication:
 
         print("\nAplicación cerrada correctamente")
 
-def main():
-    app = MainApplication()
-    app.run()
+def report_startup(args):
+    # Se llama tras importar el subsistema: mide todo lo que el comando paga antes de trabajar
+    if args.startup_time:
+        print(f"[INFO] Arranque: {(time.perf_counter() - STARTUP) * 1000:.1f} ms, "
+              f"{len(sys.modules)} módulos cargados", file=sys.stderr)
+
+
+def backup_command(args):
+    from core.backup_cli import BackupCLI
+    report_startup(args)
+    backup_cli = BackupCLI(args.config)
+    try:
+        if args.command == 'backup':
+            return backup_cli.run_backup()
+        if args.command == 'verify':
+            return backup_cli.verify_backups_option()
+        if args.command == 'estimate':
+            return backup_cli.estimate_folders_option()
+        if args.command == 'extract':
+            return backup_cli.extract_files_option(args.run, args.path, args.destination or '', args.component)
+        if args.command == 'upload':
+            return backup_cli.upload_offsite_option(args.run)
+    finally:
+        backup_cli.close_connection()
+
+
+def database_command(args):
+    from core.database_cli import DatabaseCLI
+    report_startup(args)
+    database_cli = DatabaseCLI()
+    try:
+        if args.command == 'deploy':
+            return database_cli.create_database_option(args.schema_file)
+        if args.command == 'schema':
+            output_file = os.path.abspath(args.output) if args.output else None
+            if output_file and not output_file.endswith('.json'):
+                output_file += '.json'
+            return database_cli.extract_schema_option(args.database, output_file)
+        if args.command == 'export':
+            return database_cli.export_data_option(args.database, args.tables, args.query, args.output, args.format,
+                                                   args.compression, args.workers, args.chunk_rows)
+    finally:
+        database_cli.close_connection()
+
+
+def tunnel_command(args):
+    from core.dev_cli import DevelopmentCLI
+    report_startup(args)
+    development_cli = DevelopmentCLI(args.config)
+    if not development_cli.running:
+        return False
+
+    # -L PUERTO[:HOST:PUERTO], como en ssh; sin servicio se usa el de ssh_tunnel
+    for spec in args.forward or ['']:
+        local_port, _, remote_input = spec.partition(':')
+        port = development_cli._validate_port(local_port)
+        remote = development_cli._parse_remote_service(remote_input) if port else None
+        if remote is None:
+            development_cli._cleanup_tunnel()
+            return False
+        cache = development_cli._create_query_cache(remote[1], ask=False) if args.cache else None
+        if not development_cli.open_tunnel(port, remote, cache):
+            development_cli._cleanup_tunnel()
+            return False
+
+    # Ctrl+C o SIGTERM cierran los túneles (manejador de DevelopmentCLI)
+    print("[INFO] Túneles activos; Ctrl+C para cerrarlos")
+    while True:
+        time.sleep(3600)
+
+
+def job_command(args):
+    from core.job_runner import JobError, JobRunner
+    report_startup(args)
+    try:
+        runner = JobRunner(args.job_file, workers=args.workers, report_path=args.report, config_path=args.config)
+    except JobError as e:
+        print(f"[ERROR] {e}")
+        return False
+    return runner.run()
+
+
+def benchmark_command(args):
+    from core.benchmark_suite import (BASELINE_NAME, BenchmarkSuite, compare_results, load_results,
+                                      print_comparison, write_results)
+    report_startup(args)
+    suite = BenchmarkSuite(tables=args.tables, statements=args.statements, backup_mb=args.backup_mb,
+                           latency_ms=args.latency_ms, repeat=args.repeat, real_mysql=args.real_mysql,
+                           work_dir=args.work_dir)
+    try:
+        results = suite.run()
+    except Exception as e:
+        print(f"[ERROR] El benchmark falló: {e}")
+        return False
+    print(f"Resultados: {write_results(args.output, results)}")
+
+    baseline_path = args.baseline or BASELINE_NAME
+    if args.save_baseline:
+        print(f"[OK] Referencia guardada: {write_results(baseline_path, results)}")
+        return True
+    if not os.path.exists(baseline_path):
+        print(f"[INFO] No hay referencia ({baseline_path}); guárdala con --save-baseline")
+        return True
+
+    baseline = load_results(baseline_path)
+    if baseline.get('parameters') != results['parameters']:
+        print(f"[WARNING] La referencia se midió con otros parámetros: {baseline.get('parameters')}")
+    rows = compare_results(results, baseline, args.threshold)
+    print_comparison(rows)
+    regressions = [row['metric'] for row in rows if row['regression']]
+    if regressions:
+        print(f"[ERROR] Regresiones: {', '.join(regressions)}")
+        return False
+    print("[✓] Sin regresiones respecto a la referencia")
+    return True
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='main.py',
+        description="Sistema de Gestión. Sin argumentos abre el menú interactivo; con un comando se ejecuta "
+                    "sin preguntas (cron, CI) y termina con código 0 si todo fue bien.")
+    parser.add_argument('--startup-time', action='store_true',
+                        help="muestra en stderr el tiempo de arranque hasta empezar el comando")
+    commands = parser.add_subparsers(dest='command', metavar='COMANDO')
+
+    def add_command(name, handler, help_text, config=True):
+        command = commands.add_parser(name, help=help_text, description=help_text)
+        command.set_defaults(handler=handler)
+        if config:
+            command.add_argument('--config', default='config.yaml', help="archivo de configuración (config.yaml)")
+        return command
+
+    add_command('backup', backup_command, "ejecuta el backup completo")
+    add_command('verify', backup_command, "verifica la integridad de los backups locales")
+    add_command('estimate', backup_command, "estima el tamaño de los directorios remotos")
+    command = add_command('extract', backup_command, "extrae archivos de un backup de acceso directo")
+    command.add_argument('run', help="nombre del backup en el catálogo o 'latest'")
+    command.add_argument('path', nargs='?', default='', help="archivo o directorio a extraer (por defecto todo)")
+    command.add_argument('destination', nargs='?', help="directorio local de destino")
+    command.add_argument('--component', help="directorio respaldado, si el backup tiene varios")
+    command = add_command('upload', backup_command, "sube un backup al almacenamiento externo")
+    command.add_argument('run', help="nombre del backup en el catálogo o 'latest'")
+
+    command = add_command('deploy', database_command, "crea una base de datos desde un esquema JSON", config=False)
+    command.add_argument('schema_file', help="archivo de esquema (.json)")
+    command = add_command('schema', database_command, "extrae el esquema de una base de datos a JSON", config=False)
+    command.add_argument('database', help="base de datos")
+    command.add_argument('-o', '--output', help="archivo de salida (por defecto dataModels/<base>_schema_<fecha>.json)")
+    command = add_command('export', database_command, "exporta tablas o una consulta a CSV, JSONL o Parquet",
+                          config=False)
+    command.add_argument('database', help="base de datos")
+    command.add_argument('--tables', nargs='+', help="tablas a exportar (por defecto todas)")
+    command.add_argument('--query', help="exporta el resultado de esta consulta en lugar de tablas")
+    command.add_argument('-o', '--output',
+                         help="directorio de salida (exports/<base>) o archivo, con --query (<base>_consulta.<formato>)")
+    command.add_argument('--format', choices=['csv', 'jsonl', 'parquet'], default='csv', help="formato (csv)")
+    command.add_argument('--compression',
+                         help="gzip o zstd para csv/jsonl; snappy, zstd o gzip para parquet (por defecto ninguna)")
+    command.add_argument('--workers', type=int, default=4, help="tablas exportadas en paralelo (4)")
+    command.add_argument('--chunk-rows', type=int, default=50000, help="filas por página y por row group (50000)")
+
+    command = add_command('job', job_command, "ejecuta un archivo de trabajo YAML (pasos con dependencias)",
+                          config=False)
+    command.add_argument('job_file', help="archivo de trabajo (.yaml)")
+    command.add_argument('--workers', type=int, help="pasos en paralelo (por defecto 'workers' del archivo o 4)")
+    command.add_argument('--report', help="informe JSON de tiempos (por defecto <trabajo>.report.json)")
+    command.add_argument('--config', help="configuración de los pasos de backup (por defecto 'config' del archivo)")
+
+    command = add_command('benchmark', benchmark_command,
+                          "mide Connection, SchemaBuilder y BackupCLI contra un servidor SSH local", config=False)
+    command.add_argument('--tables', type=int, default=50, help="tablas del modelo generado (50)")
+    command.add_argument('--statements', type=int, default=200, help="sentencias por medición (200)")
+    command.add_argument('--backup-mb', type=int, default=64, help="MB de datos del backup (64)")
+    command.add_argument('--latency-ms', type=float, default=0.0, help="latencia por sentencia del mysql simulado")
+    command.add_argument('--repeat', type=int, default=3, help="repeticiones de cada medición; se guarda la mejor (3)")
+    command.add_argument('--real-mysql', action='store_true',
+                         help="usa el cliente mysql instalado (credenciales MYSQL_* del entorno)")
+    command.add_argument('--work-dir', help="directorio de trabajo (por defecto uno temporal que se borra)")
+    command.add_argument('--output', default='benchmark_results.json', help="resultados JSON (benchmark_results.json)")
+    command.add_argument('--baseline', help="referencia con la que comparar (benchmark_baseline.json)")
+    command.add_argument('--save-baseline', action='store_true', help="guarda estos resultados como referencia")
+    command.add_argument('--threshold', type=float,
+                         help="umbral de regresión en %% para todas las métricas (por defecto, uno por métrica)")
+
+    command = add_command('tunnel', tunnel_command, "abre túneles SSH hasta Ctrl+C")
+    command.add_argument('-L', '--forward', action='append', metavar='PUERTO[:HOST:PUERTO]',
+                         help="puerto local y servicio remoto (repetible; por defecto 3307 → ssh_tunnel)")
+    command.add_argument('--cache', action='store_true', help="activa la caché de consultas MySQL (ssh_tunnel.proxy)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command is None:
+        app = MainApplication()
+        app.run()
+        return 0
+
+    try:
+        return 0 if args.handler(args) else 1
+    except KeyboardInterrupt:
+        print("\n[INFO] Interrumpido por el usuario")
+        return 130
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
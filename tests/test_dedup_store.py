@@ -0,0 +1,73 @@
+import io
+import os
+import random
+
+from core.dedup_store import ContentDefinedChunker, DedupBackup, DedupStore
+
+
+def random_bytes(size, seed):
+    return random.Random(seed).randbytes(size)
+
+
+def test_chunks_cover_the_stream_within_bounds():
+    chunker = ContentDefinedChunker(avg_size=4096)
+    data = random_bytes(256 * 1024, 1)
+    chunks = list(chunker.iter_chunks(io.BytesIO(data), read_size=10000))
+
+    assert b"".join(chunks) == data
+    assert all(chunker.min_size <= len(chunk) <= chunker.max_size for chunk in chunks[:-1])
+    assert len(chunks[-1]) <= chunker.max_size
+
+
+def test_boundaries_do_not_depend_on_read_size():
+    chunker = ContentDefinedChunker(avg_size=4096)
+    data = random_bytes(128 * 1024, 2)
+    assert list(chunker.iter_chunks(io.BytesIO(data), read_size=7000)) == \
+        list(chunker.iter_chunks(io.BytesIO(data), read_size=len(data)))
+
+
+def test_boundaries_resynchronize_after_an_insertion():
+    chunker = ContentDefinedChunker(avg_size=4096)
+    data = random_bytes(256 * 1024, 3)
+    original = list(chunker.iter_chunks(io.BytesIO(data)))
+    edited = list(chunker.iter_chunks(io.BytesIO(data[:1000] + b"insertado" + data[1000:])))
+
+    # Solo cambian los fragmentos cercanos a la inserción
+    assert len(set(original) & set(edited)) >= len(original) - 2
+
+
+def test_empty_stream_has_no_chunks():
+    assert list(ContentDefinedChunker(avg_size=4096).iter_chunks(io.BytesIO(b""))) == []
+
+
+def test_backup_round_trip_reuses_chunks(tmp_path):
+    source = tmp_path / 'origen'
+    source.mkdir()
+    data = random_bytes(200 * 1024, 4)
+    (source / 'a.bin').write_bytes(data)
+    (source / 'b.bin').write_bytes(data[:50 * 1024] + b"cambio" + data[50 * 1024:])
+
+    store = DedupStore(str(tmp_path / 'almacen'), avg_chunk_size=4096)
+    first = store.create_backup('uno', [str(source / 'a.bin')], str(source))
+    second = store.create_backup('dos', [str(source / 'b.bin')], str(source))
+    # El segundo archivo comparte casi todos sus fragmentos con el primero
+    assert second['written'] < first['written'] // 4
+
+    restored = store.restore_backup('dos', str(tmp_path / 'destino'))
+    assert [os.path.basename(path) for path in restored] == ['b.bin']
+    assert (tmp_path / 'destino' / 'b.bin').read_bytes() == (source / 'b.bin').read_bytes()
+
+
+def test_dedup_backup_removes_sources_as_they_are_stored(tmp_path):
+    source = tmp_path / 'origen'
+    source.mkdir()
+    (source / 'datos.sql').write_bytes(random_bytes(64 * 1024, 5))
+
+    store = DedupStore(str(tmp_path / 'almacen'), avg_chunk_size=4096)
+    backup = DedupBackup(store, 'run', str(source))
+    backup.add(str(source / 'datos.sql'))
+    assert not (source / 'datos.sql').exists()
+
+    index = backup.finish()
+    assert backup.finish() is index
+    assert [entry['name'] for entry in store.load_backup('run')['files']] == ['datos.sql']
@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+from core.encryption import (DecryptingReader, EncryptedRange, EncryptingWriter, FrameCipher, HEADER, StreamEncryptor,
+                             TAG_SIZE, decrypt_iter, maybe_decrypt_iter)
+
+
+pytest.importorskip('cryptography')
+
+KEY = bytes(range(32))
+FRAME_SIZE = 64
+
+
+class BytesSource:
+    """Origen con `read_at` y `size`, como los que usa EncryptedRange."""
+
+    def __init__(self, data):
+        self.data = data
+        self.size = len(data)
+
+    def read_at(self, offset, length):
+        return self.data[offset:offset + length]
+
+    def close(self):
+        pass
+
+
+def encrypt(data, algorithm='aes-256-gcm', pieces=7):
+    cipher = FrameCipher(KEY, algorithm, frame_size=FRAME_SIZE)
+    encryptor = StreamEncryptor(cipher)
+    output = b"".join(encryptor.update(data[i:i + pieces]) for i in range(0, len(data), pieces))
+    return output + encryptor.finalize()
+
+
+def pieces(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('size', [0, 1, FRAME_SIZE - 1, FRAME_SIZE, 3 * FRAME_SIZE, 3 * FRAME_SIZE + 5])
+@pytest.mark.parametrize('algorithm', ['aes-256-gcm', 'chacha20-poly1305'])
+def test_round_trip_with_any_frame_alignment(size, algorithm):
+    data = os.urandom(size)
+    encrypted = encrypt(data, algorithm)
+
+    assert len(encrypted) == FrameCipher(KEY, algorithm, FRAME_SIZE).encrypted_size(size)
+    assert b"".join(decrypt_iter(KEY, pieces(encrypted, 5))) == data
+
+
+def test_truncated_or_reordered_frames_are_rejected():
+    data = os.urandom(3 * FRAME_SIZE)
+    encrypted = encrypt(data)
+    stored_frame = FRAME_SIZE + TAG_SIZE
+
+    # Sin el último bloque, el anterior no lleva la marca de final
+    with pytest.raises(Exception, match="Bloque cifrado 1"):
+        b"".join(decrypt_iter(KEY, [encrypted[:HEADER.size + 2 * stored_frame]]))
+
+    frames = pieces(encrypted[HEADER.size:], stored_frame)
+    swapped = encrypted[:HEADER.size] + frames[1] + frames[0] + frames[2]
+    with pytest.raises(Exception, match="Bloque cifrado 0"):
+        b"".join(decrypt_iter(KEY, [swapped]))
+
+    with pytest.raises(Exception, match="truncado"):
+        b"".join(decrypt_iter(KEY, [encrypted[:HEADER.size + 3]]))
+
+
+def test_other_key_is_rejected():
+    with pytest.raises(Exception, match="otra clave"):
+        b"".join(decrypt_iter(bytes(32), [encrypt(b"datos")]))
+
+
+def test_file_wrappers_round_trip(tmp_path):
+    data = os.urandom(5 * FRAME_SIZE + 10)
+    path = tmp_path / 'datos.enc'
+    with EncryptingWriter(open(path, 'wb'), FrameCipher(KEY, frame_size=FRAME_SIZE)) as writer:
+        for piece in pieces(data, 33):
+            writer.write(piece)
+
+    with DecryptingReader(open(path, 'rb'), KEY, read_size=17) as reader:
+        assert reader.read() == data
+
+
+def test_random_access_decrypts_only_the_requested_range():
+    data = os.urandom(4 * FRAME_SIZE + 20)
+    encrypted_range = EncryptedRange(BytesSource(encrypt(data)), KEY)
+
+    assert encrypted_range.size == len(data)
+    for offset, length in [(0, 10), (FRAME_SIZE - 3, 6), (2 * FRAME_SIZE, 3 * FRAME_SIZE), (len(data) - 1, 10)]:
+        assert encrypted_range.read_at(offset, length) == data[offset:offset + length]
+
+
+def test_maybe_decrypt_passes_plain_data_through():
+    plain = [b"SELECT", b" 1;\n"]
+    assert b"".join(maybe_decrypt_iter(plain, lambda: pytest.fail("no debe cargar la clave"))) == b"SELECT 1;\n"
+    assert b"".join(maybe_decrypt_iter(pieces(encrypt(b"cifrado"), 3), lambda: KEY)) == b"cifrado"
@@ -0,0 +1,157 @@
+import socket
+import struct
+import threading
+
+import pytest
+
+from core.mysql_proxy import (CLIENT_SSL, MAX_PACKET, MySQLProxySession, PacketStream, QueryCache, referenced_tables,
+                              split_statements)
+
+
+CLIENT_PROTOCOL_41 = 0x00000200
+OK_AUTOCOMMIT = b"\x00\x00\x00\x02\x00\x00\x00"
+EOF_AUTOCOMMIT = b"\xfe\x00\x00\x02\x00"
+
+
+def packet(payload, sequence=0):
+    return len(payload).to_bytes(3, 'little') + bytes([sequence]) + payload
+
+
+def greeting(capabilities):
+    return (b"\x0a" + b"8.0.36\0" + struct.pack('<I', 1) + b"\1" * 8 + b"\0"
+            + struct.pack('<H', capabilities & 0xffff) + b"\x21" + struct.pack('<H', 2)
+            + struct.pack('<H', capabilities >> 16) + b"\0" * 11)
+
+
+def handshake_response(capabilities, user=b"app"):
+    return struct.pack('<IIB', capabilities, MAX_PACKET, 0x21) + b"\0" * 23 + user + b"\0" + b"\0"
+
+
+def result_set(value):
+    return b"".join(packet(payload, sequence) for sequence, payload in enumerate(
+        [b"\x01", b"\x03def\0\0\0\x01v\0", EOF_AUTOCOMMIT, bytes([len(value)]) + value, EOF_AUTOCOMMIT], 1))
+
+
+class FakeServer:
+    """Servidor MySQL mínimo: saluda, acepta cualquier usuario y responde un resultado a cada SELECT."""
+
+    def __init__(self, sock, capabilities=CLIENT_PROTOCOL_41):
+        self.sock = sock
+        self.capabilities = capabilities
+        self.queries = []
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        stream = PacketStream(self.sock)
+        try:
+            self.sock.sendall(packet(greeting(self.capabilities)))
+            stream.read_packet()
+            self.sock.sendall(packet(OK_AUTOCOMMIT, 2))
+            while True:
+                payload, _ = stream.read_packet()
+                if payload[:1] == b"\x01":
+                    break
+                sql = payload[1:].decode()
+                self.queries.append(sql)
+                if sql.upper().startswith('SELECT'):
+                    self.sock.sendall(result_set(str(len(self.queries)).encode()))
+                else:
+                    self.sock.sendall(packet(b"\x00\x01\x00\x02\x00\x00\x00", 1))
+        except (EOFError, OSError):
+            pass
+        finally:
+            self.sock.close()
+
+
+@pytest.fixture
+def proxy():
+    client, proxy_client = socket.socketpair()
+    proxy_server, server = socket.socketpair()
+    fake = FakeServer(server)
+    cache = QueryCache()
+    session = MySQLProxySession(proxy_client, proxy_server, cache)
+    thread = threading.Thread(target=session.run, daemon=True)
+    thread.start()
+
+    stream = PacketStream(client)
+    stream.read_packet()
+    client.sendall(packet(handshake_response(CLIENT_PROTOCOL_41), 1))
+    assert stream.read_packet()[0] == OK_AUTOCOMMIT
+    yield client, stream, fake, cache
+
+    client.sendall(packet(b"\x01"))
+    thread.join(5)
+    client.close()
+
+
+def query(client, stream, sql, packets=5):
+    client.sendall(packet(b"\x03" + sql.encode()))
+    return b"".join(stream.read_packet()[1] for _ in range(packets))
+
+
+def test_split_statements_and_referenced_tables():
+    assert split_statements("SELECT ';'; UPDATE t SET a = 1;") == ["SELECT ';'", "UPDATE t SET a = 1"]
+    assert referenced_tables("SELECT * FROM a JOIN tienda.b ON a.id = b.id", "app") == {"app.a", "tienda.b"}
+
+
+def test_packet_stream_joins_split_and_maximum_size_packets():
+    left, right = socket.socketpair()
+    payload = b"x" * MAX_PACKET + b"resto"
+    data = packet(b"corto") + packet(payload[:MAX_PACKET]) + packet(payload[MAX_PACKET:], 1)
+    threading.Thread(target=lambda: [left.sendall(data[i:i + 1000]) for i in range(0, len(data), 1000)],
+                     daemon=True).start()
+
+    stream = PacketStream(right)
+    assert stream.read_packet() == (b"corto", packet(b"corto"))
+    joined, raw = stream.read_packet()
+    assert joined == payload
+    assert raw == data[len(packet(b"corto")):]
+    left.close()
+    right.close()
+
+
+def test_repeated_select_is_served_from_cache(proxy):
+    client, stream, fake, cache = proxy
+    first = query(client, stream, "SELECT v FROM t")
+    second = query(client, stream, "SELECT  v  FROM t;")
+
+    # La respuesta de la caché es idéntica byte a byte y el servidor solo recibió una consulta
+    assert first == second == result_set(b"1")
+    assert fake.queries == ["SELECT v FROM t"]
+    assert cache.stats()['hits'] == 1
+
+
+def test_write_invalidates_cached_tables(proxy):
+    client, stream, fake, cache = proxy
+    query(client, stream, "SELECT v FROM t")
+    query(client, stream, "UPDATE t SET v = 2", packets=1)
+    assert query(client, stream, "SELECT v FROM t") == result_set(b"3")
+    assert fake.queries == ["SELECT v FROM t", "UPDATE t SET v = 2", "SELECT v FROM t"]
+
+
+def test_tls_connection_is_relayed_raw():
+    client, proxy_client = socket.socketpair()
+    proxy_server, server = socket.socketpair()
+    session = MySQLProxySession(proxy_client, proxy_server, QueryCache())
+    thread = threading.Thread(target=session.run, daemon=True)
+    thread.start()
+
+    capabilities = CLIENT_PROTOCOL_41 | CLIENT_SSL
+    server.sendall(packet(greeting(capabilities)))
+    assert PacketStream(client).read_packet()[0] == greeting(capabilities)
+    client.sendall(packet(handshake_response(capabilities), 1) + b"\x16\x03\x01 no es MySQL")
+
+    # Tras pedir TLS los bytes pasan sin interpretar, en los dos sentidos
+    expected = packet(handshake_response(capabilities), 1) + b"\x16\x03\x01 no es MySQL"
+    received = b""
+    while len(received) < len(expected):
+        received += server.recv(65536)
+    assert received == expected
+    server.sendall(b"\x16\x03\x03 respuesta")
+    assert client.recv(65536) == b"\x16\x03\x03 respuesta"
+
+    server.close()
+    thread.join(5)
+    assert not thread.is_alive()
+    client.close()
@@ -0,0 +1,69 @@
+import pytest
+
+from core.benchmark_suite import BenchmarkSuite
+from core.mysql_session import LineReader, MySQLSession, MySQLSessionError, unescape_batch_field
+
+
+@pytest.fixture(scope='module')
+def connection(tmp_path_factory):
+    # Servidor SSH local con el mysql simulado de core/fake_mysql.py en el PATH
+    suite = BenchmarkSuite(work_dir=str(tmp_path_factory.mktemp('session')))
+    suite.prepare()
+    connection = suite.connect()
+    yield connection
+    connection.close()
+    suite.cleanup()
+
+
+@pytest.fixture
+def session(connection):
+    session = MySQLSession(connection.ssh, connection.mysql_client_command())
+    yield session
+    session.close()
+
+
+def chunked_recv(blocks):
+    blocks = list(blocks)
+    return lambda size: blocks.pop(0) if blocks else b""
+
+
+def test_unescape_batch_field():
+    assert unescape_batch_field(b"sin escapes") == b"sin escapes"
+    assert unescape_batch_field(b"a\\tb\\nc\\0d\\\\n") == b"a\tb\nc\0d\\n"
+    # Un escape desconocido deja el carácter tal cual
+    assert unescape_batch_field(b"\\x") == b"x"
+
+
+def test_line_reader_joins_lines_split_across_blocks():
+    reader = LineReader(chunked_recv([b"uno\ndo", b"s", b"\ntres\n", b"cua", b"tro"]), 4)
+    assert [reader.read_line() for _ in range(3)] == [b"uno", b"dos", b"tres"]
+    assert reader.read_line() is None
+    assert reader.rest() == [b"cuatro"]
+
+
+def test_query_returns_rows_and_keeps_session_open(session):
+    session.execute("CREATE DATABASE IF NOT EXISTS tienda")
+    # El USE sigue vigente en las sentencias siguientes: es la misma sesión
+    session.execute("USE tienda")
+    session.execute("CREATE TABLE clientes (id INT PRIMARY KEY, nombre VARCHAR(50))")
+    session.execute("INSERT INTO clientes VALUES (1, 'a'), (2, 'b')")
+
+    assert ['tienda'] in session.query("SHOW DATABASES")
+    assert session.query("SHOW TABLES FROM tienda") == [['clientes']]
+    assert session.query("SELECT COUNT(*) FROM clientes") == [['2']]
+    assert session.query("SELECT 'hola'") == [['hola']]
+
+
+def test_error_is_raised_and_session_recovers(session):
+    with pytest.raises(MySQLSessionError, match="Unknown database 'no_existe'"):
+        session.query("USE no_existe")
+    # El error de la sentencia no se arrastra a la siguiente
+    assert session.query("SELECT 1") == [['1']]
+
+
+def test_closed_session_raises(connection):
+    # Cliente que termina con un error tras recibir la primera sentencia
+    session = MySQLSession(connection.ssh, "read line; echo 'ERROR 2013: conexión perdida' >&2; exit 1;")
+    with pytest.raises(MySQLSessionError, match="se cerró inesperadamente\nERROR 2013: conexión perdida"):
+        session.query("SELECT 1")
+    session.close()